@@ -0,0 +1,11 @@
+# PCA/__main__.py
+
+import os
+import sys
+
+# Os módulos são importados como na interface (services.*, ui.*)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cli import main
+
+sys.exit(main())
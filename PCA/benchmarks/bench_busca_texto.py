@@ -0,0 +1,71 @@
+# benchmarks/bench_busca_texto.py
+
+"""
+Compara a latência por consulta na coluna "Descrição do Item":
+
+- pandas: astype(str).str.contains(case=False) sobre a coluna inteira
+- indice: IndiceBusca (texto normalizado + trigramas)
+
+Uso (a partir da pasta PCA):
+    python -m benchmarks.bench_busca_texto --linhas 200000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.dados_sinteticos import gerar_csv
+from services.parser import preparar_tipos
+from services.search_index import IndiceBusca
+
+CONSULTAS = ['ag', 'agua', 'água mineral', 'luva cirúrgica látex', 'seringa', 'azul estéril',
+             'inexistente', 'caixa grande']
+
+
+def _medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1000, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=200000)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = gerar_csv(os.path.join(pasta, 'pca.csv'), args.linhas)
+        df = preparar_tipos(pd.read_csv(caminho, sep=';', dtype=str).fillna(''))
+    coluna = df['Descrição do Item']
+
+    inicio = time.perf_counter()
+    indice = IndiceBusca(coluna)
+    construcao = time.perf_counter() - inicio
+
+    consultas = []
+    for consulta in CONSULTAS:
+        ms_pandas, mascara = _medir(lambda: coluna.astype(str).str.contains(consulta, case=False, regex=False),
+                                    args.repeticoes)
+        ms_indice, posicoes = _medir(lambda: indice.buscar(consulta), args.repeticoes)
+        consultas.append({'consulta': consulta, 'pandas_ms': round(ms_pandas, 2), 'indice_ms': round(ms_indice, 2),
+                          'linhas_pandas': int(mascara.sum()), 'linhas_indice': len(posicoes)})
+
+    print(json.dumps({
+        'linhas': args.linhas,
+        'construcao_indice_s': round(construcao, 3),
+        'memoria_indice_mb': round(indice.memoria_bytes() / 1048576, 1),
+        'consultas': consultas,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/bench_filtro_digitacao.py
+
+"""
+Mede o tempo entre a digitação no filtro "Descrição do Item" e a tabela
+atualizada, numa aba com um plano sintético (plataforma Qt 'offscreen'):
+
+- sincrono: filtragem + redesenho a cada tecla, na thread da interface
+            (comportamento anterior ao FiltroAdiado)
+- adiado:   FiltroAdiado da aba (espera + filtragem em segundo plano)
+
+Uso (a partir da pasta PCA):
+    python -m benchmarks.bench_filtro_digitacao --linhas 200000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from benchmarks.dados_sinteticos import gerar_csv
+
+PASTA_PCA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEXTO = 'água mineral garrafa'
+
+
+def _esperar(app, condicao, limite=60):
+    fim = time.perf_counter() + limite
+    while not condicao() and time.perf_counter() < fim:
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def _abrir_aba(app, pasta, ano):
+    from ui.main_window import MainWindow
+    os.chdir(pasta)
+    janela = MainWindow()
+    _esperar(app, lambda: ano in janela.abas_info and not janela.tarefas)
+    info_aba = janela.abas_info[ano]
+    _esperar(app, lambda: info_aba['filtro']._tarefas == {})
+    return janela, info_aba
+
+
+def _sincrono(app, info_aba):
+    from services.filtros import filtrar_indices
+    entrada = info_aba['entradas']['Descrição do Item']
+    entrada.blockSignals(True)
+    latencias = []
+    for i in range(1, len(TEXTO) + 1):
+        entrada.setText(TEXTO[:i])
+        inicio = time.perf_counter()
+        criterios = {'textos': {c: w.text() for c, w in info_aba['entradas'].items() if w.text()}, 'periodo': None}
+        info_aba['indices'] = filtrar_indices(info_aba['df_original'], criterios)
+        info_aba['totais'] = info_aba['filtro'].motor.totais(criterios, info_aba['indices'])
+        info_aba['atualizar_tabela']()
+        latencias.append(time.perf_counter() - inicio)
+    entrada.setText('')
+    entrada.blockSignals(False)
+    return {'ultima_tecla_ms': round(latencias[-1] * 1000, 1),
+            'media_por_tecla_ms': round(statistics.mean(latencias) * 1000, 1),
+            'interface_bloqueada_ms': round(sum(latencias) * 1000, 1),
+            'redesenhos': len(latencias)}
+
+
+def _adiado(app, info_aba, intervalo_teclas):
+    entrada = info_aba['entradas']['Descrição do Item']
+    renderizacoes = []
+    info_aba['filtro'].resultado_pronto.connect(lambda _indices, _totais: renderizacoes.append(time.perf_counter()))
+    bloqueado = 0.0
+    for i in range(1, len(TEXTO) + 1):
+        inicio = time.perf_counter()
+        entrada.setText(TEXTO[:i])
+        app.processEvents()
+        bloqueado += time.perf_counter() - inicio
+        ultima_tecla = time.perf_counter()
+        _esperar(app, lambda: False, intervalo_teclas)
+    _esperar(app, lambda: renderizacoes and renderizacoes[-1] > ultima_tecla)
+    return {'ultima_tecla_ms': round((renderizacoes[-1] - ultima_tecla) * 1000, 1),
+            'interface_bloqueada_ms': round(bloqueado * 1000, 1),
+            'redesenhos': len(renderizacoes)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=200000)
+    parser.add_argument('--intervalo', type=float, default=0.08, help="Segundos entre teclas")
+    args = parser.parse_args()
+
+    sys.path.insert(0, PASTA_PCA)
+    from PySide6.QtWidgets import QApplication
+    app = QApplication([])
+
+    with tempfile.TemporaryDirectory() as pasta:
+        os.makedirs(os.path.join(pasta, 'data'))
+        gerar_csv(os.path.join(pasta, 'data', 'pca_2025.csv'), args.linhas)
+        with open(os.path.join(pasta, 'preferencias.json'), 'w', encoding='utf-8') as f:
+            json.dump({'data_sources': {'2025': 'http://127.0.0.1:9/2025'}, 'filters': {},
+                       'ultima_verificacao_semanal': date.today().isoformat()}, f)
+
+        janela, info_aba = _abrir_aba(app, pasta, '2025')
+        resultados = {
+            'sincrono': _sincrono(app, info_aba),
+            'adiado': _adiado(app, info_aba, args.intervalo),
+        }
+        janela.close()
+        os.chdir(PASTA_PCA)
+
+    print(json.dumps({'linhas': args.linhas, 'teclas': len(TEXTO), 'resultados': resultados}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_filtro_download.py
+
+"""
+Compara o pico de memória (RSS) e o tempo total do download com filtragem da
+UASG em duas versões:
+
+- antigo:    response.text -> read_csv do arquivo inteiro -> filtro
+- streaming: filtragem em lotes durante o download (services.downloader)
+
+Uso (a partir da pasta PCA):
+    python -m benchmarks.bench_filtro_download --mb 300
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.dados_sinteticos import gerar_csv_por_tamanho
+from benchmarks.servidor_local import ServidorLocal
+
+
+def _caminho_antigo(url, destino):
+    import requests
+    import pandas as pd
+    from services.downloader import UASGS_PADRAO
+
+    response = requests.get(url, timeout=600)
+    response.raise_for_status()
+    response.encoding = 'utf-8'
+    df = pd.read_csv(io.StringIO(response.text), sep=';', dtype=str)
+    df[df['UASG'].isin(UASGS_PADRAO)].to_csv(os.path.join(destino, 'pca_bench.csv'),
+                                          sep=';', index=False, encoding='utf-8')
+
+
+def _caminho_streaming(url, destino):
+    from services.downloader import download_csv_files
+    download_csv_files({'bench': url}, destino=destino)
+
+
+def _executar_filho(modo, url, destino):
+    inicio = time.perf_counter()
+    if modo == 'antigo':
+        _caminho_antigo(url, destino)
+    else:
+        _caminho_streaming(url, destino)
+    segundos = time.perf_counter() - inicio
+    # ru_maxrss é informado em KB no Linux e em bytes no macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    pico_mb = pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+    print(json.dumps({'modo': modo, 'segundos': round(segundos, 3), 'pico_rss_mb': round(pico_mb, 1)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mb', type=int, default=300, help="Tamanho do CSV sintético em MB")
+    parser.add_argument('--modo', choices=['antigo', 'streaming'], help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    parser.add_argument('--destino', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.modo:
+        _executar_filho(args.modo, args.url, args.destino)
+        return
+
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f"Gerando CSV sintético de ~{args.mb} MB...", file=sys.stderr)
+        gerar_csv_por_tamanho(os.path.join(pasta, 'pca.csv'), args.mb)
+        resultados = []
+        with ServidorLocal(pasta) as url_base:
+            for modo in ('antigo', 'streaming'):
+                saida = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.bench_filtro_download', '--modo', modo,
+                     '--url', f"{url_base}/pca.csv", '--destino', pasta],
+                    check=True, capture_output=True, text=True,
+                )
+                resultados.append(json.loads(saida.stdout.strip().splitlines()[-1]))
+        print(json.dumps({'tamanho_mb': args.mb, 'resultados': resultados}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/bench_inicializacao.py
+
+"""
+Mede o tempo de inicialização com e sem o cache colunar (Feather):
+
+- load_all_years:    leitura de todos os anos pelo services.parser
+- primeira_tabela:   da criação da MainWindow até a primeira tabela visível
+                     (plataforma Qt 'offscreen')
+
+Cada medição roda em um processo novo, para que nada fique em cache na
+memória entre elas.
+
+Uso (a partir da pasta PCA):
+    python -m benchmarks.bench_inicializacao --linhas 100000 --anos 3
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+from benchmarks.dados_sinteticos import gerar_csv
+
+PASTA_PCA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _medir_filho(etapa):
+    sys.path.insert(0, PASTA_PCA)
+    if etapa == 'load_all_years':
+        from services.parser import load_all_years
+        inicio = time.perf_counter()
+        load_all_years()
+        return time.perf_counter() - inicio
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtWidgets import QApplication
+    from ui.main_window import MainWindow
+    app = QApplication([])
+    inicio = time.perf_counter()
+    janela = MainWindow()
+    janela.show()
+    app.processEvents()
+    return time.perf_counter() - inicio
+
+
+def _executar(pasta, etapa):
+    saida = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_inicializacao', '--etapa', etapa, '--pasta', pasta],
+        check=True, capture_output=True, text=True, cwd=PASTA_PCA,
+    )
+    return round(float(saida.stdout.strip().splitlines()[-1]), 3)
+
+
+def _remover_cache(pasta):
+    for nome in os.listdir(os.path.join(pasta, 'data')):
+        if nome.endswith(('.feather', '.cache.json')):
+            os.remove(os.path.join(pasta, 'data', nome))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=100000, help="Linhas por ano")
+    parser.add_argument('--anos', type=int, default=3)
+    parser.add_argument('--etapa', help=argparse.SUPPRESS)
+    parser.add_argument('--pasta', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.etapa:
+        os.chdir(args.pasta)
+        print(_medir_filho(args.etapa))
+        return
+
+    with tempfile.TemporaryDirectory() as pasta:
+        os.makedirs(os.path.join(pasta, 'data'))
+        anos = [str(2024 + i) for i in range(args.anos)]
+        for ano in anos:
+            gerar_csv(os.path.join(pasta, 'data', f"pca_{ano}.csv"), args.linhas, ano=ano, semente=int(ano))
+        # A verificação semanal é marcada como feita para não haver download
+        with open(os.path.join(pasta, 'preferencias.json'), 'w', encoding='utf-8') as f:
+            json.dump({'data_sources': {ano: f"http://127.0.0.1:9/{ano}" for ano in anos}, 'filters': {},
+                       'ultima_verificacao_semanal': date.today().isoformat()}, f)
+
+        resultados = {}
+        for etapa in ('load_all_years', 'primeira_tabela'):
+            _remover_cache(pasta)
+            sem_cache = _executar(pasta, etapa)
+            # A execução anterior gravou o cache; esta já o encontra pronto
+            com_cache = _executar(pasta, etapa)
+            resultados[etapa] = {'csv_segundos': sem_cache, 'cache_segundos': com_cache}
+
+    print(json.dumps({'linhas_por_ano': args.linhas, 'anos': args.anos, 'resultados': resultados}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# benchmarks/bench_memoria.py
+
+"""
+Mede a memória ocupada por ano (bytes do DataFrame, incluindo o conteúdo
+das strings) em cada forma de carregamento:
+
+- original:  read_csv com todas as colunas como objetos Python, mais a cópia
+             'df_resultado' que cada aba mantinha (comportamento anterior)
+- completo:  carregar_ano com memoria_compacta desligada
+- compacto:  carregar_ano no modo de memória compacta (colunas exibidas,
+             categorias e strings do Arrow)
+
+O CSV sintético inclui colunas do PNCP que o programa não exibe.
+
+Uso (a partir da pasta PCA):
+    python -m benchmarks.bench_memoria --linhas 200000
+"""
+
+import argparse
+import json
+import tempfile
+
+import pandas as pd
+
+from benchmarks.dados_sinteticos import gerar_csv
+from services.parser import carregar_ano, caminho_csv
+
+
+def _bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _original(caminho):
+    df = pd.read_csv(caminho, sep=';', encoding='utf-8', header=0, dtype=object)
+    df.fillna('', inplace=True)
+    return _bytes(df) + _bytes(df.copy())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        gerar_csv(caminho_csv('2025', pasta), args.linhas, extras=True)
+        resultados = {
+            'original': _original(caminho_csv('2025', pasta)),
+            'completo': _bytes(carregar_ano('2025', pasta, compacto=False)),
+            'compacto': _bytes(carregar_ano('2025', pasta, compacto=True)),
+        }
+
+    print(json.dumps({
+        'linhas': args.linhas,
+        'bytes_por_ano': resultados,
+        'mb_por_ano': {forma: round(b / 1048576, 1) for forma, b in resultados.items()},
+        'reducao': round(resultados['original'] / resultados['compacto'], 1),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
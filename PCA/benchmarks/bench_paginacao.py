@@ -0,0 +1,97 @@
+# benchmarks/bench_paginacao.py
+
+"""
+Baixa um plano paginado de um servidor local que simula o PNCP (N páginas com
+latência artificial) e compara o download página a página com o download em
+paralelo. Também confere se todas as linhas chegaram e na ordem original.
+
+Uso (a partir da pasta PCA):
+    python -m benchmarks.bench_paginacao --paginas 20 --tamanho 500 --latencia 0.2
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+import pandas as pd
+
+from benchmarks.dados_sinteticos import COLUNAS, gerar_linha
+from benchmarks.servidor_local import ServidorLocal
+from services import downloader
+
+
+def _criar_handler(linhas, latencia, informar_total):
+    class HandlerPaginado(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parametros = dict(parse_qsl(urlsplit(self.path).query))
+            pagina = int(parametros.get('pagina', 1))
+            tamanho = int(parametros.get('tamanhoPagina', len(linhas)))
+            trecho = linhas[(pagina - 1) * tamanho:pagina * tamanho]
+            time.sleep(latencia)
+            if not trecho:
+                self.send_response(204)
+                self.end_headers()
+                return
+            corpo = (';'.join(COLUNAS) + '\n' + ''.join(trecho)).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv; charset=utf-8')
+            self.send_header('Content-Length', str(len(corpo)))
+            if informar_total:
+                self.send_header('X-Total-Count', str(len(linhas)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, format, *args):
+            pass
+
+    return HandlerPaginado
+
+
+def _medir(url, paginas_simultaneas):
+    padrao = downloader.MAX_PAGINAS_SIMULTANEAS
+    downloader.MAX_PAGINAS_SIMULTANEAS = paginas_simultaneas
+    try:
+        with tempfile.TemporaryDirectory() as destino:
+            inicio = time.perf_counter()
+            resumo = downloader.download_csv_files({'bench': url}, destino=destino)['bench']
+            segundos = time.perf_counter() - inicio
+            ids = pd.read_csv(os.path.join(destino, 'pca_bench.csv'), sep=';', dtype=str)['Id do item no PCA']
+    finally:
+        downloader.MAX_PAGINAS_SIMULTANEAS = padrao
+    ordenado = ids.astype(int).is_monotonic_increasing
+    return {'paginas': resumo['paginas'], 'linhas': resumo['linhas'], 'ordem_preservada': bool(ordenado),
+            'segundos': round(segundos, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paginas', type=int, default=20)
+    parser.add_argument('--tamanho', type=int, default=500, help="Linhas por página")
+    parser.add_argument('--latencia', type=float, default=0.2, help="Atraso de cada resposta em segundos")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    linhas = [';'.join(gerar_linha(rng, i, 2025)) + '\n' for i in range(args.paginas * args.tamanho - 7)]
+    esperado = sum(1 for linha in linhas if linha.split(';')[1] in downloader.UASGS_PADRAO)
+
+    resultados = {}
+    for informar_total in (True, False):
+        handler = _criar_handler(linhas, args.latencia, informar_total)
+        with ServidorLocal(None, handler=handler) as url_base:
+            url = f"{url_base}/itens?pagina=1&tamanhoPagina={args.tamanho}"
+            chave = 'com_total' if informar_total else 'sem_total'
+            resultados[chave] = {
+                'sequencial': _medir(url, 1),
+                'paralelo': _medir(url, downloader.MAX_PAGINAS_SIMULTANEAS),
+            }
+
+    print(json.dumps({'linhas_esperadas': esperado, 'latencia': args.latencia, 'resultados': resultados}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
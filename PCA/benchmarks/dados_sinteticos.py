@@ -0,0 +1,93 @@
+# benchmarks/dados_sinteticos.py
+
+"""
+Gerador de CSVs sintéticos no formato dos planos de contratação do PNCP,
+usados pelos benchmarks.
+"""
+
+import os
+import random
+
+COLUNAS = [
+    'Unidade Responsável', 'UASG', 'Id do item no PCA', 'Categoria do Item',
+    'Identificador da Futura Contratação', 'Classificação do Catálogo',
+    'Código da Classificação Superior (Classe/Grupo)', 'Nome do PDM do Item',
+    'Código do Item', 'Descrição do Item', 'Quantidade Estimada',
+    'Valor Total Estimado (R$)', 'Data Desejada'
+]
+
+# Colunas presentes no arquivo do PNCP mas não exibidas pelo programa
+COLUNAS_EXTRAS = ['Órgão', 'Esfera', 'Poder', 'Unidade de Fornecimento', 'Valor Unitário Estimado (R$)']
+
+UASGS = ['250052', '250005', '250057', '250110', '250088']
+CATEGORIAS = ['Material', 'Serviço', 'Obras', 'Soluções de TIC']
+PDMS = ['ÁGUA MINERAL', 'PAPEL A4', 'CANETA ESFEROGRÁFICA', 'LUVA CIRÚRGICA',
+        'SERINGA DESCARTÁVEL', 'MANUTENÇÃO PREDIAL', 'LOCAÇÃO DE VEÍCULOS']
+PALAVRAS = ['garrafa', 'pacote', 'caixa', 'unidade', 'látex', 'estéril', 'azul',
+            'preto', 'ação', 'higiênico', 'médio', 'grande', 'pequeno', 'sódio']
+
+
+def gerar_linha(rng, indice, ano):
+    uasg = rng.choice(UASGS)
+    pdm = rng.choice(PDMS)
+    descricao = f"{pdm.capitalize()} " + " ".join(rng.choice(PALAVRAS) for _ in range(6))
+    valor = rng.randint(1, 5_000_000) / 100
+    valor_texto = f"{valor:.2f}".replace('.', ',')
+    return [
+        f"Unidade {uasg}", uasg, str(indice), rng.choice(CATEGORIAS),
+        f"{uasg}-{indice % 900 + 1:05d}/{ano}", rng.choice(['Material', 'Serviço']),
+        str(rng.randint(1000, 9999)), pdm, str(rng.randint(100000, 999999)),
+        descricao, str(rng.randint(1, 500)), valor_texto,
+        f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{ano}",
+    ]
+
+
+def _valores_extras(rng):
+    return ['Ministério da Saúde', 'Federal', 'Executivo', rng.choice(['UNIDADE', 'CAIXA', 'PACOTE']),
+            f"{rng.randint(1, 100000) / 100:.2f}".replace('.', ',')]
+
+
+def gerar_csv(caminho, linhas, ano=2025, semente=0, extras=False):
+    """
+    Grava um CSV sintético com `linhas` linhas e retorna o caminho. Com
+    `extras`, inclui também as COLUNAS_EXTRAS não exibidas pelo programa.
+    """
+    rng = random.Random(semente)
+    with open(caminho, 'w', encoding='utf-8', newline='') as f:
+        f.write(';'.join(COLUNAS + (COLUNAS_EXTRAS if extras else [])) + '\n')
+        for i in range(linhas):
+            valores = gerar_linha(rng, i, ano) + (_valores_extras(rng) if extras else [])
+            f.write(';'.join(valores) + '\n')
+    return caminho
+
+
+def conjunto_sintetico(pasta, linhas, ano=2025, semente=0):
+    """
+    Caminho de um CSV sintético com `linhas` linhas em `pasta`, gerado só na
+    primeira vez: a mesma semente produz sempre o mesmo arquivo, que pode
+    ser reaproveitado entre execuções dos benchmarks.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f"pca_sintetico_{linhas}_{ano}_{semente}.csv")
+    if not os.path.exists(caminho):
+        gerar_csv(caminho + '.part', linhas, ano, semente)
+        os.replace(caminho + '.part', caminho)
+    return caminho
+
+
+def gerar_csv_por_tamanho(caminho, megabytes, ano=2025, semente=0):
+    """Grava um CSV sintético de aproximadamente `megabytes` MB."""
+    rng = random.Random(semente)
+    limite = megabytes * 1024 * 1024
+    escritos = 0
+    with open(caminho, 'w', encoding='utf-8', newline='') as f:
+        cabecalho = ';'.join(COLUNAS) + '\n'
+        f.write(cabecalho)
+        escritos += len(cabecalho.encode('utf-8'))
+        i = 0
+        while escritos < limite:
+            linha = ';'.join(gerar_linha(rng, i, ano)) + '\n'
+            f.write(linha)
+            escritos += len(linha.encode('utf-8'))
+            i += 1
+    return caminho
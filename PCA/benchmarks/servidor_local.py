@@ -0,0 +1,39 @@
+# benchmarks/servidor_local.py
+
+"""
+Servidor HTTP local que serve os arquivos de um diretório, usado como
+substituto do PNCP nos benchmarks.
+"""
+
+import functools
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _HandlerSilencioso(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class ServidorLocal:
+    """
+    Uso: `with ServidorLocal(diretorio) as url_base: ...`. Com `diretorio=None`,
+    o `handler` informado responde sozinho às requisições.
+    """
+
+    def __init__(self, diretorio, handler=_HandlerSilencioso):
+        self.diretorio = diretorio
+        self.handler = handler
+        self.servidor = None
+
+    def __enter__(self):
+        handler = self.handler
+        if self.diretorio is not None:
+            handler = functools.partial(handler, directory=self.diretorio)
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.servidor.server_address[1]}"
+
+    def __exit__(self, *exc):
+        self.servidor.shutdown()
+        self.servidor.server_close()
@@ -0,0 +1,318 @@
+# benchmarks/suite.py
+
+"""
+Suíte reproduzível de benchmarks do programa, sobre planos sintéticos no
+formato do PNCP (mesma semente, mesmos arquivos). Para cada tamanho mede:
+
+- download:        download de um servidor local que substitui o PNCP,
+                   com filtragem por UASG, partições e cache colunar
+- carregar_csv:    load_all_years lendo o CSV (cache colunar ausente)
+- carregar_cache:  load_all_years a partir do cache colunar
+- indexar:         índice de busca e permutações das colunas tipadas
+- filtro_texto:    digitação no filtro "Descrição do Item", tecla a tecla
+- filtro_periodo:  filtro por trimestre, seguido do filtro por UASG
+- ordenar:         ordenação do resultado filtrado por valor e por data
+- totais:          rodapé (totais por ano) do resultado filtrado
+- modelo_tabela:   preenchimento do ModeloTabelaPCA num QTableView
+                   (plataforma Qt 'offscreen') e rolagem até o fim
+
+Os casos de filtro, ordenação e totais usam os mesmos motores que a aba do
+programa (MotorFiltro, MotorOrdenacao), sem janela. Cada caso é repetido
+`--repeticoes` vezes e o resultado (mínimo e mediana, em segundos) é gravado
+em JSON junto com as versões do ambiente e o commit, para comparar execuções
+ao longo do tempo.
+
+Uso (a partir da pasta PCA):
+    python -m benchmarks.suite --tamanhos 10000 100000 1000000 --saida data/benchmarks/resultado.json
+    python -m benchmarks.suite --tamanhos 10000 --casos filtro_texto ordenar
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.dados_sinteticos import conjunto_sintetico
+from benchmarks.servidor_local import ServidorLocal
+
+PASTA_PCA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_DADOS = os.path.join('data', 'benchmarks', 'sinteticos')
+VERSAO_SUITE = 1
+
+ANO = '2025'
+TEXTO = 'água mineral garrafa'
+UASG = '250052'
+CASOS = ['download', 'carregar_csv', 'carregar_cache', 'indexar', 'filtro_texto', 'filtro_periodo',
+         'ordenar', 'totais', 'modelo_tabela']
+
+
+def _repetir(funcao, repeticoes, preparar=None):
+    """Executa `funcao` `repeticoes` vezes; retorna os tempos e o último resultado."""
+    tempos, resultado = [], None
+    for _ in range(repeticoes):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos, resultado
+
+
+def _resultado(caso, linhas, tempos, **extras):
+    return {
+        'caso': caso,
+        'linhas': linhas,
+        'repeticoes': len(tempos),
+        'segundos': {'min': round(min(tempos), 6), 'mediana': round(statistics.median(tempos), 6)},
+        'extras': extras,
+    }
+
+
+def _preparar_pasta(pasta, csv):
+    """Pasta de trabalho com preferências e o CSV sintético como plano do ano."""
+    os.makedirs(os.path.join(pasta, 'data'), exist_ok=True)
+    shutil.copyfile(csv, os.path.join(pasta, 'data', f'pca_{ANO}.csv'))
+    with open(os.path.join(pasta, 'preferencias.json'), 'w', encoding='utf-8') as f:
+        json.dump({'data_sources': {ANO: 'http://127.0.0.1:9/2025'}, 'filters': {},
+                   'ultima_verificacao_semanal': date.today().isoformat()}, f)
+
+
+# --- Casos ---
+
+def _download(csv, linhas, repeticoes):
+    from services.downloader import download_csv_files
+    pasta_servidor = os.path.dirname(csv)
+    with ServidorLocal(pasta_servidor) as url_base, tempfile.TemporaryDirectory() as destino:
+        url = f"{url_base}/{os.path.basename(csv)}"
+        # Sem manifesto a cada repetição: o arquivo é sempre baixado de novo
+        limpar = lambda: (shutil.rmtree(destino), os.makedirs(destino))
+        tempos, resumo = _repetir(lambda: download_csv_files({ANO: url}, destino=destino, uasgs=[])[ANO],
+                                  repeticoes, limpar)
+    return _resultado('download', linhas, tempos, status=resumo.get('status'), bytes=resumo.get('bytes'),
+                      linhas_gravadas=resumo.get('linhas'))
+
+
+def _carregar(caso, linhas, repeticoes):
+    from services.parser import caminho_cache, load_all_years
+
+    def remover_cache():
+        if os.path.exists(caminho_cache(ANO)):
+            os.remove(caminho_cache(ANO))
+
+    if caso == 'carregar_csv':
+        tempos, dfs = _repetir(load_all_years, repeticoes, remover_cache)
+    else:
+        load_all_years()
+        tempos, dfs = _repetir(load_all_years, repeticoes)
+    return _resultado(caso, linhas, tempos, linhas_lidas=len(dfs[ANO]),
+                      memoria_mb=round(dfs[ANO].memory_usage(deep=True).sum() / 1024 ** 2, 1))
+
+
+def _indexar(df, repeticoes):
+    from services.ordenacao import COLUNAS_TIPADAS, MotorOrdenacao
+    from services.search_index import construir_indices
+
+    def indexar():
+        ordenacao = MotorOrdenacao(df)
+        ordenacao.preparar(COLUNAS_TIPADAS)
+        return construir_indices(df), ordenacao
+
+    return _repetir(indexar, repeticoes)
+
+
+def _filtro_texto(df, indices_busca, repeticoes):
+    from services.filtros import MotorFiltro
+    latencias = []
+
+    def digitar():
+        motor = MotorFiltro(df, indices_busca)
+        indices = None
+        for i in range(1, len(TEXTO) + 1):
+            inicio = time.perf_counter()
+            indices = motor.aplicar({'textos': {'Descrição do Item': TEXTO[:i]}, 'periodo': None})
+            latencias.append(time.perf_counter() - inicio)
+        return indices
+
+    tempos, indices = _repetir(digitar, repeticoes)
+    return _resultado('filtro_texto', len(df), tempos, teclas=len(TEXTO), linhas_resultado=len(indices),
+                      tecla_mediana_ms=round(statistics.median(latencias) * 1000, 3),
+                      tecla_p95_ms=round(float(np.percentile(latencias, 95)) * 1000, 3))
+
+
+def _filtro_periodo(df, indices_busca, repeticoes):
+    from services.filtros import MotorFiltro, periodo_do_trimestre
+    periodo = periodo_do_trimestre(date(int(ANO), 5, 15))
+
+    def filtrar():
+        motor = MotorFiltro(df, indices_busca)
+        por_periodo = motor.aplicar({'textos': {}, 'periodo': periodo})
+        por_uasg = motor.aplicar({'textos': {}, 'valores': {'UASG': [UASG]}, 'periodo': periodo})
+        return por_periodo, por_uasg
+
+    tempos, (por_periodo, por_uasg) = _repetir(filtrar, repeticoes)
+    return _resultado('filtro_periodo', len(df), tempos, linhas_periodo=len(por_periodo),
+                      linhas_uasg=len(por_uasg))
+
+
+def _ordenar(df, ordenacao, indices, repeticoes):
+    def ordenar():
+        for coluna in ('Valor Total Estimado (R$)', 'Data Desejada'):
+            for ascendente in (True, False):
+                ordenacao.ordenar(indices, coluna, ascendente)
+
+    tempos, _ = _repetir(ordenar, repeticoes)
+    return _resultado('ordenar', len(df), tempos, linhas_ordenadas=len(indices), ordenacoes=4)
+
+
+def _totais(df, indices, repeticoes):
+    from services.filtros import calcular_totais, codigos_anos
+    valores = df['valor_numerico'].to_numpy(dtype=float)
+    anos = codigos_anos(df)
+    # Sem o cache de totais do MotorFiltro: mede o cálculo em si
+    tempos, totais = _repetir(lambda: calcular_totais(valores, indices, anos), repeticoes)
+    return _resultado('totais', len(df), tempos, linhas_somadas=len(indices))
+
+
+def _modelo_tabela(app, df, ordenacao, indices, repeticoes):
+    from PySide6.QtWidgets import QTableView
+    from services.parser import COLUNAS_EXIBIDAS
+    from ui.table_model import ModeloTabelaPCA
+    colunas = [coluna for coluna in COLUNAS_EXIBIDAS if coluna in df.columns]
+    tabela = QTableView()
+    tabela.resize(1280, 720)
+    tabela.show()
+
+    def preencher():
+        modelo = ModeloTabelaPCA(df, colunas, ordenacao, parent=tabela)
+        tabela.setModel(modelo)
+        modelo.definir_indices(indices)
+        tabela.grab()
+        tabela.scrollToBottom()
+        tabela.grab()
+        app.processEvents()
+        return modelo
+
+    tempos, modelo = _repetir(preencher, repeticoes)
+    tabela.close()
+    return _resultado('modelo_tabela', len(df), tempos, linhas_modelo=modelo.rowCount(), colunas=len(colunas))
+
+
+# --- Execução ---
+
+def _ambiente():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PASTA_PCA, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    from PySide6 import __version__ as versao_pyside
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'pyside6': versao_pyside,
+        'plataforma': platform.platform(),
+        'processador': platform.processor() or platform.machine(),
+        'commit': commit,
+    }
+
+
+def _executar_tamanho(app, linhas, casos, repeticoes, pasta_dados):
+    from services import instrumentacao
+    from services.parser import carregar_ano
+    from services.filtros import MotorFiltro, periodo_do_trimestre
+
+    csv = conjunto_sintetico(pasta_dados, linhas)
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        _preparar_pasta(pasta, csv)
+        os.chdir(pasta)
+        try:
+            if 'download' in casos:
+                resultados.append(_download(csv, linhas, repeticoes))
+            for caso in ('carregar_csv', 'carregar_cache'):
+                if caso in casos:
+                    resultados.append(_carregar(caso, linhas, repeticoes))
+            if not set(casos) & set(CASOS[3:]):
+                return resultados
+
+            df = carregar_ano(ANO)
+            tempos, (indices_busca, ordenacao) = _indexar(df, repeticoes)
+            if 'indexar' in casos:
+                resultados.append(_resultado('indexar', linhas, tempos, colunas_indexadas=len(indices_busca)))
+            if 'filtro_texto' in casos:
+                resultados.append(_filtro_texto(df, indices_busca, repeticoes))
+            if 'filtro_periodo' in casos:
+                resultados.append(_filtro_periodo(df, indices_busca, repeticoes))
+
+            # Resultado típico de uma aba: o período de um trimestre
+            periodo = periodo_do_trimestre(date(int(ANO), 5, 15))
+            indices = MotorFiltro(df, indices_busca).aplicar({'textos': {}, 'periodo': periodo})
+            if 'ordenar' in casos:
+                resultados.append(_ordenar(df, ordenacao, indices, repeticoes))
+            if 'totais' in casos:
+                resultados.append(_totais(df, indices, repeticoes))
+            if 'modelo_tabela' in casos:
+                resultados.append(_modelo_tabela(app, df, ordenacao, np.arange(len(df)), repeticoes))
+        finally:
+            os.chdir(PASTA_PCA)
+            instrumentacao.limpar()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help="Linhas de cada plano sintético")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--casos', nargs='+', choices=CASOS, default=CASOS)
+    parser.add_argument('--dados', default=PASTA_DADOS,
+                        help="Pasta onde os planos sintéticos são gerados e reaproveitados")
+    parser.add_argument('--saida', help="Arquivo JSON de saída (padrão: saída padrão)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, PASTA_PCA)
+    pasta_dados = os.path.abspath(args.dados)
+    saida = os.path.abspath(args.saida) if args.saida else None
+
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+
+    resultados = []
+    # As mensagens do programa (download, carregamento) não se misturam ao JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        for linhas in args.tamanhos:
+            print(f"⏱️ {linhas} linhas...")
+            resultados.extend(_executar_tamanho(app, linhas, args.casos, max(1, args.repeticoes), pasta_dados))
+
+    relatorio = {
+        'versao': VERSAO_SUITE,
+        'instante': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': _ambiente(),
+        'resultados': resultados,
+    }
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if saida:
+        os.makedirs(os.path.dirname(saida), exist_ok=True)
+        with open(saida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+        print(f"✅ Resultados gravados em {saida}", file=sys.stderr)
+    else:
+        print(texto)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+# PCA/cli.py
+
+"""
+Modo de linha de comando, sem interface gráfica, sobre a mesma camada de
+serviços usada pela janela principal.
+
+Uso (a partir da pasta que contém a pasta PCA, ou de dentro dela com
+`python cli.py ...`):
+
+    python -m PCA refresh [--anos 2024 2025] [--paralelo 4]
+    python -m PCA query 2025 --filtro "Descrição do Item~água" --mes 2025-03
+    python -m PCA query todos --uasg 250052 --uasg 250005 --trimestre 2025-T2
+    python -m PCA export todos --de 01/01/2025 --ate 30/06/2025 --formato jsonl --saida itens.jsonl
+    python -m PCA changes 2025 --tipo Modificado
+
+Filtros têm a forma "Coluna~texto" (contém, ignorando acentos e maiúsculas).
+O ano "todos" consulta o conjunto consolidado de todos os anos baixados.
+Com --banco (ou a preferência 'banco_sqlite'), as consultas são executadas
+no banco SQLite local em vez de carregar os anos na memória.
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+from datetime import date, datetime
+
+import pandas as pd
+
+from services import alteracoes
+from services.banco import BancoPCA, caminho_banco
+from services.instrumentacao import configurar_log, ativar_perfil, cronometrado
+from services.consolidado import TODOS_OS_ANOS, COLUNA_ANO
+from services.filtros import filtrar_indices, calcular_totais, codigos_anos, periodo_por_modo
+from services.ordenacao import MotorOrdenacao
+from services.parser import RegistroAnos, COLUNAS_EXIBIDAS, MEMORIA_COMPACTA
+from services.preferencias import carregar_preferencias, registrar_verificacao_semanal
+
+PASTA_PCA = os.path.dirname(os.path.abspath(__file__))
+
+# Linhas gravadas por vez na exportação, para não montar a saída inteira em memória
+LINHAS_POR_BLOCO = 10000
+
+
+def _data(texto):
+    for formato in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"data inválida: {texto!r} (use dd/mm/aaaa ou aaaa-mm-dd)")
+
+
+def _mes(texto):
+    try:
+        return datetime.strptime(texto, '%Y-%m').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"mês inválido: {texto!r} (use aaaa-mm)")
+
+
+def _trimestre(texto):
+    try:
+        ano, trimestre = texto.upper().split('-T')
+        return date(int(ano), 3 * (int(trimestre) - 1) + 1, 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"trimestre inválido: {texto!r} (use aaaa-T1 a aaaa-T4)")
+
+
+def _filtro(texto):
+    coluna, separador, valor = texto.partition('~')
+    if not separador or not coluna.strip():
+        raise argparse.ArgumentTypeError(f"filtro inválido: {texto!r} (use Coluna~texto)")
+    return coluna.strip(), valor
+
+
+def montar_criterios(args):
+    """Converte os argumentos de query/export nos critérios de services.filtros."""
+    textos = {}
+    for coluna, valor in args.filtro:
+        textos[coluna] = valor
+    if args.mes:
+        periodo = periodo_por_modo('Mês', args.mes)
+    elif args.trimestre:
+        periodo = periodo_por_modo('Trimestre', args.trimestre)
+    else:
+        periodo = periodo_por_modo('Intervalo', args.de, args.ate)
+    return {'textos': textos, 'valores': {'UASG': args.uasg} if args.uasg else {}, 'periodo': periodo}
+
+
+@cronometrado('consulta')
+def _consultar(args, fonte):
+    """
+    Aplica filtros e ordenação ao ano pedido e retorna (dados, posições,
+    colunas, totais). Com um RegistroAnos, `dados` é o DataFrame do ano e
+    as posições são linhas dele; com um BancoPCA, `dados` é o próprio banco
+    e as posições são rowids.
+    """
+    ano = TODOS_OS_ANOS if args.ano.lower() == 'todos' else args.ano
+    banco = fonte if isinstance(fonte, BancoPCA) else None
+    if not (banco.tem_ano(ano) if banco else fonte.disponivel(ano)):
+        raise SystemExit(f"Erro: não há dados locais para {args.ano}. Use 'refresh' primeiro.")
+    df = None if banco else fonte.obter(ano)
+    colunas_ano = banco.colunas(ano) if banco else list(df.columns)
+
+    criterios = montar_criterios(args)
+    desconhecidas = [coluna for coluna in list(criterios['textos']) + list(criterios['valores'])
+                     if coluna not in colunas_ano]
+    if desconhecidas:
+        raise SystemExit(f"Erro: coluna(s) inexistente(s): {', '.join(desconhecidas)}")
+
+    ordenacao = None
+    if args.ordenar:
+        coluna, _, direcao = args.ordenar.partition(':')
+        if coluna not in colunas_ano:
+            raise SystemExit(f"Erro: coluna inexistente para ordenar: {coluna}")
+        ordenacao = (coluna, direcao.lower() != 'desc')
+
+    colunas = args.colunas or [c for c in [COLUNA_ANO] + COLUNAS_EXIBIDAS if c in colunas_ano]
+    desconhecidas = [coluna for coluna in colunas if coluna not in colunas_ano]
+    if desconhecidas:
+        raise SystemExit(f"Erro: coluna(s) inexistente(s): {', '.join(desconhecidas)}")
+
+    if banco:
+        return banco, banco.ids(criterios, ano, ordenacao), colunas, banco.totais(criterios, ano)
+    indices = filtrar_indices(df, criterios)
+    if ordenacao:
+        indices = MotorOrdenacao(df).ordenar(indices, *ordenacao)
+    return df, indices, colunas, calcular_totais(_valores(df), indices, codigos_anos(df))
+
+
+def _linhas(dados, indices, colunas):
+    """DataFrame com as linhas `indices` (posições ou rowids) e as colunas pedidas."""
+    if isinstance(dados, BancoPCA):
+        linhas = dados.linhas(indices, colunas)
+        return pd.DataFrame([linhas[int(i)] for i in indices], columns=colunas)
+    return dados.iloc[indices][colunas]
+
+
+def _escrever(dados, indices, colunas, formato, saida):
+    """Grava as linhas em blocos de LINHAS_POR_BLOCO, em CSV (;) ou JSON lines."""
+    for inicio in range(0, len(indices), LINHAS_POR_BLOCO):
+        bloco = _linhas(dados, indices[inicio:inicio + LINHAS_POR_BLOCO], colunas)
+        if formato == 'jsonl':
+            saida.write(bloco.astype(str).to_json(orient='records', lines=True, force_ascii=False))
+            if not bloco.empty:
+                saida.write('\n')
+        else:
+            bloco.to_csv(saida, sep=';', index=False, header=inicio == 0)
+    if formato == 'csv' and not len(indices):
+        saida.write(';'.join(colunas) + '\n')
+
+
+def _formatar_reais(valor):
+    return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _valores(df):
+    return df['valor_numerico'].to_numpy(dtype=float) if 'valor_numerico' in df.columns else None
+
+
+def comando_refresh(args):
+    from services.downloader import download_csv_files
+
+    preferencias = carregar_preferencias()
+    urls = preferencias.get("data_sources", {})
+    if args.anos:
+        faltando = [ano for ano in args.anos if ano not in urls]
+        if faltando:
+            print(f"Erro: ano(s) sem fonte nas preferências: {', '.join(faltando)}", file=sys.stderr)
+            return 1
+        urls = {ano: urls[ano] for ano in args.anos}
+
+    resultados = download_csv_files(urls, max_workers=args.paralelo, orgaos=preferencias.get("orgaos"),
+                                    uasgs=preferencias.get("uasgs"),
+                                    compacto=preferencias.get("memoria_compacta", MEMORIA_COMPACTA))
+    if not any(r['status'] == 'erro' for r in resultados.values()):
+        registrar_verificacao_semanal(carregar_preferencias())
+    for ano, resumo in sorted(resultados.items()):
+        detalhe = resumo.get('erro') or f"{resumo.get('linhas') or 0} linhas, {resumo.get('segundos') or 0:.1f}s"
+        if resumo.get('alteracoes'):
+            detalhe += (f", {resumo['alteracoes']['adicionados']} novo(s), {resumo['alteracoes']['removidos']} "
+                        f"removido(s), {resumo['alteracoes']['modificados']} modificado(s)")
+        print(f"{ano}: {resumo['status']} ({detalhe})")
+    if _usar_banco(args, preferencias):
+        copiados = BancoPCA(caminho_banco()).sincronizar(
+            compacto=preferencias.get("memoria_compacta", MEMORIA_COMPACTA))
+        print(f"Banco local: {', '.join(copiados) or 'sem alterações'}")
+    return 1 if any(r['status'] == 'erro' for r in resultados.values()) else 0
+
+
+def comando_changes(args):
+    resumos = alteracoes.historico(args.ano)
+    if not resumos:
+        print(f"Nenhuma alteração registrada para {args.ano}.")
+        return 0
+    # Da atualização mais recente para a mais antiga
+    for numero, resumo in enumerate(reversed(resumos[-args.atualizacoes:] if args.atualizacoes else resumos)):
+        print(f"{resumo['instante'].replace('T', ' ')}: {resumo['linhas_anteriores']} -> {resumo['linhas_novas']} itens | "
+              f"novos: {resumo['adicionados']} ({_formatar_reais(resumo['valor_adicionado'])}) | "
+              f"removidos: {resumo['removidos']} ({_formatar_reais(resumo['valor_removido'])}) | "
+              f"modificados: {resumo['modificados']} "
+              f"(variação {_formatar_reais(resumo['variacao_modificados'])})")
+        if numero == 0 and args.limite:
+            registro = alteracoes.carregar_registro(args.ano, resumo)
+            if args.tipo:
+                registro = registro[registro[alteracoes.COLUNA_ALTERACAO] == args.tipo]
+            if not registro.empty:
+                print()
+                print(registro.head(args.limite).to_string(index=False))
+                print()
+    return 0
+
+
+def comando_query(args, fonte):
+    dados, indices, colunas, totais = _consultar(args, fonte)
+    print(f"Registros: {totais['registros']} | Valor Total: {_formatar_reais(totais['valor_total'])}")
+    for ano, subtotal in totais.get('por_ano', {}).items():
+        print(f"  {ano}: {subtotal['registros']} | {_formatar_reais(subtotal['valor_total'])}")
+    if args.limite and len(indices):
+        print()
+        print(_linhas(dados, indices[:args.limite], colunas).to_string(index=False))
+    return 0
+
+
+def comando_export(args, fonte):
+    dados, indices, colunas, _totais = _consultar(args, fonte)
+    if args.saida in (None, '-'):
+        try:
+            _escrever(dados, indices, colunas, args.formato, sys.stdout)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # A saída foi fechada antes do fim (ex.: `| head`); não é um erro
+            sys.stdout = open(os.devnull, 'w')
+    else:
+        with open(args.saida, 'w', encoding='utf-8', newline='') as saida:
+            _escrever(dados, indices, colunas, args.formato, saida)
+        print(f"{len(indices)} linhas gravadas em {args.saida}", file=sys.stderr)
+    return 0
+
+
+def _adicionar_argumentos_consulta(subparser):
+    subparser.add_argument('ano', help="Ano a consultar, ou 'todos' para o consolidado")
+    subparser.add_argument('--filtro', type=_filtro, action='append', default=[], metavar='COLUNA~TEXTO',
+                           help="Linhas cuja coluna contém o texto (pode ser repetido)")
+    subparser.add_argument('--uasg', action='append', default=[], metavar='UASG',
+                           help="Somente as linhas desta UASG (pode ser repetido)")
+    periodo = subparser.add_mutually_exclusive_group()
+    periodo.add_argument('--mes', type=_mes, metavar='AAAA-MM')
+    periodo.add_argument('--trimestre', type=_trimestre, metavar='AAAA-TN')
+    subparser.add_argument('--de', type=_data, help="Data Desejada a partir de (inclusive)")
+    subparser.add_argument('--ate', type=_data, help="Data Desejada até (inclusive)")
+    subparser.add_argument('--ordenar', metavar='COLUNA[:desc]')
+    subparser.add_argument('--colunas', nargs='+', metavar='COLUNA', help="Colunas da saída")
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog='python -m PCA', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pasta', default=PASTA_PCA,
+                        help="Pasta com preferencias.json e a pasta data (padrão: a pasta do programa)")
+    parser.add_argument('--diagnostico', action='store_true',
+                        help="Escreve o tempo de cada etapa na saída de erro, uma linha JSON por etapa")
+    parser.add_argument('--perfil', metavar='PASTA',
+                        help="Grava um perfil do cProfile de cada etapa medida nesta pasta")
+    parser.add_argument('--banco', action='store_true',
+                        help="Usa o banco SQLite local (data/pca.sqlite), como a preferência 'banco_sqlite'")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    refresh = comandos.add_parser('refresh', help="Baixa/atualiza os anos das preferências")
+    refresh.add_argument('--anos', nargs='+', help="Somente estes anos")
+    refresh.add_argument('--paralelo', type=int, default=4, help="Downloads simultâneos")
+
+    query = comandos.add_parser('query', help="Mostra os totais e as primeiras linhas de uma consulta")
+    _adicionar_argumentos_consulta(query)
+    query.add_argument('--limite', type=int, default=20, help="Linhas exibidas (0 para só os totais)")
+
+    export = comandos.add_parser('export', help="Exporta todas as linhas de uma consulta")
+    _adicionar_argumentos_consulta(export)
+    export.add_argument('--formato', choices=['csv', 'jsonl'], default='csv')
+    export.add_argument('--saida', help="Arquivo de saída (padrão: saída padrão)")
+
+    changes = comandos.add_parser('changes', help="Mostra as alterações registradas nas atualizações de um ano")
+    changes.add_argument('ano')
+    changes.add_argument('--tipo', choices=[alteracoes.ADICIONADO, alteracoes.REMOVIDO, alteracoes.MODIFICADO],
+                         help="Somente os itens com esta alteração")
+    changes.add_argument('--limite', type=int, default=20,
+                         help="Itens exibidos da atualização mais recente (0 para só os resumos)")
+    changes.add_argument('--atualizacoes', type=int, default=1,
+                         help="Quantas atualizações resumir, da mais recente (0 para todas)")
+    return parser
+
+
+def _usar_banco(args, preferencias):
+    return args.banco or preferencias.get("banco_sqlite", False)
+
+
+def main(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'de', None) or getattr(args, 'ate', None):
+        if args.mes or args.trimestre:
+            parser.error("--de/--ate não podem ser combinados com --mes ou --trimestre")
+    if args.perfil:
+        ativar_perfil(os.path.abspath(args.perfil))
+    if getattr(args, 'saida', None) not in (None, '-'):
+        # Relativa à pasta de onde o comando foi chamado, não a --pasta
+        args.saida = os.path.abspath(args.saida)
+    # Os serviços usam caminhos relativos ('data', 'preferencias.json'), como a interface
+    os.chdir(args.pasta)
+    if args.diagnostico:
+        configurar_log(sys.stderr)
+    if args.comando == 'refresh':
+        return comando_refresh(args)
+    if args.comando == 'changes':
+        return comando_changes(args)
+
+    preferencias = carregar_preferencias()
+    compacto = preferencias.get("memoria_compacta", MEMORIA_COMPACTA)
+    if _usar_banco(args, preferencias):
+        fonte = BancoPCA(caminho_banco())
+        # As mensagens da cópia não podem se misturar à exportação na saída padrão
+        with contextlib.redirect_stdout(sys.stderr):
+            fonte.sincronizar(compacto=compacto)
+    else:
+        # Uma consulta só: os índices de busca e as ordenações não compensariam
+        fonte = RegistroAnos(compacto=compacto, indexar=False)
+    if args.comando == 'query':
+        return comando_query(args, fonte)
+    return comando_export(args, fonte)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
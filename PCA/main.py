@@ -10,6 +10,8 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 # As importações dos seus módulos de serviço
 from services.downloader import download_csv_files
 from services.parser import load_all_years
+from services.preferencias import carregar_preferencias
+from services.instrumentacao import configurar_log, ativar_perfil
 
 # A importação da sua janela principal
 from ui.main_window import iniciar_interface
@@ -26,6 +28,13 @@ def main():
     if not os.path.exists('data'):
         os.makedirs('data')
 
+    # Tempos das etapas em data/diagnostico.log e perfis do cProfile, se pedidos
+    preferencias = carregar_preferencias()
+    if preferencias.get("log_diagnostico", False):
+        configurar_log(os.path.join('data', 'diagnostico.log'))
+    if preferencias.get("perfil_cprofile", False):
+        ativar_perfil()
+
     # Inicia a interface gráfica do usuário
     iniciar_interface()
 
@@ -0,0 +1,332 @@
+# services/alteracoes.py
+
+"""
+Alterações de um plano entre dois downloads sucessivos de um ano.
+
+Cada item é identificado pela UASG e pelo 'Id do item no PCA' (o Id é
+único dentro do plano de cada UASG; repetições eventuais são distinguidas
+pela ordem de ocorrência). A comparação é toda vetorizada: as chaves e o
+conteúdo de cada linha viram impressões digitais de 64 bits
+(pandas.util.hash_pandas_object), as linhas das duas versões são
+casadas por uma tabela hash (pd.Index.get_indexer) e um item é
+considerado modificado quando a impressão digital do conteúdo mudou.
+
+O registro de cada atualização (itens adicionados, removidos e
+modificados, com os valores antes e depois) é gravado em
+data/alteracoes/<ano>/<instante>.feather, e os resumos ficam em
+data/alteracoes/<ano>/resumos.json, do mais antigo para o mais recente.
+São mantidos os MAX_REGISTROS_POR_ANO registros mais recentes.
+
+Calcular as impressões digitais do texto é a parte cara da comparação;
+as da versão atual ficam guardadas em data/alteracoes/<ano>/impressoes.npz
+junto com a assinatura do CSV, o modo de memória e os tipos das colunas,
+de modo que cada atualização só calcula as da versão nova. Se algo disso
+não corresponder à versão anterior, elas são recalculadas.
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .parser import CACHE_DISPONIVEL, COLUNAS_EXIBIDAS, MEMORIA_COMPACTA, caminho_csv
+
+COLUNA_CHAVE = 'Id do item no PCA'
+COLUNA_UASG = 'UASG'
+COLUNA_DESCRICAO = 'Descrição do Item'
+
+ADICIONADO = 'Adicionado'
+REMOVIDO = 'Removido'
+MODIFICADO = 'Modificado'
+
+# Colunas do registro de alterações
+COLUNA_ALTERACAO = 'Alteração'
+COLUNA_VALOR_ANTERIOR = 'Valor anterior (R$)'
+COLUNA_VALOR_NOVO = 'Valor novo (R$)'
+COLUNA_DIFERENCA = 'Diferença (R$)'
+COLUNA_COLUNAS_ALTERADAS = 'Colunas alteradas'
+COLUNAS_REGISTRO = [COLUNA_ALTERACAO, COLUNA_UASG, COLUNA_CHAVE, COLUNA_DESCRICAO, COLUNA_VALOR_ANTERIOR,
+                    COLUNA_VALOR_NOVO, COLUNA_DIFERENCA, COLUNA_COLUNAS_ALTERADAS]
+
+# Registros guardados por ano; os mais antigos são apagados
+MAX_REGISTROS_POR_ANO = 20
+
+NOME_RESUMOS = 'resumos.json'
+NOME_IMPRESSOES = 'impressoes.npz'
+
+# Incrementar sempre que o cálculo das impressões digitais mudar
+VERSAO_IMPRESSOES = 1
+
+
+def pasta_alteracoes(ano, destino='data'):
+    return os.path.join(destino, 'alteracoes', str(ano))
+
+
+def _colunas_comparadas(anterior, novo):
+    """Colunas de conteúdo presentes nas duas versões (as colunas tipadas derivadas ficam de fora)."""
+    return [coluna for coluna in COLUNAS_EXIBIDAS if coluna in anterior.columns and coluna in novo.columns]
+
+
+def _hash_coluna(serie):
+    """Hash de 64 bits de cada valor, independente do tipo da coluna (texto, texto do Arrow, categoria)."""
+    # Sem categorize: fatorar o texto livre (quase todo distinto) custa mais que calcular o hash direto
+    return pd.util.hash_pandas_object(serie, index=False, categorize=False).to_numpy()
+
+
+def _combinar(hashes):
+    """Um hash por linha a partir dos hashes de cada coluna (inteiros: rápido de combinar)."""
+    return pd.util.hash_pandas_object(pd.DataFrame(hashes), index=False).to_numpy()
+
+
+def _chaves(hashes_chave):
+    """Chave de cada linha: a UASG e o Id do item, mais a ocorrência quando a chave se repete."""
+    chaves = _combinar(hashes_chave)
+    if pd.Index(chaves).is_unique:
+        return chaves
+    # Só as repetições recebem outra chave: a primeira ocorrência casa com a versão sem repetição
+    ocorrencias = pd.Series(chaves).groupby(chaves, sort=False).cumcount().to_numpy()
+    repetidas = ocorrencias > 0
+    chaves = chaves.copy()
+    chaves[repetidas] = _combinar({'chave': chaves[repetidas], 'ocorrencia': ocorrencias[repetidas]})
+    return chaves
+
+
+def _tipos(df, colunas):
+    """Tipo de cada coluna usada nas impressões digitais (texto, texto do Arrow, categoria...)."""
+    return {coluna: str(df[coluna].dtype) for coluna in [*colunas, COLUNA_UASG, COLUNA_CHAVE]
+            if coluna in df.columns}
+
+
+def calcular_impressoes(df, colunas):
+    """
+    Impressões digitais de uma versão: {'colunas', 'tipos', 'chaves',
+    'conteudo'}, com o hash da chave e o hash do conteudo (`colunas`) de
+    cada linha. O texto de cada coluna passa uma única vez pela função de
+    hash.
+    """
+    if COLUNA_CHAVE not in df.columns:
+        raise ValueError(f"coluna '{COLUNA_CHAVE}' ausente")
+    hashes = {coluna: _hash_coluna(df[coluna]) for coluna in set(colunas) | {COLUNA_UASG, COLUNA_CHAVE}
+              if coluna in df.columns}
+    chave = {coluna: hashes[coluna] for coluna in (COLUNA_UASG, COLUNA_CHAVE) if coluna in hashes}
+    conteudo = _combinar({coluna: hashes[coluna] for coluna in colunas}) if colunas else \
+        np.zeros(len(df), dtype=np.uint64)
+    return {'colunas': list(colunas), 'tipos': _tipos(df, colunas), 'chaves': _chaves(chave), 'conteudo': conteudo}
+
+
+def _valores(df):
+    if 'valor_numerico' in df.columns:
+        return df['valor_numerico'].to_numpy(dtype=float, na_value=np.nan)
+    return np.full(len(df), np.nan)
+
+
+def _texto(df, coluna, posicoes):
+    if coluna not in df.columns:
+        return np.full(len(posicoes), '', dtype=object)
+    return df[coluna].iloc[posicoes].astype(str).to_numpy(dtype=object)
+
+
+def _colunas_alteradas(anterior, novo, posicoes_anteriores, posicoes_novas, colunas):
+    """
+    Nomes das colunas que mudaram em cada item modificado, separados por
+    "; ". As diferenças de cada linha viram uma máscara de bits, e só as
+    poucas combinações distintas são convertidas em texto.
+    """
+    mascaras = np.zeros(len(posicoes_novas), dtype=np.int64)
+    for bit, coluna in enumerate(colunas):
+        antes = _hash_coluna(anterior[coluna].iloc[posicoes_anteriores])
+        depois = _hash_coluna(novo[coluna].iloc[posicoes_novas])
+        mascaras |= (antes != depois).astype(np.int64) << bit
+    nomes = {mascara: '; '.join(coluna for bit, coluna in enumerate(colunas) if mascara >> bit & 1)
+             for mascara in np.unique(mascaras).tolist()}
+    return pd.Series(mascaras).map(nomes).to_numpy(dtype=object)
+
+
+def _parte(tipo, df, posicoes, valor_anterior, valor_novo, colunas_alteradas=''):
+    return pd.DataFrame({
+        COLUNA_ALTERACAO: tipo,
+        COLUNA_UASG: _texto(df, COLUNA_UASG, posicoes),
+        COLUNA_CHAVE: _texto(df, COLUNA_CHAVE, posicoes),
+        COLUNA_DESCRICAO: _texto(df, COLUNA_DESCRICAO, posicoes),
+        COLUNA_VALOR_ANTERIOR: valor_anterior,
+        COLUNA_VALOR_NOVO: valor_novo,
+        COLUNA_DIFERENCA: np.nan_to_num(valor_novo) - np.nan_to_num(valor_anterior),
+        COLUNA_COLUNAS_ALTERADAS: colunas_alteradas,
+    })
+
+
+def comparar(anterior, novo, impressoes_anteriores=None):
+    """
+    Compara duas versões (DataFrames carregados pelo parser) de um ano.
+    `impressoes_anteriores` (de `impressoes_salvas`) evita recalcular as da
+    versão anterior quando foram calculadas sobre as mesmas colunas, com os
+    mesmos tipos e o mesmo número de linhas.
+
+    Retorna (registro, resumo, impressoes_novas): o DataFrame com uma linha
+    por item adicionado, removido ou modificado (COLUNAS_REGISTRO), um
+    dicionário com as quantidades e os totais de valor, e as impressões
+    digitais da versão nova.
+    """
+    colunas = _colunas_comparadas(anterior, novo)
+    if impressoes_anteriores is None or impressoes_anteriores['colunas'] != colunas \
+            or impressoes_anteriores.get('tipos') != _tipos(anterior, colunas) \
+            or len(impressoes_anteriores['chaves']) != len(anterior):
+        impressoes_anteriores = calcular_impressoes(anterior, colunas)
+    impressoes_novas = calcular_impressoes(novo, colunas)
+    posicoes = pd.Index(impressoes_anteriores['chaves']).get_indexer(impressoes_novas['chaves'])
+
+    encontrados = posicoes >= 0
+    adicionados = np.flatnonzero(~encontrados)
+    mantidos = np.zeros(len(anterior), dtype=bool)
+    mantidos[posicoes[encontrados]] = True
+    removidos = np.flatnonzero(~mantidos)
+
+    novos_comuns = np.flatnonzero(encontrados)
+    anteriores_comuns = posicoes[encontrados]
+    diferentes = impressoes_anteriores['conteudo'][anteriores_comuns] != \
+        impressoes_novas['conteudo'][novos_comuns]
+    modificados_novos, modificados_anteriores = novos_comuns[diferentes], anteriores_comuns[diferentes]
+
+    valores_anteriores, valores_novos = _valores(anterior), _valores(novo)
+    registro = pd.concat([
+        _parte(ADICIONADO, novo, adicionados, np.full(len(adicionados), np.nan), valores_novos[adicionados]),
+        _parte(REMOVIDO, anterior, removidos, valores_anteriores[removidos], np.full(len(removidos), np.nan)),
+        _parte(MODIFICADO, novo, modificados_novos, valores_anteriores[modificados_anteriores],
+               valores_novos[modificados_novos],
+               _colunas_alteradas(anterior, novo, modificados_anteriores, modificados_novos, colunas)),
+    ], ignore_index=True)
+
+    resumo = {
+        'linhas_anteriores': len(anterior),
+        'linhas_novas': len(novo),
+        'adicionados': len(adicionados),
+        'removidos': len(removidos),
+        'modificados': len(modificados_novos),
+        'valor_anterior': float(np.nansum(valores_anteriores)),
+        'valor_novo': float(np.nansum(valores_novos)),
+        'valor_adicionado': float(np.nansum(valores_novos[adicionados])),
+        'valor_removido': float(np.nansum(valores_anteriores[removidos])),
+        'variacao_modificados': float(np.nansum(valores_novos[modificados_novos])
+                                      - np.nansum(valores_anteriores[modificados_anteriores])),
+    }
+    return registro, resumo, impressoes_novas
+
+
+def _caminho_resumos(ano, destino='data'):
+    return os.path.join(pasta_alteracoes(ano, destino), NOME_RESUMOS)
+
+
+def historico(ano, destino='data'):
+    """Resumos das atualizações registradas do ano, do mais antigo para o mais recente."""
+    try:
+        with open(_caminho_resumos(ano, destino), 'r', encoding='utf-8') as f:
+            resumos = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return resumos if isinstance(resumos, list) else []
+
+
+def _salvar_historico(ano, resumos, destino='data'):
+    caminho = _caminho_resumos(ano, destino)
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(resumos, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+
+def _gravar_registro(registro, caminho):
+    if CACHE_DISPONIVEL:
+        registro.to_feather(caminho)
+    else:
+        registro.to_csv(caminho, sep=';', index=False, encoding='utf-8')
+
+
+def carregar_registro(ano, resumo, destino='data'):
+    """DataFrame (COLUNAS_REGISTRO) das alterações de uma atualização do histórico."""
+    caminho = os.path.join(pasta_alteracoes(ano, destino), resumo['arquivo'])
+    if caminho.endswith('.feather'):
+        return pd.read_feather(caminho)
+    registro = pd.read_csv(caminho, sep=';', encoding='utf-8', dtype=str, keep_default_na=False)
+    for coluna in (COLUNA_VALOR_ANTERIOR, COLUNA_VALOR_NOVO, COLUNA_DIFERENCA):
+        registro[coluna] = pd.to_numeric(registro[coluna], errors='coerce')
+    return registro
+
+
+def _caminho_impressoes(ano, destino='data'):
+    return os.path.join(pasta_alteracoes(ano, destino), NOME_IMPRESSOES)
+
+
+def _assinatura(ano, destino='data'):
+    info = os.stat(caminho_csv(ano, destino))
+    return {'mtime_ns': info.st_mtime_ns, 'tamanho': info.st_size}
+
+
+def impressoes_salvas(ano, destino='data', compacto=MEMORIA_COMPACTA):
+    """
+    Impressões digitais guardadas da versão atual do ano, ou None se não
+    existirem, se o CSV mudou depois de calculadas ou se foram calculadas
+    em outro modo de memória ou por outra versão do cálculo. Deve ser
+    chamada antes de o CSV ser substituído pela versão nova.
+    """
+    try:
+        with np.load(_caminho_impressoes(ano, destino), allow_pickle=False) as arquivo:
+            meta = json.loads(str(arquivo['meta']))
+            if (meta.get('versao') != VERSAO_IMPRESSOES or meta.get('compacto') != compacto
+                    or meta['assinatura'] != _assinatura(ano, destino)):
+                return None
+            return {'colunas': meta['colunas'], 'tipos': meta['tipos'], 'chaves': arquivo['chaves'],
+                    'conteudo': arquivo['conteudo']}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _salvar_impressoes(ano, impressoes, destino='data', compacto=MEMORIA_COMPACTA):
+    meta = {'versao': VERSAO_IMPRESSOES, 'assinatura': _assinatura(ano, destino), 'compacto': compacto,
+            'colunas': impressoes['colunas'], 'tipos': impressoes['tipos']}
+    caminho = _caminho_impressoes(ano, destino)
+    # np.savez acrescenta .npz a nomes sem essa extensão
+    temporario = caminho[:-len('.npz')] + '.tmp.npz'
+    np.savez(temporario, meta=np.array(json.dumps(meta, ensure_ascii=False)),
+             chaves=impressoes['chaves'], conteudo=impressoes['conteudo'])
+    os.replace(temporario, caminho)
+
+
+def registrar_alteracoes(ano, anterior, novo, destino='data', impressoes_anteriores=None,
+                         compacto=MEMORIA_COMPACTA):
+    """
+    Compara a versão anterior do ano com a nova (já gravada em
+    data/pca_<ano>.csv) e, se algo mudou, grava o registro e acrescenta o
+    resumo ao histórico. Sem versão anterior (primeiro download), só guarda
+    as impressões digitais da nova. `compacto` é o modo de memória em que
+    `novo` foi carregado. Retorna o resumo (com 'instante' e 'arquivo'), ou
+    None quando não há alterações a registrar.
+    """
+    pasta = pasta_alteracoes(ano, destino)
+    os.makedirs(pasta, exist_ok=True)
+    if anterior is None:
+        _salvar_impressoes(ano, calcular_impressoes(novo, _colunas_comparadas(novo, novo)), destino, compacto)
+        return None
+    registro, resumo, impressoes_novas = comparar(anterior, novo, impressoes_anteriores)
+    _salvar_impressoes(ano, impressoes_novas, destino, compacto)
+    if not (resumo['adicionados'] or resumo['removidos'] or resumo['modificados']):
+        return None
+    instante = datetime.now()
+    extensao = 'feather' if CACHE_DISPONIVEL else 'csv'
+    resumo = {'instante': instante.isoformat(timespec='seconds'),
+              'arquivo': f"{instante:%Y%m%d-%H%M%S-%f}.{extensao}", **resumo}
+    _gravar_registro(registro, os.path.join(pasta, resumo['arquivo']))
+
+    resumos = historico(ano, destino) + [resumo]
+    for antigo in resumos[:-MAX_REGISTROS_POR_ANO]:
+        caminho = os.path.join(pasta, antigo.get('arquivo', ''))
+        if os.path.isfile(caminho):
+            os.remove(caminho)
+    _salvar_historico(ano, resumos[-MAX_REGISTROS_POR_ANO:], destino)
+    return resumo
+
+
+def remover_historico(ano, destino='data'):
+    shutil.rmtree(pasta_alteracoes(ano, destino), ignore_errors=True)
@@ -0,0 +1,382 @@
+# services/banco.py
+
+"""
+Armazenamento opcional dos planos em um banco SQLite local
+(data/pca.sqlite), ativado pela preferência 'banco_sqlite'.
+
+Os anos baixados são copiados para a tabela `itens`, com índices nas
+colunas mais consultadas e, para cada coluna de texto, uma cópia
+normalizada (sem acentos e em minúsculas) usada pelos filtros e pela
+ordenação; a da descrição tem ainda um índice FTS5 de trigramas. Filtros,
+ordenação e totais do rodapé são executados como SQL, de modo que a
+interface só precisa abrir o banco e buscar as linhas visíveis, sem
+carregar os anos na memória.
+
+O banco fica em modo WAL: a cópia de um ano acontece numa conexão de
+escrita, enquanto cada thread consulta por uma conexão de leitura própria,
+que continua vendo a versão anterior até o fim da cópia, sem esperar por ela.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .consolidado import TODOS_OS_ANOS, COLUNA_ANO
+from .filtros import normalizar_criterios, limites_periodo, chave_criterios, criterios_vazios, MAX_TOTAIS_EM_CACHE
+from .ordenacao import COLUNAS_TIPADAS
+from .parser import COLUNAS_EXIBIDAS, MEMORIA_COMPACTA, carregar_ano, caminho_csv, assinatura_csv
+from .preferencias import carregar_preferencias
+from .instrumentacao import medir
+from .search_index import normalizar, normalizar_serie
+
+NOME_BANCO = 'pca.sqlite'
+
+# Versão do esquema da tabela `itens` (PRAGMA user_version). Um banco de
+# versão diferente é recriado e os anos são copiados de novo.
+VERSAO_ESQUEMA = 2
+
+# Colunas com índice B-tree, além do ano
+COLUNAS_INDEXADAS_SQL = ['UASG', 'Identificador da Futura Contratação', 'Código do Item', 'data_dias']
+
+# Códigos guardados como texto mas ordenados como número
+COLUNAS_CODIGO = ['UASG', 'Id do item no PCA', 'Código do Item', 'Código da Classificação Superior (Classe/Grupo)']
+
+# Linhas lidas por consulta ao preencher a tabela
+LINHAS_POR_BLOCO = 256
+
+_COLUNA_DESCRICAO = 'Descrição do Item'
+
+# Colunas de texto com cópia normalizada, filtradas e ordenadas sem acentos
+# e sem diferenciar maiúsculas (códigos e colunas tipadas não precisam)
+COLUNAS_NORMALIZADAS = {
+    coluna: 'descricao_normalizada' if coluna == _COLUNA_DESCRICAO
+    else normalizar(coluna).replace(' ', '_') + '_normalizada'
+    for coluna in COLUNAS_EXIBIDAS if coluna not in COLUNAS_CODIGO and coluna not in COLUNAS_TIPADAS
+}
+
+
+def caminho_banco(destino='data'):
+    return os.path.join(destino, NOME_BANCO)
+
+
+def _q(coluna):
+    """Nome de coluna entre aspas para o SQL."""
+    return '"' + coluna.replace('"', '""') + '"'
+
+
+def _padrao_like(texto):
+    """Padrão LIKE de "contém"; curingas digitados são escapados com '\\'."""
+    return '%' + texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _normalizar_valores(valores):
+    """`normalizar` de cada valor (nulos continuam nulos), calculado uma vez por valor distinto."""
+    codigos, distintos = pd.factorize(pd.Series(valores, dtype=object))
+    normalizados = normalizar_serie(pd.Series(distintos, dtype=object)).tolist()
+    return [normalizados[codigo] if codigo >= 0 else None for codigo in codigos]
+
+
+class BancoPCA:
+    """
+    Conexões com o banco SQLite dos planos. A conexão de escrita (cópia e
+    remoção de anos) é protegida por uma trava; as consultas usam uma
+    conexão de leitura por thread (filtros em segundo plano, interface) e
+    nunca esperam por uma cópia em andamento. Os anos presentes no banco
+    ficam em memória, para que a interface não precise consultá-lo.
+    """
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or caminho_banco()
+        os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+        self._conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._leitura = threading.local()
+        self._conexoes_leitura = []
+        self._lock_leitura = threading.Lock()
+        self._criar_esquema()
+        self._anos = frozenset(linha[0] for linha in self._conexao.execute("SELECT ano FROM anos"))
+
+    def fechar(self):
+        with self._lock_leitura:
+            for conexao in self._conexoes_leitura:
+                conexao.close()
+            self._conexoes_leitura.clear()
+        with self._lock:
+            self._conexao.close()
+
+    def _leitor(self):
+        """Conexão de leitura da thread atual, aberta na primeira consulta."""
+        conexao = getattr(self._leitura, 'conexao', None)
+        if conexao is None:
+            # check_same_thread=False só para que `fechar` possa fechá-la de outra thread
+            conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+            conexao.execute("PRAGMA query_only=ON")
+            self._leitura.conexao = conexao
+            with self._lock_leitura:
+                self._conexoes_leitura.append(conexao)
+        return conexao
+
+    def _criar_esquema(self):
+        colunas = ', '.join(f"{_q(c)} TEXT" for c in COLUNAS_EXIBIDAS)
+        normalizadas = ', '.join(f"{_q(c)} TEXT" for c in COLUNAS_NORMALIZADAS.values())
+        with self._lock, self._conexao:
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            if self._conexao.execute("PRAGMA user_version").fetchone()[0] != VERSAO_ESQUEMA:
+                for tabela in ('itens_fts', 'itens', 'anos'):
+                    self._conexao.execute(f"DROP TABLE IF EXISTS {tabela}")
+                self._conexao.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
+            self._conexao.execute(
+                f"CREATE TABLE IF NOT EXISTS itens (ano TEXT NOT NULL, {colunas}, "
+                f"valor_numerico REAL, quantidade_numerica REAL, data_dias INTEGER, {normalizadas})"
+            )
+            self._conexao.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS itens_fts USING fts5("
+                "descricao_normalizada, content='itens', content_rowid='rowid', tokenize='trigram')"
+            )
+            self._conexao.execute("CREATE TABLE IF NOT EXISTS anos (ano TEXT PRIMARY KEY, assinatura TEXT)")
+            self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_itens_ano ON itens (ano)")
+            for coluna in COLUNAS_INDEXADAS_SQL:
+                nome = 'idx_itens_' + normalizar(coluna).replace(' ', '_')
+                self._conexao.execute(f"CREATE INDEX IF NOT EXISTS {_q(nome)} ON itens ({_q(coluna)})")
+
+    # --- Ingestão ---
+
+    def anos(self):
+        return sorted(self._anos)
+
+    def tem_ano(self, ano):
+        """Se o ano já foi copiado para o banco; não consulta o banco."""
+        if ano == TODOS_OS_ANOS:
+            return len(self._anos) > 1
+        return ano in self._anos
+
+    def _assinatura(self, ano):
+        linha = self._leitor().execute("SELECT assinatura FROM anos WHERE ano = ?", (ano,)).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+    def remover_ano(self, ano):
+        with self._lock:
+            with self._conexao:
+                self._apagar_linhas(ano)
+                self._conexao.execute("DELETE FROM anos WHERE ano = ?", (ano,))
+            self._anos = self._anos - {ano}
+
+    def _apagar_linhas(self, ano):
+        # Tabela FTS com conteúdo externo: as linhas saem do índice pelo comando 'delete'
+        self._conexao.execute(
+            "INSERT INTO itens_fts (itens_fts, rowid, descricao_normalizada) "
+            "SELECT 'delete', rowid, descricao_normalizada FROM itens WHERE ano = ?", (ano,)
+        )
+        self._conexao.execute("DELETE FROM itens WHERE ano = ?", (ano,))
+
+    def ingerir_ano(self, ano, df, assinatura=None):
+        """Substitui as linhas do ano pelas de `df` (DataFrame tipado de carregar_ano)."""
+        vazio = [None] * len(df)
+        dados = {'ano': [ano] * len(df)}
+        for coluna in COLUNAS_EXIBIDAS:
+            dados[coluna] = df[coluna].astype(str).tolist() if coluna in df.columns else vazio
+        for coluna in ('valor_numerico', 'quantidade_numerica'):
+            # NaN é gravado como NULL pelo sqlite3
+            dados[coluna] = df[coluna].astype(float).tolist() if coluna in df.columns else vazio
+        if 'data_datetime' in df.columns:
+            dias = df['data_datetime'].to_numpy().astype('datetime64[D]').astype(np.int64)
+            dados['data_dias'] = [None if nulo else int(d) for d, nulo in zip(dias, df['data_datetime'].isna())]
+        else:
+            dados['data_dias'] = vazio
+        for coluna, normalizada in COLUNAS_NORMALIZADAS.items():
+            dados[normalizada] = _normalizar_valores(dados[coluna]) if coluna in df.columns else vazio
+        if _COLUNA_DESCRICAO not in df.columns:
+            # O índice de trigramas espera texto em todas as linhas
+            dados[COLUNAS_NORMALIZADAS[_COLUNA_DESCRICAO]] = [''] * len(df)
+
+        nomes = list(dados)
+        linhas = zip(*(dados[nome] for nome in nomes))
+        sql = f"INSERT INTO itens ({', '.join(_q(n) for n in nomes)}) VALUES ({', '.join('?' * len(nomes))})"
+        # Uma única transação: as conexões de leitura veem a versão anterior do
+        # ano até o commit e não esperam por ele
+        with self._lock:
+            with self._conexao:
+                self._apagar_linhas(ano)
+                self._conexao.executemany(sql, linhas)
+                self._conexao.execute(
+                    "INSERT INTO itens_fts (rowid, descricao_normalizada) "
+                    "SELECT rowid, descricao_normalizada FROM itens WHERE ano = ?", (ano,)
+                )
+                self._conexao.execute("INSERT OR REPLACE INTO anos (ano, assinatura) VALUES (?, ?)",
+                                      (ano, json.dumps(assinatura)))
+            self._anos = self._anos | {ano}
+
+    def sincronizar(self, anos=None, destino='data', compacto=MEMORIA_COMPACTA, cancelamento=None):
+        """
+        Copia para o banco os anos cujo CSV mudou desde a última cópia e
+        remove os anos que não estão mais em `anos` (por padrão, os anos das
+        preferências). Retorna a lista dos anos copiados.
+        """
+        if anos is None:
+            anos = carregar_preferencias().get("data_sources", {}).keys()
+        anos = list(anos)
+        copiados = []
+        for ano in anos:
+            if cancelamento is not None and cancelamento.is_set():
+                break
+            caminho = caminho_csv(ano, destino)
+            if not os.path.exists(caminho):
+                continue
+            assinatura = assinatura_csv(caminho, compacto)
+            if self._assinatura(ano) == assinatura:
+                continue
+            print(f"🗄️ Copiando {ano} para o banco local...")
+            with medir('copiar_para_banco', ano=ano):
+                self.ingerir_ano(ano, carregar_ano(ano, destino, compacto), assinatura)
+            copiados.append(ano)
+        for ano in self.anos():
+            if ano not in anos:
+                self.remover_ano(ano)
+        return copiados
+
+    # --- Consultas ---
+
+    def colunas(self, ano):
+        """Colunas de exibição disponíveis na consulta do ano (com 'Ano' no consolidado)."""
+        return ([COLUNA_ANO] if ano == TODOS_OS_ANOS else []) + list(COLUNAS_EXIBIDAS)
+
+    def unidades(self, ano):
+        """{UASG: nome da Unidade Responsável} das linhas do ano."""
+        where, parametros = self._where(criterios_vazios(), ano)
+        linhas = self._leitor().execute(
+            f'SELECT "UASG", MIN("Unidade Responsável") FROM itens{where} GROUP BY "UASG" ORDER BY "UASG"',
+            parametros,
+        ).fetchall()
+        return {uasg: nome or '' for uasg, nome in linhas if uasg}
+
+    def _where(self, criterios, ano):
+        criterios = normalizar_criterios(criterios)
+        condicoes, parametros = [], []
+        if ano != TODOS_OS_ANOS:
+            condicoes.append("ano = ?")
+            parametros.append(ano)
+        for campo, valor in criterios['textos'].items():
+            consulta = normalizar(valor)
+            # O índice de trigramas só é usado por LIKE sem ESCAPE
+            like = "LIKE ? ESCAPE '\\'" if any(c in consulta for c in '%_\\') else "LIKE ?"
+            if campo == _COLUNA_DESCRICAO:
+                condicoes.append(f"rowid IN (SELECT rowid FROM itens_fts WHERE descricao_normalizada {like})")
+            elif campo in COLUNAS_NORMALIZADAS:
+                condicoes.append(f"{_q(COLUNAS_NORMALIZADAS[campo])} {like}")
+            elif campo in COLUNAS_EXIBIDAS:
+                condicoes.append(f"{_q(campo)} {like}")
+            else:
+                continue
+            parametros.append(_padrao_like(consulta))
+        for campo, selecionados in criterios['valores'].items():
+            if campo not in COLUNAS_EXIBIDAS and campo != COLUNA_ANO:
+                continue
+            coluna = 'ano' if campo == COLUNA_ANO else _q(campo)
+            condicoes.append(f"{coluna} IN ({', '.join('?' * len(selecionados))})")
+            parametros.extend(selecionados)
+        if criterios['periodo'] is not None:
+            inicio, fim = limites_periodo(criterios['periodo'])
+            condicoes.append("data_dias BETWEEN ? AND ?")
+            parametros.extend([int(inicio), int(fim)])
+        return (' WHERE ' + ' AND '.join(condicoes) if condicoes else ''), parametros
+
+    def _ordem(self, ordenacao):
+        if ordenacao is None:
+            return " ORDER BY rowid"
+        coluna, ascendente = ordenacao
+        if coluna == COLUNA_ANO:
+            chave = 'ano'
+        elif coluna == 'Data Desejada':
+            chave = 'data_dias'
+        elif coluna in COLUNAS_TIPADAS:
+            chave = COLUNAS_TIPADAS[coluna]
+        elif coluna in COLUNAS_CODIGO:
+            chave = f"CAST(NULLIF({_q(coluna)}, '') AS REAL)"
+        elif coluna in COLUNAS_NORMALIZADAS:
+            # Sem acentos e em minúsculas, como a ordenação em memória (services.ordenacao)
+            chave = f"NULLIF(TRIM({_q(COLUNAS_NORMALIZADAS[coluna])}), '')"
+        else:
+            chave = f"NULLIF({_q(coluna)}, '') COLLATE NOCASE"
+        direcao = 'ASC' if ascendente else 'DESC'
+        # Linhas sem valor sempre no fim; empates na ordem original
+        return f" ORDER BY ({chave}) IS NULL, {chave} {direcao}, rowid"
+
+    def ids(self, criterios, ano, ordenacao=None):
+        """rowids das linhas que atendem aos critérios, na ordem pedida ((coluna, ascendente) ou None)."""
+        where, parametros = self._where(criterios, ano)
+        cursor = self._leitor().execute(f"SELECT rowid FROM itens{where}{self._ordem(ordenacao)}", parametros)
+        return np.fromiter((linha[0] for linha in cursor), dtype=np.int64)
+
+    def totais(self, criterios, ano):
+        """Totais do rodapé no mesmo formato de filtros.calcular_totais, calculados pelo SQL."""
+        where, parametros = self._where(criterios, ano)
+        linhas = self._leitor().execute(
+            f"SELECT ano, COUNT(*), TOTAL(valor_numerico) FROM itens{where} GROUP BY ano ORDER BY ano",
+            parametros,
+        ).fetchall()
+        totais = {'registros': sum(l[1] for l in linhas), 'valor_total': float(sum(l[2] for l in linhas))}
+        if ano == TODOS_OS_ANOS:
+            por_ano = {a: {'registros': 0, 'valor_total': 0.0} for a in self.anos()}
+            por_ano.update({l[0]: {'registros': l[1], 'valor_total': float(l[2])} for l in linhas})
+            totais['por_ano'] = por_ano
+        return totais
+
+    def linhas(self, ids, colunas):
+        """{rowid: tupla com os valores de `colunas`} das linhas pedidas."""
+        selecao = ', '.join('ano' if c == COLUNA_ANO else _q(c) for c in colunas)
+        resultado = {}
+        ids = [int(i) for i in ids]
+        conexao = self._leitor()
+        for inicio in range(0, len(ids), 500):
+            bloco = ids[inicio:inicio + 500]
+            cursor = conexao.execute(
+                f"SELECT rowid, {selecao} FROM itens WHERE rowid IN ({', '.join('?' * len(bloco))})", bloco
+            )
+            for linha in cursor:
+                resultado[linha[0]] = linha[1:]
+        return resultado
+
+
+class MotorFiltroSQL:
+    """
+    Equivalente ao filtros.MotorFiltro para o banco SQLite: os filtros, a
+    ordenação e os totais são executados como SQL. Guarda a ordenação ativa,
+    aplicada a cada consulta, e os totais por critério. Os critérios são
+    sempre passados a `aplicar`, para que consultas de tarefas diferentes não
+    dependam umas das outras.
+    """
+
+    def __init__(self, banco, ano):
+        self.banco = banco
+        self.ano = ano
+        self.ordenacao = None
+        self._totais = OrderedDict()
+        self._lock = threading.Lock()
+
+    def aplicar(self, criterios):
+        with self._lock:
+            ordenacao = self.ordenacao
+        return self.banco.ids(criterios, self.ano, ordenacao)
+
+    def definir_ordenacao(self, coluna, ascendente=True):
+        """Passa a ordenar pela coluna; vale a partir da próxima chamada a `aplicar`."""
+        with self._lock:
+            self.ordenacao = (coluna, ascendente)
+
+    def totais(self, criterios, indices):
+        chave = chave_criterios(criterios)
+        with self._lock:
+            if chave in self._totais:
+                self._totais.move_to_end(chave)
+                return self._totais[chave]
+        totais = self.banco.totais(criterios, self.ano)
+        with self._lock:
+            self._totais[chave] = totais
+            while len(self._totais) > MAX_TOTAIS_EM_CACHE:
+                self._totais.popitem(last=False)
+        return totais
@@ -0,0 +1,72 @@
+# services/consolidado.py
+
+"""
+Consolidação dos planos de vários anos em um único DataFrame, para consultas
+que atravessam os anos (ex.: todos os itens de um PDM de 2024 a 2026).
+
+Os anos são concatenados com uma coluna 'Ano' categórica. Colunas de texto
+com muitos valores repetidos viram categorias com o mesmo conjunto de
+categorias em todos os anos, de modo que o DataFrame consolidado guarda cada
+texto distinto uma única vez em vez de uma cópia por linha.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Nome da aba e da entrada do RegistroAnos com a visão consolidada
+TODOS_OS_ANOS = 'Todos os anos'
+
+COLUNA_ANO = 'Ano'
+
+# Colunas de texto cuja fração de valores distintos fica abaixo deste limite
+# são codificadas como categorias
+FRACAO_MAXIMA_DISTINTOS = 0.5
+
+
+def _eh_texto(serie):
+    return pd.api.types.is_object_dtype(serie) or pd.api.types.is_string_dtype(serie)
+
+
+def _categorizar(series):
+    """Converte as partes de uma coluna em categorias com as mesmas categorias."""
+    categorias = pd.Index(sorted(set().union(*(
+        s.cat.categories if isinstance(s.dtype, pd.CategoricalDtype) else s.dropna().unique()
+        for s in series
+    ))))
+    tipo = pd.CategoricalDtype(categorias)
+    return [s.astype(tipo) for s in series]
+
+
+def consolidar(dfs_por_ano):
+    """
+    Concatena os DataFrames de `dfs_por_ano` ({ano: DataFrame}) em um único
+    DataFrame com a coluna categórica 'Ano'. Só as colunas comuns a todos os
+    anos são mantidas; as colunas categóricas (ou de texto repetitivo) são
+    unificadas para continuarem categóricas após a concatenação.
+    """
+    partes = {ano: df for ano, df in dfs_por_ano.items() if not df.empty}
+    if not partes:
+        return pd.DataFrame()
+
+    dfs = list(partes.values())
+    colunas = [c for c in dfs[0].columns if c != COLUNA_ANO and all(c in df.columns for df in dfs)]
+    total_linhas = sum(len(df) for df in dfs)
+
+    colunas_consolidadas = {}
+    for coluna in colunas:
+        series = [df[coluna].reset_index(drop=True) for df in dfs]
+        categorica = any(isinstance(s.dtype, pd.CategoricalDtype) for s in series)
+        if not categorica and all(_eh_texto(s) for s in series):
+            distintos = len(set().union(*(s.dropna().unique() for s in series)))
+            categorica = distintos < FRACAO_MAXIMA_DISTINTOS * total_linhas
+        if categorica:
+            series = _categorizar(series)
+        colunas_consolidadas[coluna] = pd.concat(series, ignore_index=True)
+
+    anos = list(partes)
+    codigos = np.repeat(np.arange(len(anos), dtype=np.int8 if len(anos) < 128 else np.int32),
+                        [len(df) for df in dfs])
+    consolidado = pd.DataFrame({COLUNA_ANO: pd.Categorical.from_codes(codigos, categories=anos)})
+    for coluna, serie in colunas_consolidadas.items():
+        consolidado[coluna] = serie
+    return consolidado
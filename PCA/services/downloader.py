@@ -1,52 +1,813 @@
 # services/downloader.py - ATUALIZADO
 
+import heapq
+import io
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
 import requests
+import numpy as np
 import pandas as pd
-import io # Necessário para ler o conteúdo do download em memória
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from .preferencias import carregar_preferencias
+from .manifesto import carregar_manifesto, salvar_manifesto, sha256_arquivo
+from .instrumentacao import cronometrado, medir, registrar, contar
+from .parser import MEMORIA_COMPACTA, gerar_cache_colunar, carregar_ano, caminho_csv, pasta_particoes
+from .alteracoes import registrar_alteracoes, impressoes_salvas
+
+# UASGs mantidas quando as preferências não trazem a lista 'uasgs'. Uma
+# lista vazia nas preferências mantém todas as unidades dos órgãos.
+UASGS_PADRAO = ['250052']
+
+# Nomes das partições de URLs sem órgão e de linhas sem UASG
+SEM_ORGAO = 'sem_orgao'
+SEM_UASG = 'sem_uasg'
+
+# Trecho do órgão nas URLs do PNCP (.../orgaos/<código>/planos-de-contratacao/...)
+_PADRAO_ORGAO = re.compile(r'/orgaos/([^/?]+)/')
+
+# Quantidade máxima de anos baixados ao mesmo tempo
+MAX_DOWNLOADS_SIMULTANEOS = 4
+
+# Quantidade máxima de páginas de um mesmo ano baixadas ao mesmo tempo
+MAX_PAGINAS_SIMULTANEAS = 4
+
+# Tamanho de cada bloco lido da resposta HTTP (em bytes)
+TAMANHO_BLOCO = 1024 * 256
+
+# Quantidade de linhas do CSV processadas por vez durante a filtragem
+LINHAS_POR_LOTE = 50000
+
+TIMEOUT_REQUISICAO = 60
 
-# A UASG padrão que será usada para filtrar todos os dados
-UASG_PADRAO = '250052'
+# Novas tentativas em falhas temporárias do servidor, com espera exponencial
+# (0,5s, 1s, 2s, ...) entre elas
+TENTATIVAS = 4
+FATOR_ESPERA = 0.5
+STATUS_REPETIR = (429, 500, 502, 503, 504)
 
-def download_csv_files():
+# Cabeçalhos que podem informar o total de páginas / registros da consulta
+CABECALHOS_TOTAL_PAGINAS = ('X-Total-Pages', 'totalPaginas')
+CABECALHOS_TOTAL_REGISTROS = ('X-Total-Count', 'totalRegistros')
+
+# Respostas que, numa página sondada além da primeira (total desconhecido),
+# indicam apenas que os dados acabaram
+STATUS_FIM_DOS_DADOS = (204, 400, 404)
+
+
+class DownloadCancelado(Exception):
+    """Lançada dentro das threads de download quando o cancelamento é solicitado."""
+
+
+def criar_sessao(max_conexoes=MAX_DOWNLOADS_SIMULTANEOS * MAX_PAGINAS_SIMULTANEAS):
     """
-    Baixa os arquivos CSV, filtra pela UASG padrão em memória e salva
-    apenas os dados relevantes no disco.
+    Cria uma sessão HTTP compartilhada, com pool de conexões dimensionado
+    para a quantidade de downloads simultâneos e novas tentativas automáticas
+    em falhas temporárias.
     """
-    preferencias = carregar_preferencias()
-    urls = preferencias.get("data_sources", {})
+    sessao = requests.Session()
+    retry = Retry(total=TENTATIVAS, backoff_factor=FATOR_ESPERA,
+                  status_forcelist=STATUS_REPETIR, allowed_methods=frozenset(['GET']))
+    adaptador = HTTPAdapter(pool_connections=max_conexoes, pool_maxsize=max_conexoes, max_retries=retry)
+    sessao.mount('http://', adaptador)
+    sessao.mount('https://', adaptador)
+    return sessao
 
-    if not urls:
-        print("Nenhuma fonte de dados encontrada nas preferências.")
-        return
 
-    for ano, url in urls.items():
-        print(f"📥 Baixando dados de {ano}...")
+class _ContadorBytes:
+    """
+    Soma os bytes recebidos de todas as páginas de um ano e repassa o total
+    ao callback de progresso. Pode ser chamado por várias threads.
+    """
+    def __init__(self, ano, progress_callback=None, cancelamento=None):
+        self.ano = ano
+        self.progress_callback = progress_callback
+        self.cancelamento = cancelamento
+        self.total = 0
+        self.esperado = None
+        self._lock = threading.Lock()
+
+    def verificar_cancelamento(self):
+        if self.cancelamento is not None and self.cancelamento.is_set():
+            raise DownloadCancelado(self.ano)
+
+    def __call__(self, n):
+        self.verificar_cancelamento()
+        with self._lock:
+            self.total += n
+            total = self.total
+        if self.progress_callback:
+            self.progress_callback(self.ano, total, self.esperado)
+
+
+class _LeitorResposta(io.RawIOBase):
+    """
+    Expõe o corpo de uma resposta HTTP (lido em blocos) como um arquivo binário,
+    para que o pandas possa consumi-lo aos poucos. Cada bloco recebido é
+    informado ao contador de bytes.
+    """
+    def __init__(self, response, contador):
+        super().__init__()
+        self._blocos = response.iter_content(chunk_size=TAMANHO_BLOCO)
+        self._pendente = b''
+        self._contador = contador
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pendente:
+            try:
+                self._pendente = next(self._blocos)
+            except StopIteration:
+                return 0
+            self._contador(len(self._pendente))
+        n = min(len(buffer), len(self._pendente))
+        buffer[:n] = self._pendente[:n]
+        self._pendente = self._pendente[n:]
+        return n
+
+
+def filtrar_csv_em_lotes(arquivo, caminho_saida, uasgs=UASGS_PADRAO, linhas_por_lote=LINHAS_POR_LOTE,
+                         cabecalho=True):
+    """
+    Lê um CSV (caminho ou arquivo binário) em lotes de `linhas_por_lote` linhas e
+    grava em `caminho_saida` apenas as linhas das UASGs informadas (todas, se
+    `uasgs` for vazio). Apenas um lote fica em memória por vez. Retorna
+    (linhas_lidas, linhas_gravadas).
+    """
+    if isinstance(uasgs, str):
+        uasgs = [uasgs]
+    linhas_lidas = 0
+    linhas_gravadas = 0
+    cabecalho_gravado = not cabecalho
+
+    with open(caminho_saida, 'w', encoding='utf-8', newline='') as saida:
         try:
-            response = requests.get(url, timeout=60)
-            response.raise_for_status()
-            response.encoding = 'utf-8'
-            
-            caminho_arquivo = f"data/pca_{ano}.csv"
-
-            # Carrega o conteúdo baixado em um DataFrame do pandas
-            # Usamos io.StringIO para tratar o texto como se fosse um arquivo
-            df = pd.read_csv(io.StringIO(response.text), sep=';', dtype=str)
-
-            print(f"📄 Original com {len(df)} linhas. Filtrando pela UASG {UASG_PADRAO}...")
-
-            # Filtra o DataFrame para manter apenas as linhas da UASG desejada
-            if 'UASG' in df.columns:
-                df_filtrado = df[df['UASG'] == UASG_PADRAO].copy()
-                print(f" फिल्टर Feito. {len(df_filtrado)} linhas salvas.")
-            else:
+            lotes = pd.read_csv(arquivo, sep=';', dtype=str, encoding='utf-8', chunksize=linhas_por_lote)
+        except pd.errors.EmptyDataError:
+            # Resposta sem conteúdo (ex.: página além da última)
+            return 0, 0
+        for lote in lotes:
+            linhas_lidas += len(lote)
+            if 'UASG' in lote.columns:
+                if uasgs:
+                    lote = lote[lote['UASG'].isin(uasgs)]
+            elif linhas_lidas == len(lote):
                 print("Aviso: Coluna 'UASG' não encontrada no arquivo. Salvando dados originais.")
-                df_filtrado = df
+            lote.to_csv(saida, sep=';', index=False, header=not cabecalho_gravado)
+            cabecalho_gravado = True
+            linhas_gravadas += len(lote)
+
+    return linhas_lidas, linhas_gravadas
+
+
+def urls_por_orgao(url, orgaos=None):
+    """
+    {órgão: URL} de um ano: a URL das preferências com o código do órgão
+    trocado por cada um de `orgaos`. Sem `orgaos`, apenas o órgão da própria
+    URL; URLs sem o trecho /orgaos/<código>/ não são desdobradas.
+    """
+    encontrado = _PADRAO_ORGAO.search(url)
+    if not encontrado:
+        return {'': url}
+    if not orgaos:
+        return {encontrado.group(1): url}
+    return {str(orgao): url[:encontrado.start(1)] + str(orgao) + url[encontrado.end(1):] for orgao in orgaos}
+
+
+def _chave_manifesto(ano, orgao):
+    return f"{ano}/{orgao or SEM_ORGAO}"
+
+
+def _pasta_orgao(ano, orgao, destino):
+    return os.path.join(pasta_particoes(ano, destino), orgao or SEM_ORGAO)
+
+
+def _nome_particao(uasg):
+    return 'uasg_' + re.sub(r'[^0-9A-Za-z_-]', '_', str(uasg)) + '.csv'
+
+
+def _nome_ordem(uasg):
+    """Arquivo com a posição de cada linha da partição no CSV do órgão (ver `_particionar`)."""
+    return 'uasg_' + re.sub(r'[^0-9A-Za-z_-]', '_', str(uasg)) + '.ordem.npy'
+
+
+def _url_pagina(url, pagina):
+    """Retorna a URL com o parâmetro `pagina` substituído."""
+    partes = urlsplit(url)
+    parametros = [(k, v) for k, v in parse_qsl(partes.query, keep_blank_values=True) if k != 'pagina']
+    parametros.append(('pagina', str(pagina)))
+    return urlunsplit(partes._replace(query=urlencode(parametros)))
+
+
+def _tamanho_pagina(url):
+    """Retorna o `tamanhoPagina` da URL, ou None se a URL não for paginada."""
+    parametros = dict(parse_qsl(urlsplit(url).query))
+    if 'pagina' not in parametros:
+        return None
+    try:
+        return int(parametros.get('tamanhoPagina', ''))
+    except ValueError:
+        return None
+
+
+def _total_paginas(cabecalhos, tamanho_pagina):
+    """Descobre o total de páginas pelos cabeçalhos da primeira resposta, se informado."""
+    for nome in CABECALHOS_TOTAL_PAGINAS:
+        if cabecalhos.get(nome, '').isdigit():
+            return int(cabecalhos[nome])
+    for nome in CABECALHOS_TOTAL_REGISTROS:
+        if cabecalhos.get(nome, '').isdigit():
+            return max(1, -(-int(cabecalhos[nome]) // tamanho_pagina))
+    return None
+
+
+def _baixar_pagina(sessao, url, caminho_saida, contador, cabecalhos=None, cabecalho_csv=True,
+                   uasgs=UASGS_PADRAO, sondagem=False):
+    """
+    Baixa uma página e grava em `caminho_saida` apenas as linhas das UASGs pedidas.
+    Retorna None se o servidor responder 304 (não modificado) ou um dicionário
+    com as linhas lidas/gravadas e os cabeçalhos da resposta. Numa `sondagem`
+    (página que pode não existir), STATUS_FIM_DOS_DADOS conta como página vazia.
+    """
+    with sessao.get(url, headers=cabecalhos, timeout=TIMEOUT_REQUISICAO, stream=True) as response:
+        if response.status_code == 304:
+            return None
+        if sondagem and response.status_code in STATUS_FIM_DOS_DADOS:
+            open(caminho_saida, 'wb').close()
+            return {'linhas_lidas': 0, 'linhas_gravadas': 0, 'headers': response.headers}
+        response.raise_for_status()
+        if contador.esperado is None and response.headers.get('Content-Length', '').isdigit():
+            contador.esperado = int(response.headers['Content-Length'])
+        with io.BufferedReader(_LeitorResposta(response, contador), buffer_size=TAMANHO_BLOCO) as arquivo:
+            linhas_lidas, linhas_gravadas = filtrar_csv_em_lotes(arquivo, caminho_saida, uasgs,
+                                                                 cabecalho=cabecalho_csv)
+        return {'linhas_lidas': linhas_lidas, 'linhas_gravadas': linhas_gravadas, 'headers': response.headers}
+
+
+def _baixar_demais_paginas(sessao, url, caminho_temporario, contador, primeira, tamanho_pagina,
+                           uasgs=UASGS_PADRAO):
+    """
+    Baixa em paralelo as páginas 2..N de uma consulta paginada, cada uma em
+    um arquivo de parte próprio. Quando o servidor não informa o total de
+    páginas, elas são pedidas em levas de MAX_PAGINAS_SIMULTANEAS até surgir
+    uma página incompleta; páginas além do fim podem vir vazias ou com
+    STATUS_FIM_DOS_DADOS. Retorna {pagina: (caminho_da_parte, resumo)}.
+    """
+    total = _total_paginas(primeira['headers'], tamanho_pagina)
+    if total is None and primeira['linhas_lidas'] < tamanho_pagina:
+        total = 1
+
+    partes = {}
+    with ThreadPoolExecutor(max_workers=MAX_PAGINAS_SIMULTANEAS) as executor:
+        proxima = 2
+        while total is None or proxima <= total:
+            ultima = total if total is not None else proxima + MAX_PAGINAS_SIMULTANEAS - 1
+            futuros = {}
+            for pagina in range(proxima, ultima + 1):
+                caminho_parte = f"{caminho_temporario}.{pagina}"
+                partes[pagina] = (caminho_parte, None)
+                futuros[pagina] = executor.submit(_baixar_pagina, sessao, _url_pagina(url, pagina),
+                                                  caminho_parte, contador, None, False, uasgs, total is None)
+            for pagina, futuro in futuros.items():
+                partes[pagina] = (partes[pagina][0], futuro.result())
+            if total is None and any(partes[p][1]['linhas_lidas'] < tamanho_pagina for p in futuros):
+                break
+            contador.verificar_cancelamento()
+            proxima = ultima + 1
+    return partes
+
+
+def _juntar_partes(caminho_temporario, partes):
+    """Acrescenta, em ordem de página, o conteúdo das partes ao arquivo temporário."""
+    with open(caminho_temporario, 'ab') as saida:
+        for pagina in sorted(partes):
+            with open(partes[pagina][0], 'rb') as parte:
+                while bloco := parte.read(TAMANHO_BLOCO):
+                    saida.write(bloco)
+
+
+def _validadores(cabecalhos):
+    """ETag / Last-Modified de uma resposta, guardados no manifesto por página."""
+    return {'etag': cabecalhos.get('ETag'), 'last_modified': cabecalhos.get('Last-Modified')}
+
+
+def _condicionais(validadores):
+    """Cabeçalhos If-None-Match / If-Modified-Since a partir dos validadores de uma página."""
+    cabecalhos = {}
+    if validadores.get('etag'):
+        cabecalhos['If-None-Match'] = validadores['etag']
+    if validadores.get('last_modified'):
+        cabecalhos['If-Modified-Since'] = validadores['last_modified']
+    return cabecalhos
+
+
+def _cabecalhos_condicionais(entrada_anterior, url, uasgs, pasta):
+    """
+    Monta os cabeçalhos condicionais da primeira página a partir do
+    manifesto, desde que a URL e as UASGs não tenham mudado e as partições
+    locais ainda existam.
+    """
+    if (not entrada_anterior or entrada_anterior.get('url') != url
+            or entrada_anterior.get('uasgs') != sorted(uasgs) or 'particoes' not in entrada_anterior
+            or not entrada_anterior.get('validadores')):
+        return {}
+    # Partições gravadas sem a ordem das linhas são baixadas de novo para ganhá-la
+    if not all('ordem' in particao and os.path.exists(os.path.join(pasta, _nome_particao(uasg)))
+               and os.path.exists(os.path.join(pasta, _nome_ordem(uasg)))
+               for uasg, particao in entrada_anterior['particoes'].items()):
+        return {}
+    return _condicionais(entrada_anterior['validadores'][0])
+
+
+def _pagina_inalterada(sessao, url, cabecalhos):
+    """Se o servidor responde 304 à requisição condicional da página (o corpo não é lido)."""
+    with sessao.get(url, headers=cabecalhos, timeout=TIMEOUT_REQUISICAO, stream=True) as response:
+        return response.status_code == 304
+
+
+def _pagina_vazia(sessao, url):
+    """Se a página além da última conhecida continua sem linhas (vazia ou STATUS_FIM_DOS_DADOS)."""
+    with sessao.get(url, timeout=TIMEOUT_REQUISICAO, stream=True) as response:
+        if response.status_code in STATUS_FIM_DOS_DADOS:
+            return True
+        response.raise_for_status()
+        return not any(linha.strip() for linha in response.content.splitlines()[1:])
+
+
+def _paginas_inalteradas(sessao, url, validadores, contador):
+    """
+    Com a primeira página inalterada, confirma as demais: cada página
+    conhecida é pedida de novo de forma condicional, e a seguinte à última
+    é sondada, já que linhas novas podem criar uma página a mais. Retorna
+    True se nenhuma delas mudou.
+    """
+    ultima = len(validadores)
+    with ThreadPoolExecutor(max_workers=MAX_PAGINAS_SIMULTANEAS) as executor:
+        futuros = [executor.submit(_pagina_inalterada, sessao, _url_pagina(url, pagina),
+                                   _condicionais(validadores[pagina - 1]))
+                   for pagina in range(2, ultima + 1)]
+        futuros.append(executor.submit(_pagina_vazia, sessao, _url_pagina(url, ultima + 1)))
+        inalteradas = [futuro.result() for futuro in futuros]
+    contador.verificar_cancelamento()
+    return all(inalteradas)
+
+
+def _particionar(caminho_filtrado, pasta, anteriores):
+    """
+    Divide o CSV filtrado de um órgão em um arquivo por UASG dentro de
+    `pasta`. Ao lado de cada partição fica a posição de cada uma de suas
+    linhas no CSV do órgão (`_nome_ordem`), para que `_montar_ano` devolva
+    as linhas à ordem em que o servidor as enviou. Só as partições cujo
+    SHA-256 mudou em relação ao manifesto (`anteriores`, {uasg: {'sha256',
+    'ordem', 'linhas'}}) são substituídas; as das UASGs que deixaram de vir
+    são apagadas. Retorna ({uasg: {'sha256', 'ordem', 'linhas'}}, [UASGs
+    cujas partições mudaram]).
+    """
+    saidas = {}
+    linhas = {}
+    posicoes = {}
+    try:
+        try:
+            lotes = pd.read_csv(caminho_filtrado, sep=';', dtype=str, encoding='utf-8', chunksize=LINHAS_POR_LOTE)
+            for lote in lotes:
+                chaves = lote['UASG'].fillna(SEM_UASG) if 'UASG' in lote.columns else pd.Series(SEM_UASG, index=lote.index)
+                for uasg, grupo in lote.groupby(chaves, sort=False):
+                    nova = uasg not in saidas
+                    if nova:
+                        saidas[uasg] = open(os.path.join(pasta, _nome_particao(uasg) + '.part'), 'w',
+                                            encoding='utf-8', newline='')
+                    grupo.to_csv(saidas[uasg], sep=';', index=False, header=nova)
+                    linhas[uasg] = linhas.get(uasg, 0) + len(grupo)
+                    # O índice dos lotes do pandas é contínuo: é a posição da linha no arquivo
+                    posicoes.setdefault(uasg, []).append(grupo.index.to_numpy(dtype=np.int64))
+        except pd.errors.EmptyDataError:
+            pass
+    finally:
+        for saida in saidas.values():
+            saida.close()
+
+    particoes, alteradas = {}, []
+    for uasg, quantidade in linhas.items():
+        caminho = os.path.join(pasta, _nome_particao(uasg))
+        sha256 = sha256_arquivo(caminho + '.part')
+        if anteriores.get(uasg, {}).get('sha256') == sha256 and os.path.exists(caminho):
+            os.remove(caminho + '.part')
+        else:
+            os.replace(caminho + '.part', caminho)
+            alteradas.append(uasg)
+        # A ordem pode mudar sem que a partição mude (ex.: linha nova de outra
+        # UASG no meio do arquivo); ela entra na composição do ano, não em `alteradas`
+        caminho_ordem = os.path.join(pasta, _nome_ordem(uasg))
+        with open(caminho_ordem + '.part', 'wb') as saida:
+            np.save(saida, np.concatenate(posicoes[uasg]))
+        ordem = sha256_arquivo(caminho_ordem + '.part')
+        if anteriores.get(uasg, {}).get('ordem') == ordem and os.path.exists(caminho_ordem):
+            os.remove(caminho_ordem + '.part')
+        else:
+            os.replace(caminho_ordem + '.part', caminho_ordem)
+        particoes[uasg] = {'sha256': sha256, 'ordem': ordem, 'linhas': quantidade}
+    for uasg in anteriores:
+        if uasg not in particoes:
+            for nome in (_nome_particao(uasg), _nome_ordem(uasg)):
+                if os.path.exists(os.path.join(pasta, nome)):
+                    os.remove(os.path.join(pasta, nome))
+            alteradas.append(uasg)
+    return particoes, alteradas
+
+
+def _baixar_orgao(sessao, ano, orgao, url, destino, uasgs, rotulo, progress_callback=None,
+                  entrada_anterior=None, cancelamento=None):
+    """
+    Baixa o CSV de um órgão em um ano e filtra pelas UASGs pedidas à medida
+    que os blocos chegam. Se a URL for paginada (`pagina`/`tamanhoPagina`),
+    todas as páginas são baixadas em paralelo e juntadas em ordem. O
+    resultado é dividido em uma partição por UASG em
+    data/particoes/<ano>/<órgão>/, e só as partições que mudaram são
+    regravadas. `rotulo` identifica o download no progresso e nas mensagens.
+    """
+    inicio = time.perf_counter()
+    pasta = _pasta_orgao(ano, orgao, destino)
+    os.makedirs(pasta, exist_ok=True)
+    caminho_temporario = os.path.join(pasta, 'download.part')
+    cabecalhos = _cabecalhos_condicionais(entrada_anterior, url, uasgs, pasta)
+    contador = _ContadorBytes(rotulo, progress_callback, cancelamento)
+    tamanho_pagina = _tamanho_pagina(url)
+    partes = {}
+
+    try:
+        # Todas as páginas são revalidadas: só se nenhuma mudou o órgão é
+        # considerado inalterado; caso contrário ele é baixado por inteiro.
+        primeira = _baixar_pagina(sessao, _url_pagina(url, 1) if tamanho_pagina else url,
+                                  caminho_temporario, contador, cabecalhos, uasgs=uasgs)
+        if (primeira is None and tamanho_pagina
+                and not _paginas_inalteradas(sessao, url, entrada_anterior['validadores'], contador)):
+            primeira = _baixar_pagina(sessao, _url_pagina(url, 1), caminho_temporario, contador, uasgs=uasgs)
+        if primeira is None:
+            registrar('download_orgao', time.perf_counter() - inicio, ano=ano, orgao=orgao, status='inalterado')
+            return {
+                'status': 'inalterado',
+                'bytes': 0,
+                'linhas': None,
+                'paginas': 0,
+                'alteradas': [],
+                'manifesto': entrada_anterior,
+                'inicio': inicio,
+                'fim': time.perf_counter(),
+            }
+
+        if tamanho_pagina:
+            contador.esperado = None
+            partes = _baixar_demais_paginas(sessao, url, caminho_temporario, contador, primeira, tamanho_pagina,
+                                            uasgs)
+            _juntar_partes(caminho_temporario, partes)
+
+        linhas_lidas = primeira['linhas_lidas'] + sum(r['linhas_lidas'] for _, r in partes.values())
+        linhas_gravadas = primeira['linhas_gravadas'] + sum(r['linhas_gravadas'] for _, r in partes.values())
+
+        with open(caminho_temporario, 'rb') as arquivo:
+            cabecalho_csv = arquivo.readline().decode('utf-8')
+        particoes, alteradas = _particionar(caminho_temporario, pasta,
+                                            (entrada_anterior or {}).get('particoes', {}))
+    finally:
+        temporarios = [c for c, _ in partes.values()]
+        temporarios += [os.path.join(pasta, nome) for nome in os.listdir(pasta) if nome.endswith('.part')]
+        for caminho in temporarios:
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+    contar('bytes_baixados', contador.total)
+    contar('particoes_alteradas', len(alteradas))
+    registrar('download_orgao', time.perf_counter() - inicio, ano=ano, orgao=orgao, bytes=contador.total,
+              paginas=1 + len(partes), linhas=linhas_gravadas, particoes_alteradas=len(alteradas))
+    unidades = f"das UASGs {', '.join(uasgs)}" if uasgs else "de todas as UASGs"
+    print(f"📄 {rotulo}: {linhas_lidas} linhas recebidas em {1 + len(partes)} página(s), "
+          f"{linhas_gravadas} {unidades}, {len(alteradas)} partição(ões) alterada(s).")
+
+    return {
+        'status': 'atualizado' if alteradas else 'inalterado',
+        'bytes': contador.total,
+        'linhas': linhas_gravadas,
+        'paginas': 1 + len(partes),
+        'alteradas': alteradas,
+        'inicio': inicio,
+        'fim': time.perf_counter(),
+        'manifesto': {
+            'url': url,
+            'uasgs': sorted(uasgs),
+            # Uma entrada por página até a última com linhas (ver _paginas_inalteradas)
+            'validadores': [_validadores(primeira['headers'])] + [
+                _validadores(partes[pagina][1]['headers'])
+                for pagina in range(2, max([p for p, (_, r) in partes.items() if r['linhas_lidas']], default=1) + 1)],
+            'bytes': contador.total,
+            'cabecalho': cabecalho_csv,
+            'particoes': particoes,
+            'baixado_em': datetime.now().isoformat(timespec='seconds'),
+        },
+    }
+
+
+def _composicao(entradas):
+    """
+    Identifica o conteúdo do CSV de um ano: as partições (órgão, UASG), seus
+    SHA-256 e o da ordem de suas linhas.
+    """
+    return [[orgao, uasg, particao['sha256'], particao.get('ordem')]
+            for orgao, entrada in entradas for uasg, particao in sorted(entrada['particoes'].items())]
+
+
+def _particoes_do_orgao(ano, orgao, entrada, destino):
+    """
+    [(caminho_da_partição, posições das linhas ou None)] das partições de um
+    órgão. As posições faltam em partições gravadas antes de a ordem ser
+    guardada.
+    """
+    pasta = _pasta_orgao(ano, orgao, destino)
+    particoes = []
+    for uasg in sorted(entrada['particoes']):
+        caminho_ordem = os.path.join(pasta, _nome_ordem(uasg))
+        posicoes = np.load(caminho_ordem) if os.path.exists(caminho_ordem) else None
+        particoes.append((os.path.join(pasta, _nome_particao(uasg)), posicoes))
+    return particoes
+
+
+def _contar_linhas(caminho):
+    """Quantidade de linhas físicas de um arquivo, sem contar o cabeçalho."""
+    quantidade = 0
+    with open(caminho, 'rb') as arquivo:
+        while bloco := arquivo.read(TAMANHO_BLOCO):
+            quantidade += bloco.count(b'\n')
+    return quantidade - 1
+
+
+def _intercalar(saida, particoes):
+    """
+    Grava em `saida` as linhas das partições de um órgão na ordem em que
+    vieram do servidor, intercalando os arquivos (cada um já em ordem
+    crescente de posição) sem carregá-los em memória.
+    """
+    def linhas(caminho, posicoes):
+        with open(caminho, 'rb') as parte:
+            parte.readline()
+            yield from zip(posicoes.tolist(), parte)
+
+    for _, linha in heapq.merge(*(linhas(c, p) for c, p in particoes), key=lambda item: item[0]):
+        saida.write(linha)
+
+
+def _ler_orgao(particoes):
+    """DataFrame das partições de um órgão, na ordem do servidor quando ela é conhecida."""
+    quadros = [pd.read_csv(c, sep=';', dtype=str, encoding='utf-8') for c, _ in particoes]
+    if quadros and all(p is not None and len(p) == len(q) for (_, p), q in zip(particoes, quadros)):
+        ordem = np.argsort(np.concatenate([p for _, p in particoes]), kind='stable')
+        return pd.concat(quadros, ignore_index=True).iloc[ordem]
+    return pd.concat(quadros, ignore_index=True) if quadros else pd.DataFrame()
+
+
+def _montar_ano(ano, destino, entradas, compacto=MEMORIA_COMPACTA):
+    """
+    Junta as partições do ano em data/pca_<ano>.csv (o arquivo lido pelo
+    restante do programa) e regrava o cache colunar no modo de memória
+    `compacto`. Os órgãos entram na ordem das preferências e, dentro de
+    cada um, as linhas voltam à ordem em que o servidor as enviou. Se os
+    órgãos tiverem cabeçalhos diferentes (ou se a ordem de alguma partição
+    não puder ser usada linha a linha, ex.: descrições com quebra de
+    linha), o pandas alinha as colunas; caso contrário as linhas são
+    copiadas como estão. Retorna o DataFrame tipado da nova versão.
+    """
+    orgaos = [_particoes_do_orgao(ano, orgao, entrada, destino) for orgao, entrada in entradas]
+    cabecalhos = [entrada.get('cabecalho', '') for _, entrada in entradas if entrada['particoes']]
+    copia_direta = len(set(cabecalhos)) <= 1 and all(
+        posicoes is not None and len(posicoes) == _contar_linhas(caminho)
+        for particoes in orgaos for caminho, posicoes in particoes)
+    caminho_arquivo = caminho_csv(ano, destino)
+    caminho_temporario = caminho_arquivo + '.part'
+    try:
+        if not copia_direta:
+            pd.concat([_ler_orgao(particoes) for particoes in orgaos if particoes],
+                      ignore_index=True).to_csv(caminho_temporario, sep=';', index=False, encoding='utf-8')
+        else:
+            # Sem partições (nenhuma linha das UASGs), fica só o cabeçalho
+            cabecalho = next((e.get('cabecalho') for _, e in entradas if e.get('cabecalho')), '')
+            with open(caminho_temporario, 'wb') as saida:
+                saida.write(cabecalho.encode('utf-8'))
+                for particoes in orgaos:
+                    _intercalar(saida, particoes)
+        os.replace(caminho_temporario, caminho_arquivo)
+    finally:
+        if os.path.exists(caminho_temporario):
+            os.remove(caminho_temporario)
+    return gerar_cache_colunar(ano, destino, compacto=compacto)
+
+
+def _versao_anterior(ano, destino, compacto=MEMORIA_COMPACTA):
+    """
+    DataFrame e impressões digitais guardadas da versão atual do ano, lidos
+    antes de o CSV ser substituído; (None, None) no primeiro download.
+    """
+    if not os.path.exists(caminho_csv(ano, destino)):
+        return None, None
+    try:
+        return carregar_ano(ano, destino, compacto), impressoes_salvas(ano, destino, compacto)
+    except (OSError, ValueError) as e:
+        print(f"Aviso: não foi possível ler a versão anterior de {ano} para comparar: {e}")
+        return None, None
+
+
+def _registrar_alteracoes(ano, destino, anterior, impressoes_anteriores, novo, compacto=MEMORIA_COMPACTA):
+    """Compara as versões do ano (ver services.alteracoes); uma falha aqui não invalida o download."""
+    try:
+        with medir('comparar_versoes', ano=ano, linhas=len(novo)) as detalhes:
+            resumo = registrar_alteracoes(ano, anterior, novo, destino, impressoes_anteriores, compacto)
+            detalhes['impressoes_guardadas'] = impressoes_anteriores is not None
+    except (OSError, ValueError) as e:
+        print(f"Aviso: não foi possível registrar as alterações de {ano}: {e}")
+        return None
+    if resumo:
+        print(f"🔁 {ano}: {resumo['adicionados']} item(ns) novo(s), {resumo['removidos']} removido(s), "
+              f"{resumo['modificados']} modificado(s).")
+    return resumo
+
+
+def _remover_orgaos_antigos(ano, orgaos, destino, manifesto):
+    """Apaga as partições e as entradas do manifesto de órgãos que saíram das preferências."""
+    atuais = {orgao or SEM_ORGAO for orgao in orgaos}
+    pasta = pasta_particoes(ano, destino)
+    for nome in os.listdir(pasta) if os.path.isdir(pasta) else []:
+        if nome not in atuais and os.path.isdir(os.path.join(pasta, nome)):
+            shutil.rmtree(os.path.join(pasta, nome), ignore_errors=True)
+    for chave in [c for c in manifesto if c.startswith(f"{ano}/") and c.split('/', 1)[1] not in atuais]:
+        del manifesto[chave]
+
+
+@cronometrado('download')
+def download_csv_files(urls=None, destino='data', max_workers=MAX_DOWNLOADS_SIMULTANEOS,
+                       progress_callback=None, sessao=None, cancelamento=None, orgaos=None, uasgs=None,
+                       compacto=None):
+    """
+    Baixa os arquivos CSV de todos os anos e órgãos em paralelo, filtra pelas
+    UASGs durante o download e salva apenas os dados relevantes no disco,
+    particionados por ano, órgão e UASG. URLs paginadas têm todas as suas
+    páginas baixadas.
+
+    `orgaos` (códigos do PNCP), `uasgs` e `compacto` vêm das preferências
+    'orgaos', 'uasgs' e 'memoria_compacta' quando `urls` não é informado.
+    Cada URL de ano é repetida para cada órgão (ver `urls_por_orgao`); sem
+    `uasgs`, vale UASGS_PADRAO, e uma lista vazia mantém todas as unidades.
+    `compacto` é o modo de memória em que a interface carrega os anos: o
+    cache colunar regravado ao remontar um ano usa os mesmos tipos.
+
+    As requisições são condicionais (ETag / Last-Modified de cada página,
+    guardados no manifesto em `destino`): órgãos que não mudaram custam uma
+    ida ao servidor por página e nenhuma escrita em disco. Das respostas
+    reenviadas, só as partições (órgão, UASG) com SHA-256 diferente são
+    regravadas, e o CSV do ano só é remontado a partir das partições
+    quando alguma delas mudou. Ao remontar,
+    os itens adicionados, removidos e modificados em relação à versão
+    anterior são registrados (ver services.alteracoes).
+
+    `progress_callback(rotulo, bytes_baixados, bytes_totais)` é chamado a
+    cada bloco recebido (a partir das threads de download), com o ano como
+    rótulo, ou "ano/órgão" quando há vários órgãos. `bytes_totais` é None
+    quando o total não é conhecido (ex.: servidor sem Content-Length ou
+    consulta paginada).
+
+    `cancelamento` é um threading.Event opcional; quando sinalizado, os
+    downloads em andamento são interrompidos sem alterar os arquivos existentes.
+
+    Retorna um dicionário {ano: resumo}, onde o resumo traz 'status'
+    ('atualizado', 'inalterado', 'cancelado' ou 'erro'), 'bytes', 'linhas',
+    'paginas', 'segundos', 'particoes_alteradas', 'alteracoes' (o resumo das
+    diferenças em relação à versão anterior do ano, ver
+    services.alteracoes, ou None) e, em caso de falha, 'erro'.
+    """
+    if urls is None:
+        preferencias = carregar_preferencias()
+        urls = preferencias.get("data_sources", {})
+        if orgaos is None:
+            orgaos = preferencias.get("orgaos")
+        if uasgs is None:
+            uasgs = preferencias.get("uasgs", UASGS_PADRAO)
+        if compacto is None:
+            compacto = preferencias.get("memoria_compacta", MEMORIA_COMPACTA)
+    if uasgs is None:
+        uasgs = UASGS_PADRAO
+    if compacto is None:
+        compacto = MEMORIA_COMPACTA
+    uasgs = [str(uasg) for uasg in uasgs]
+
+    if not urls:
+        print("Nenhuma fonte de dados encontrada nas preferências.")
+        return {}
+
+    os.makedirs(destino, exist_ok=True)
+    manifesto = carregar_manifesto(destino)
+    manifesto_alterado = False
+
+    orgaos_por_ano = {ano: urls_por_orgao(url, orgaos) for ano, url in urls.items()}
+    varios_orgaos = len({orgao for urls_orgaos in orgaos_por_ano.values() for orgao in urls_orgaos}) > 1
+
+    sessao_propria = sessao is None
+    if sessao_propria:
+        sessao = criar_sessao(max_workers * MAX_PAGINAS_SIMULTANEAS)
+
+    resumos = {ano: {} for ano in urls}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futuros = {}
+            for ano, urls_orgaos in orgaos_por_ano.items():
+                for orgao, url in urls_orgaos.items():
+                    rotulo = f"{ano}/{orgao}" if varios_orgaos else ano
+                    print(f"📥 Baixando dados de {rotulo}...")
+                    futuro = executor.submit(_baixar_orgao, sessao, ano, orgao, url, destino, uasgs, rotulo,
+                                             progress_callback, manifesto.get(_chave_manifesto(ano, orgao)),
+                                             cancelamento)
+                    futuros[futuro] = (ano, orgao, rotulo)
+
+            for futuro in as_completed(futuros):
+                ano, orgao, rotulo = futuros[futuro]
+                try:
+                    resumo = futuro.result()
+                except DownloadCancelado:
+                    print(f"⏹️ Download de {rotulo} cancelado.")
+                    resumo = {'status': 'cancelado'}
+                except (requests.RequestException, OSError, ValueError) as e:
+                    print(f"❌ Erro ao baixar dados de {rotulo}: {e}")
+                    resumo = {'status': 'erro', 'erro': str(e)}
+                else:
+                    entrada = resumo.pop('manifesto')
+                    chave = _chave_manifesto(ano, orgao)
+                    if entrada != manifesto.get(chave):
+                        manifesto[chave] = entrada
+                        manifesto_alterado = True
+                resumos[ano][orgao] = resumo
+    finally:
+        if sessao_propria:
+            sessao.close()
+
+    resultados = {}
+    for ano, resumos_orgaos in resumos.items():
+        erros = [r['erro'] for r in resumos_orgaos.values() if r['status'] == 'erro']
+        if erros:
+            # O CSV do ano só é remontado com todos os órgãos baixados
+            resultados[ano] = {'status': 'erro', 'erro': '; '.join(erros)}
+            continue
+        if any(r['status'] == 'cancelado' for r in resumos_orgaos.values()):
+            resultados[ano] = {'status': 'cancelado'}
+            continue
+
+        inicio_montagem = time.perf_counter()
+        entradas = [(orgao, manifesto[_chave_manifesto(ano, orgao)]) for orgao in orgaos_por_ano[ano]]
+        composicao = _composicao(entradas)
+        caminho_arquivo = caminho_csv(ano, destino)
+        atualizado = manifesto.get(ano, {}).get('composicao') != composicao or not os.path.exists(caminho_arquivo)
+        alteracoes = None
+        if atualizado:
+            anterior, impressoes_anteriores = _versao_anterior(ano, destino, compacto)
+            try:
+                with medir('montar_ano', ano=ano, particoes=len(composicao)):
+                    novo = _montar_ano(ano, destino, entradas, compacto)
+            except (OSError, ValueError) as e:
+                print(f"❌ Erro ao montar os dados de {ano}: {e}")
+                resultados[ano] = {'status': 'erro', 'erro': str(e)}
+                continue
+            alteracoes = _registrar_alteracoes(ano, destino, anterior, impressoes_anteriores, novo, compacto)
+            del anterior, novo
+            manifesto[ano] = {'composicao': composicao,
+                              'montado_em': datetime.now().isoformat(timespec='seconds')}
+            _remover_orgaos_antigos(ano, orgaos_por_ano[ano], destino, manifesto)
+            manifesto_alterado = True
+
+        resumo = {
+            'status': 'atualizado' if atualizado else 'inalterado',
+            'bytes': sum(r['bytes'] for r in resumos_orgaos.values()),
+            'linhas': sum(particao['linhas'] for _, entrada in entradas for particao in entrada['particoes'].values()),
+            'paginas': sum(r['paginas'] for r in resumos_orgaos.values()),
+            # Do início do primeiro órgão do ano ao fim do último, mais a montagem do CSV
+            'segundos': (max(r['fim'] for r in resumos_orgaos.values())
+                         - min(r['inicio'] for r in resumos_orgaos.values())
+                         + time.perf_counter() - inicio_montagem),
+            'particoes_alteradas': sum(len(r['alteradas']) for r in resumos_orgaos.values()),
+            'arquivo': caminho_arquivo,
+            'alteracoes': alteracoes,
+        }
+        resultados[ano] = resumo
+        if atualizado:
+            print(f"✅ {ano}: {resumo['linhas']} linhas salvas em {caminho_arquivo} "
+                  f"({resumo['particoes_alteradas']} partição(ões) alterada(s), "
+                  f"{resumo['bytes'] / 1024:.0f} KB em {resumo['segundos']:.1f}s)")
+        else:
+            print(f"✔️ {ano}: sem alterações desde o último download.")
 
-            # Salva o DataFrame já filtrado no arquivo CSV
-            df_filtrado.to_csv(caminho_arquivo, sep=';', index=False, encoding='utf-8')
-            
-            print(f"✅ Arquivo otimizado salvo: {caminho_arquivo}")
+    if manifesto_alterado:
+        salvar_manifesto(manifesto, destino)
 
-        except requests.RequestException as e:
-            print(f"❌ Erro ao baixar dados de {ano}: {e}")
\ No newline at end of file
+    return resultados
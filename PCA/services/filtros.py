@@ -0,0 +1,324 @@
+# services/filtros.py
+
+"""
+Lógica de filtragem das abas, independente da interface gráfica.
+
+Os critérios são um dicionário no formato:
+    {'textos': {coluna: texto}, 'valores': {coluna: [valores]},
+     'periodo': (inicio, fim) ou None}
+onde `inicio` e `fim` são datetime.date (inclusivos) ou None para um
+intervalo aberto. 'valores' seleciona as linhas cuja coluna é exatamente um
+dos valores listados (ex.: as UASGs escolhidas). A chave antiga 'data' (um
+único dia) continua aceita, e 'valores' pode ser omitida.
+
+Os resultados são arrays de posições (índices inteiros) das linhas do
+DataFrame original, em vez de cópias do DataFrame. A comparação de textos
+ignora acentos e maiúsculas; colunas com um IndiceBusca usam o índice.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .search_index import normalizar, normalizar_serie, contem_normalizado
+from .consolidado import COLUNA_ANO
+
+# Quantidade de resultados distintos cujos totais o MotorFiltro guarda
+MAX_TOTAIS_EM_CACHE = 64
+
+# Modos do filtro de 'Data Desejada' oferecidos na interface
+MODOS_DATA = ['Dia', 'Intervalo', 'Mês', 'Trimestre']
+
+
+def criterios_vazios():
+    return {'textos': {}, 'valores': {}, 'periodo': None}
+
+
+def normalizar_criterios(criterios):
+    periodo = criterios.get('periodo')
+    if periodo is None and criterios.get('data') is not None:
+        periodo = (criterios['data'], criterios['data'])
+    if periodo is not None and periodo[0] is None and periodo[1] is None:
+        periodo = None
+    return {
+        'textos': {campo: valor for campo, valor in criterios.get('textos', {}).items() if valor},
+        # Uma lista vazia não restringe nada, como um texto vazio
+        'valores': {campo: tuple(sorted(set(map(str, valores))))
+                    for campo, valores in criterios.get('valores', {}).items() if valores},
+        'periodo': tuple(periodo) if periodo is not None else None,
+    }
+
+
+def periodo_do_mes(dia):
+    inicio = dia.replace(day=1)
+    fim = (inicio + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return inicio, fim
+
+
+def periodo_do_trimestre(dia):
+    primeiro_mes = 3 * ((dia.month - 1) // 3) + 1
+    return date(dia.year, primeiro_mes, 1), periodo_do_mes(date(dia.year, primeiro_mes + 2, 1))[1]
+
+
+def periodo_por_modo(modo, dia, dia_final=None):
+    """
+    Converte a escolha da interface em um período (inicio, fim) ou None.
+    'Dia' usa só `dia`; 'Intervalo' vai de `dia` a `dia_final` (qualquer um
+    pode ser None); 'Mês' e 'Trimestre' cobrem o mês/trimestre de `dia`.
+    """
+    if modo == 'Intervalo':
+        return (dia, dia_final) if dia is not None or dia_final is not None else None
+    if dia is None:
+        return None
+    if modo == 'Mês':
+        return periodo_do_mes(dia)
+    if modo == 'Trimestre':
+        return periodo_do_trimestre(dia)
+    return dia, dia
+
+
+def _dias(serie):
+    """Datas de uma Series datetime64 como dias desde 1970 (int64); NaT vira o menor int64."""
+    return serie.to_numpy().astype('datetime64[D]').astype(np.int64)
+
+
+def limites_periodo(periodo):
+    """Limites inclusivos do período em dias desde 1970; lados abertos viram os extremos do int64."""
+    inicio, fim = periodo
+    limite_inferior = np.datetime64(inicio, 'D').astype(np.int64) if inicio is not None else np.iinfo(np.int64).min + 1
+    limite_superior = np.datetime64(fim, 'D').astype(np.int64) if fim is not None else np.iinfo(np.int64).max
+    return limite_inferior, limite_superior
+
+
+def _no_periodo(dias, validas, limite_inferior, limite_superior):
+    return validas & (dias >= limite_inferior) & (dias <= limite_superior)
+
+
+class IndiceDatas:
+    """
+    Posições das linhas ordenadas por 'data_datetime' (sem as linhas sem
+    data). Um período é localizado com duas buscas binárias, de modo que o
+    custo é O(log n + k) para k linhas no período.
+    """
+
+    def __init__(self, serie):
+        self.dias = _dias(serie)
+        self.validas = ~serie.isna().to_numpy()
+        self.total_linhas = len(self.dias)
+        posicoes_validas = np.flatnonzero(self.validas)
+        self.ordem = posicoes_validas[np.argsort(self.dias[posicoes_validas], kind='stable')]
+        self.dias_ordenados = self.dias[self.ordem]
+
+    def buscar(self, periodo, base=None):
+        """Posições, em ordem crescente, das linhas (opcionalmente de `base`) dentro do período."""
+        limite_inferior, limite_superior = limites_periodo(periodo)
+        inicio = np.searchsorted(self.dias_ordenados, limite_inferior, side='left')
+        fim = np.searchsorted(self.dias_ordenados, limite_superior, side='right')
+        if base is not None and len(base) < fim - inicio:
+            # A base é menor que o período: conferir a base diretamente é mais barato
+            base = np.asarray(base)
+            return base[_no_periodo(self.dias[base], self.validas[base], limite_inferior, limite_superior)]
+        encontrados = np.sort(self.ordem[inicio:fim])
+        if base is None or len(base) == self.total_linhas:
+            return encontrados
+        pertence = np.zeros(self.total_linhas, dtype=bool)
+        pertence[base] = True
+        return encontrados[pertence[encontrados]]
+
+
+def _contem(serie, valor):
+    """Máscara booleana das linhas de `serie` que contêm `valor`, ignorando acentos e caixa."""
+    consulta = normalizar(valor)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Avalia uma vez por categoria e expande pelos códigos
+        categorias = normalizar_serie(pd.Series(serie.cat.categories))
+        mascara_categorias = contem_normalizado(categorias, consulta)
+        codigos = serie.cat.codes.to_numpy()
+        return np.where(codigos >= 0, mascara_categorias[codigos], False)
+    return contem_normalizado(normalizar_serie(serie), consulta)
+
+
+def _no_conjunto(serie, valores):
+    """Máscara booleana das linhas de `serie` iguais a um dos `valores` (isin)."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Compara só as categorias e expande pelos códigos
+        mascara_categorias = pd.Index(serie.cat.categories).astype(str).isin(valores)
+        codigos = serie.cat.codes.to_numpy()
+        return np.where(codigos >= 0, mascara_categorias[codigos], False)
+    return serie.astype(str).isin(valores).to_numpy()
+
+
+def _aplicar_predicados(df, indices, textos, periodo, indices_busca=None, indice_datas=None, valores=None):
+    indices_busca = indices_busca or {}
+    for campo, selecionados in (valores or {}).items():
+        if campo in df.columns and len(indices):
+            indices = indices[_no_conjunto(df[campo].iloc[indices], selecionados)]
+    for campo, valor in textos.items():
+        if campo not in df.columns or not len(indices):
+            continue
+        if campo in indices_busca:
+            indices = indices_busca[campo].buscar(valor, indices)
+        else:
+            indices = indices[_contem(df[campo].iloc[indices], valor)]
+    if periodo is not None and 'data_datetime' in df.columns and len(indices):
+        if indice_datas is not None:
+            indices = indice_datas.buscar(periodo, indices)
+        else:
+            datas = df['data_datetime'].iloc[indices]
+            indices = indices[_no_periodo(_dias(datas), ~datas.isna().to_numpy(), *limites_periodo(periodo))]
+    return indices
+
+
+def filtrar_indices(df, criterios, base=None, indices_busca=None):
+    """
+    Retorna as posições das linhas de `df` (opcionalmente restritas a `base`)
+    que contêm, ignorando acentos e maiúsculas, cada texto informado na coluna
+    correspondente, que têm um dos valores pedidos em cada coluna de
+    'valores' e, se houver, cuja 'data_datetime' cai no período pedido.
+    `indices_busca` ({coluna: IndiceBusca}) acelera as colunas indexadas.
+    """
+    criterios = normalizar_criterios(criterios)
+    indices = np.arange(len(df)) if base is None else np.asarray(base)
+    return _aplicar_predicados(df, indices, criterios['textos'], criterios['periodo'], indices_busca,
+                               valores=criterios['valores'])
+
+
+def chave_criterios(criterios):
+    """
+    Chave imutável que identifica o resultado de um conjunto de critérios.
+    Textos que diferem só em acentos ou caixa geram a mesma chave.
+    """
+    criterios = normalizar_criterios(criterios)
+    textos = tuple(sorted((campo, normalizar(valor)) for campo, valor in criterios['textos'].items()))
+    valores = tuple(sorted(criterios['valores'].items()))
+    return textos, valores, criterios['periodo']
+
+
+def codigos_anos(df):
+    """(códigos, categorias) da coluna 'Ano' do consolidado, ou None se `df` for de um só ano."""
+    if COLUNA_ANO not in df.columns or not isinstance(df[COLUNA_ANO].dtype, pd.CategoricalDtype):
+        return None
+    return df[COLUNA_ANO].cat.codes.to_numpy().astype(np.intp), list(df[COLUNA_ANO].cat.categories)
+
+
+def unidades(df):
+    """{UASG: nome da Unidade Responsável} das linhas de `df`, para a seleção de unidades."""
+    if 'UASG' not in df.columns:
+        return {}
+    nomes = df['Unidade Responsável'] if 'Unidade Responsável' in df.columns else pd.Series('', index=df.index)
+    pares = pd.DataFrame({'uasg': df['UASG'].astype(str), 'nome': nomes.astype(str)})
+    pares = pares[pares['uasg'] != ''].drop_duplicates('uasg').sort_values('uasg')
+    return dict(zip(pares['uasg'], pares['nome']))
+
+
+def calcular_totais(valores, indices, anos=None):
+    """
+    Totais do rodapé: quantidade de registros e soma de `valores` (array
+    numérico) nas posições. Com `anos` (códigos e categorias da coluna 'Ano'
+    do consolidado), inclui em 'por_ano' os subtotais de cada ano, obtidos
+    numa única passada com np.bincount.
+    """
+    valores_resultado = valores[indices] if valores is not None else np.zeros(len(indices))
+    valores_resultado = np.nan_to_num(valores_resultado)
+    totais = {'registros': len(indices), 'valor_total': float(valores_resultado.sum())}
+    if anos is not None:
+        codigos, categorias = anos
+        codigos_resultado = codigos[indices]
+        registros = np.bincount(codigos_resultado, minlength=len(categorias))
+        somas = np.bincount(codigos_resultado, weights=valores_resultado, minlength=len(categorias))
+        totais['por_ano'] = {str(ano): {'registros': int(registros[i]), 'valor_total': float(somas[i])}
+                             for i, ano in enumerate(categorias)}
+    return totais
+
+
+def filtrar(df, criterios):
+    """Versão de `filtrar_indices` que devolve o DataFrame filtrado."""
+    return df.iloc[filtrar_indices(df, criterios)]
+
+
+def eh_refinamento(anteriores, novos):
+    """
+    Indica se o resultado de `novos` é necessariamente um subconjunto do
+    resultado de `anteriores`: nenhum filtro foi removido, cada texto anterior
+    continua contido no novo (ex.: mais letras digitadas), cada seleção de
+    valores só perdeu itens e o novo período está dentro do anterior (ou só
+    foi acrescentado).
+    """
+    for campo, valor in anteriores['textos'].items():
+        novo = novos['textos'].get(campo)
+        if novo is None or normalizar(valor) not in normalizar(novo):
+            return False
+    for campo, selecionados in anteriores['valores'].items():
+        novos_selecionados = novos['valores'].get(campo)
+        if novos_selecionados is None or not set(novos_selecionados) <= set(selecionados):
+            return False
+    return _periodo_contido(novos['periodo'], anteriores['periodo'])
+
+
+def _periodo_contido(periodo, externo):
+    if externo is None:
+        return True
+    if periodo is None:
+        return False
+    inicio, fim = limites_periodo(periodo)
+    inicio_externo, fim_externo = limites_periodo(externo)
+    return inicio_externo <= inicio and fim <= fim_externo
+
+
+class MotorFiltro:
+    """
+    Filtragem incremental de um DataFrame. Guarda os critérios e as posições
+    do último resultado; quando a nova consulta apenas estreita a anterior,
+    avalia só os filtros que mudaram e só sobre as linhas que sobreviveram.
+    Ao ampliar a consulta (apagar letras, remover um filtro), refaz a busca
+    completa. Os totais de cada resultado são guardados por critério, de
+    modo que só são calculados uma vez. Pode ser usado a partir de qualquer
+    thread.
+    """
+
+    def __init__(self, df, indices_busca=None):
+        self.df = df
+        self.indices_busca = indices_busca or {}
+        self._criterios = criterios_vazios()
+        self._indices = np.arange(len(df))
+        self._indice_datas = IndiceDatas(df['data_datetime']) if 'data_datetime' in df.columns else None
+        self._valores = df['valor_numerico'].to_numpy(dtype=float) if 'valor_numerico' in df.columns else None
+        self._anos = codigos_anos(df)
+        self._totais = OrderedDict()
+        self._lock = threading.Lock()
+
+    def aplicar(self, criterios):
+        criterios = normalizar_criterios(criterios)
+        with self._lock:
+            anteriores = self._criterios
+            if eh_refinamento(anteriores, criterios):
+                base = self._indices
+                textos = {campo: valor for campo, valor in criterios['textos'].items()
+                          if anteriores['textos'].get(campo) != valor}
+                valores = {campo: selecionados for campo, selecionados in criterios['valores'].items()
+                           if anteriores['valores'].get(campo) != selecionados}
+                periodo = criterios['periodo'] if criterios['periodo'] != anteriores['periodo'] else None
+            else:
+                base = np.arange(len(self.df))
+                textos, valores, periodo = criterios['textos'], criterios['valores'], criterios['periodo']
+            indices = _aplicar_predicados(self.df, base, textos, periodo, self.indices_busca, self._indice_datas,
+                                          valores)
+            self._criterios, self._indices = criterios, indices
+            return indices
+
+    def totais(self, criterios, indices):
+        """Totais do resultado `indices` de `criterios`, calculados só na primeira vez."""
+        chave = chave_criterios(criterios)
+        with self._lock:
+            if chave in self._totais:
+                self._totais.move_to_end(chave)
+                return self._totais[chave]
+        totais = calcular_totais(self._valores, indices, self._anos)
+        with self._lock:
+            self._totais[chave] = totais
+            while len(self._totais) > MAX_TOTAIS_EM_CACHE:
+                self._totais.popitem(last=False)
+        return totais
@@ -0,0 +1,229 @@
+# services/instrumentacao.py
+
+"""
+Medição leve das etapas do programa (download, carregamento, filtros,
+preenchimento e ordenação da tabela).
+
+    with medir('carregar_ano', ano='2025') as detalhes:
+        df = ...
+        detalhes['linhas'] = len(df)
+
+    @cronometrado('download')
+    def download_csv_files(...): ...
+
+Cada medição guarda a duração, os detalhes informados e o pico de memória
+do processo em um histórico circular (MAX_MEDICOES), consultado pela janela
+de diagnóstico, e é registrada no logger 'PCA' como uma linha JSON.
+Contadores (`contar`) acumulam totais como bytes baixados ou consultas ao
+cache. Com `ativar_perfil(pasta)`, cada etapa medida é também executada sob
+o cProfile e o resultado é gravado em `pasta/<etapa>-<instante>.prof`.
+"""
+
+import cProfile
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque, Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# Quantidade de medições guardadas para a janela de diagnóstico
+MAX_MEDICOES = 500
+
+PASTA_PERFIS = os.path.join('data', 'perfis')
+
+logger = logging.getLogger('PCA')
+
+_medicoes = deque(maxlen=MAX_MEDICOES)
+_contadores = Counter()
+_lock = threading.Lock()
+_perfil = {'pasta': None}
+# Só a etapa mais externa de cada thread é perfilada: o cProfile não aninha
+_local = threading.local()
+
+
+def pico_memoria_mb():
+    """Maior uso de memória residente do processo até agora, em MB (None se indisponível)."""
+    try:
+        import resource
+    except ImportError:
+        return _pico_memoria_windows()
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é informado em KB no Linux e em bytes no macOS
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+
+def _pico_memoria_windows():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class _Contadores(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        contadores = _Contadores()
+        contadores.cb = ctypes.sizeof(contadores)
+        processo = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(processo, ctypes.byref(contadores), contadores.cb):
+            return None
+        return contadores.PeakWorkingSetSize / (1024 * 1024)
+    except (AttributeError, OSError):
+        return None
+
+
+def ativar_perfil(pasta=PASTA_PERFIS):
+    """Passa a gravar um perfil do cProfile de cada etapa medida em `pasta`."""
+    os.makedirs(pasta, exist_ok=True)
+    _perfil['pasta'] = pasta
+
+
+def desativar_perfil():
+    _perfil['pasta'] = None
+
+
+def perfil_ativo():
+    return _perfil['pasta'] is not None
+
+
+def _iniciar_perfil():
+    if _perfil['pasta'] is None or getattr(_local, 'perfilando', False):
+        return None
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError:
+        # Outro profiler já está ativo nesta thread
+        return None
+    _local.perfilando = True
+    return perfil
+
+
+def _gravar_perfil(perfil, etapa):
+    perfil.disable()
+    _local.perfilando = False
+    pasta = _perfil['pasta']
+    if pasta is None:
+        return None
+    caminho = os.path.join(pasta, f"{etapa}-{datetime.now():%Y%m%d-%H%M%S-%f}.prof")
+    try:
+        perfil.dump_stats(caminho)
+    except OSError as e:
+        logger.warning("Não foi possível gravar o perfil de %s: %s", etapa, e)
+        return None
+    return caminho
+
+
+@contextmanager
+def medir(etapa, **detalhes):
+    """
+    Mede a duração do bloco. `detalhes` (e o que o bloco acrescentar ao
+    dicionário retornado) é guardado junto com a medição. Medições de blocos
+    que terminam com exceção são marcadas com 'erro'.
+    """
+    perfil = _iniciar_perfil()
+    inicio = datetime.now()
+    relogio = time.perf_counter()
+    try:
+        yield detalhes
+    except BaseException as e:
+        detalhes['erro'] = type(e).__name__
+        raise
+    finally:
+        segundos = time.perf_counter() - relogio
+        if perfil is not None:
+            caminho_perfil = _gravar_perfil(perfil, etapa)
+            if caminho_perfil:
+                detalhes['perfil'] = caminho_perfil
+        _registrar(etapa, inicio, segundos, detalhes)
+
+
+def registrar(etapa, segundos, **detalhes):
+    """Guarda uma medição feita pelo próprio chamador (ex.: o downloader, que já cronometra cada órgão)."""
+    _registrar(etapa, datetime.now() - timedelta(seconds=segundos), segundos, detalhes)
+
+
+def cronometrado(etapa):
+    """Decorador que mede cada chamada da função com `medir(etapa)`."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            with medir(etapa):
+                return funcao(*args, **kwargs)
+        return envoltorio
+    return decorador
+
+
+def _registrar(etapa, inicio, segundos, detalhes):
+    medicao = {
+        'etapa': etapa,
+        'inicio': inicio.isoformat(timespec='milliseconds'),
+        'segundos': segundos,
+        'pico_memoria_mb': pico_memoria_mb(),
+        'thread': threading.current_thread().name,
+        'detalhes': detalhes,
+    }
+    with _lock:
+        _medicoes.append(medicao)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(medicao, ensure_ascii=False, default=str))
+
+
+def contar(nome, quantidade=1):
+    """Soma `quantidade` ao contador `nome`."""
+    with _lock:
+        _contadores[nome] += quantidade
+
+
+def medicoes():
+    """Cópia do histórico de medições, da mais antiga para a mais recente."""
+    with _lock:
+        return list(_medicoes)
+
+
+def contadores():
+    with _lock:
+        return dict(_contadores)
+
+
+def resumo_por_etapa():
+    """{etapa: {'vezes', 'total', 'media', 'maximo', 'ultima'}} das medições do histórico, em segundos."""
+    resumo = {}
+    for medicao in medicoes():
+        etapa = resumo.setdefault(medicao['etapa'], {'vezes': 0, 'total': 0.0, 'maximo': 0.0})
+        etapa['vezes'] += 1
+        etapa['total'] += medicao['segundos']
+        etapa['maximo'] = max(etapa['maximo'], medicao['segundos'])
+        etapa['ultima'] = medicao['segundos']
+    for etapa in resumo.values():
+        etapa['media'] = etapa['total'] / etapa['vezes']
+    return resumo
+
+
+def limpar():
+    with _lock:
+        _medicoes.clear()
+        _contadores.clear()
+
+
+def configurar_log(destino=None, nivel=logging.INFO):
+    """
+    Envia as medições (uma linha JSON por etapa) para `destino`: um caminho
+    de arquivo ou um fluxo como sys.stderr.
+    """
+    if isinstance(destino, str):
+        os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+        handler = logging.FileHandler(destino, encoding='utf-8')
+    else:
+        handler = logging.StreamHandler(destino)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(nivel)
+    return handler
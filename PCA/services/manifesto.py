@@ -0,0 +1,44 @@
+# services/manifesto.py
+
+import hashlib
+import json
+import os
+
+NOME_MANIFESTO = 'manifesto.json'
+
+
+def caminho_manifesto(destino='data'):
+    return os.path.join(destino, NOME_MANIFESTO)
+
+
+def carregar_manifesto(destino='data'):
+    """
+    Carrega o manifesto de atualização, que guarda por ano e órgão
+    ("ano/órgão") o ETag, o Last-Modified, o tamanho baixado, o SHA-256 de
+    cada partição por UASG e a data do download, e por ano as partições
+    que compõem o CSV montado. Retorna um dicionário vazio se o manifesto
+    não existir.
+    """
+    try:
+        with open(caminho_manifesto(destino), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, FileNotFoundError):
+        return {}
+
+
+def salvar_manifesto(manifesto, destino='data'):
+    """Salva o manifesto de forma atômica (arquivo temporário + rename)."""
+    caminho = caminho_manifesto(destino)
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=4, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+def sha256_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    """Calcula o SHA-256 de um arquivo lendo-o em blocos."""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
@@ -0,0 +1,120 @@
+# services/ordenacao.py
+
+"""
+Ordenação das linhas de um ano, independente da interface gráfica.
+
+Para cada coluna é calculada uma única vez uma permutação estável de todas
+as linhas do ano, usando o tipo adequado da coluna: número para valores e
+quantidades, data para 'Data Desejada', número para códigos inteiramente
+numéricos e, para os demais textos, a ordem alfabética sem acentos e sem
+diferenciar maiúsculas. Ordenar um resultado filtrado é apenas percorrer a
+permutação guardada mantendo as posições que estão no resultado.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .search_index import normalizar_serie
+
+# Colunas de exibição ordenadas pela coluna tipada criada em preparar_tipos
+COLUNAS_TIPADAS = {
+    'Valor Total Estimado (R$)': 'valor_numerico',
+    'Quantidade Estimada': 'quantidade_numerica',
+    'Data Desejada': 'data_datetime',
+}
+
+# Abaixo desta fração das linhas do ano, ordenar o resultado pelas posições
+# na permutação é mais barato que percorrer a permutação inteira
+FRACAO_ORDENACAO_DIRETA = 1 / 32
+
+
+def chave_ordenacao(df, coluna):
+    """
+    Array float com uma chave por linha cuja ordem crescente é a ordem da
+    coluna. Linhas sem valor recebem NaN e ficam sempre no fim.
+    """
+    coluna_tipada = COLUNAS_TIPADAS.get(coluna)
+    if coluna_tipada in df.columns:
+        serie = df[coluna_tipada]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            chave = serie.to_numpy().astype('datetime64[s]').astype(np.int64).astype(float)
+            chave[serie.isna().to_numpy()] = np.nan
+            return chave
+        return serie.to_numpy(dtype=float, na_value=np.nan)
+
+    texto = df[coluna].astype(str).str.strip()
+    vazios = (texto == '').to_numpy() | df[coluna].isna().to_numpy()
+    if vazios.all():
+        return np.full(len(df), np.nan)
+
+    numeros = pd.to_numeric(texto.where(~vazios), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    if not np.isnan(numeros[~vazios]).any():
+        # Códigos inteiramente numéricos (UASG, Id do item...) seguem a ordem numérica
+        return numeros
+
+    codigos, _ = pd.factorize(normalizar_serie(texto), sort=True)
+    chave = codigos.astype(float)
+    chave[vazios] = np.nan
+    return chave
+
+
+class MotorOrdenacao:
+    """
+    Ordenações de um DataFrame por coluna. As permutações (crescente e
+    decrescente, ambas estáveis) são calculadas na primeira vez que a coluna
+    é pedida e reaproveitadas em seguida. Pode ser usado a partir de
+    qualquer thread.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.total_linhas = len(df)
+        self._permutacoes = {}
+        self._posicoes = {}
+        self._lock = threading.Lock()
+
+    def preparar(self, colunas):
+        """Calcula antecipadamente as permutações das colunas existentes em `df`."""
+        for coluna in colunas:
+            if coluna in self.df.columns:
+                self.permutacao(coluna, True)
+                self.permutacao(coluna, False)
+
+    def permutacao(self, coluna, ascendente=True):
+        """Todas as posições do DataFrame na ordem da coluna."""
+        chave_cache = (coluna, ascendente)
+        with self._lock:
+            if chave_cache in self._permutacoes:
+                return self._permutacoes[chave_cache]
+        chave = chave_ordenacao(self.df, coluna)
+        # -NaN continua NaN, então as linhas sem valor ficam no fim nas duas direções
+        permutacao = np.argsort(chave if ascendente else -chave, kind='stable')
+        with self._lock:
+            return self._permutacoes.setdefault(chave_cache, permutacao)
+
+    def _posicao_na_ordem(self, coluna, ascendente):
+        """Inverso da permutação: em que posição da ordem cada linha está."""
+        chave_cache = (coluna, ascendente)
+        with self._lock:
+            if chave_cache in self._posicoes:
+                return self._posicoes[chave_cache]
+        permutacao = self.permutacao(coluna, ascendente)
+        posicoes = np.empty(self.total_linhas, dtype=np.int64)
+        posicoes[permutacao] = np.arange(self.total_linhas)
+        with self._lock:
+            return self._posicoes.setdefault(chave_cache, posicoes)
+
+    def ordenar(self, indices, coluna, ascendente=True):
+        """Reordena as posições `indices` (ex.: o resultado do filtro) pela coluna."""
+        indices = np.asarray(indices)
+        if not len(indices):
+            return indices
+        if len(indices) < FRACAO_ORDENACAO_DIRETA * self.total_linhas:
+            posicoes = self._posicao_na_ordem(coluna, ascendente)
+            return indices[np.argsort(posicoes[indices])]
+        permutacao = self.permutacao(coluna, ascendente)
+        pertence = np.zeros(self.total_linhas, dtype=bool)
+        pertence[indices] = True
+        return permutacao[pertence[permutacao]]
@@ -1,8 +1,196 @@
 # services/parser.py - ATUALIZADO
 
+import json
+import os
+import threading
+from collections import OrderedDict
+
 import pandas as pd
 from .preferencias import carregar_preferencias
+from .search_index import construir_indices
+from .ordenacao import MotorOrdenacao, COLUNAS_TIPADAS
+from .consolidado import consolidar, TODOS_OS_ANOS
+from .instrumentacao import cronometrado, medir, contar
+
+try:
+    import pyarrow  # noqa: F401 - necessário para ler/gravar Feather
+    CACHE_DISPONIVEL = True
+except ImportError:
+    CACHE_DISPONIVEL = False
+
+# Incrementar sempre que as colunas tipadas mudarem, para invalidar caches antigos
+VERSAO_CACHE = 3
+
+# Colunas exibidas nas abas; no modo de memória compacta só elas são lidas do CSV
+COLUNAS_EXIBIDAS = [
+    'Unidade Responsável', 'UASG', 'Id do item no PCA', 'Categoria do Item',
+    'Identificador da Futura Contratação', 'Classificação do Catálogo',
+    'Código da Classificação Superior (Classe/Grupo)', 'Nome do PDM do Item',
+    'Código do Item', 'Descrição do Item', 'Quantidade Estimada',
+    'Valor Total Estimado (R$)', 'Data Desejada',
+]
+
+# Modo padrão de carregamento (preferência 'memoria_compacta')
+MEMORIA_COMPACTA = True
+
+
+def _tipo_texto():
+    """Strings do Arrow (com NaN como valor ausente, como o dtype str) se o pyarrow estiver instalado."""
+    if not CACHE_DISPONIVEL:
+        return str
+    try:
+        return pd.StringDtype('pyarrow', na_value=float('nan'))
+    except TypeError:  # pandas < 2.3
+        return 'string[pyarrow]'
+
+
+# Tipo do texto livre no modo de memória compacta
+TIPO_TEXTO = _tipo_texto()
+
+# Colunas numéricas derivadas das colunas de texto do PCA
+COLUNAS_NUMERICAS = {
+    'Valor Total Estimado (R$)': 'valor_numerico',
+    'Quantidade Estimada': 'quantidade_numerica',
+}
+
+# Colunas com poucos valores distintos, guardadas como categorias
+COLUNAS_CATEGORICAS = ['UASG', 'Categoria do Item']
+
+# No modo de memória compacta, também as demais colunas repetitivas
+COLUNAS_CATEGORICAS_COMPACTAS = COLUNAS_CATEGORICAS + [
+    'Unidade Responsável', 'Classificação do Catálogo', 'Nome do PDM do Item',
+]
+
+# Quantidade padrão de anos mantidos em memória pelo RegistroAnos
+MAX_ANOS_EM_MEMORIA = 3
+
+
+def caminho_csv(ano, destino='data'):
+    return os.path.join(destino, f"pca_{ano}.csv")
+
+
+def pasta_particoes(ano, destino='data'):
+    """Pasta com as partições do ano baixadas por órgão e UASG (ver services.downloader)."""
+    return os.path.join(destino, 'particoes', str(ano))
+
+
+def caminho_cache(ano, destino='data'):
+    return os.path.join(destino, f"pca_{ano}.feather")
+
+
+def _caminho_meta_cache(ano, destino='data'):
+    return os.path.join(destino, f"pca_{ano}.cache.json")
+
+
+def arquivos_do_ano(ano, destino='data'):
+    """Todos os arquivos locais de um ano: o CSV e o cache colunar com sua assinatura."""
+    return [caminho_csv(ano, destino), caminho_cache(ano, destino), _caminho_meta_cache(ano, destino)]
+
+
+def assinatura_csv(caminho, compacto=MEMORIA_COMPACTA):
+    """Identifica a versão do CSV pelo instante de modificação e tamanho, e o modo de carregamento."""
+    info = os.stat(caminho)
+    return {'versao': VERSAO_CACHE, 'mtime_ns': info.st_mtime_ns, 'tamanho': info.st_size, 'compacto': compacto}
+
+
+def _para_numero(serie):
+    """
+    Converte números no formato brasileiro ("1.234,56") para float. Quando há
+    vírgula, os pontos são separadores de milhar; sem vírgula, o ponto é
+    tratado como separador decimal ("1234.56").
+    """
+    texto = serie.astype(str).str.strip()
+    com_virgula = texto.str.contains(',', regex=False)
+    texto = texto.where(~com_virgula, texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    return pd.to_numeric(texto, errors='coerce')
+
+
+def preparar_tipos(df, compacto=MEMORIA_COMPACTA):
+    """
+    Acrescenta ao DataFrame (lido como texto) as colunas tipadas usadas pela
+    interface: valores numéricos, a data desejada já convertida e categorias
+    para as colunas de baixa cardinalidade (mais colunas no modo compacto).
+    As colunas de texto originais são mantidas para exibição.
+    """
+    for coluna, coluna_numerica in COLUNAS_NUMERICAS.items():
+        if coluna in df.columns:
+            df[coluna_numerica] = _para_numero(df[coluna])
+    if 'Data Desejada' in df.columns:
+        df['data_datetime'] = pd.to_datetime(df['Data Desejada'], errors='coerce', dayfirst=True)
+    for coluna in (COLUNAS_CATEGORICAS_COMPACTAS if compacto else COLUNAS_CATEGORICAS):
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype('category')
+    return df
+
+
+def _ler_csv(caminho, compacto=MEMORIA_COMPACTA):
+    """
+    Lê o CSV de um ano. No modo compacto só as colunas exibidas são lidas e
+    o texto livre fica em strings do Arrow em vez de objetos Python.
+    """
+    if compacto:
+        df = pd.read_csv(caminho, sep=';', encoding='utf-8', header=0, dtype=TIPO_TEXTO,
+                         usecols=lambda coluna: coluna in COLUNAS_EXIBIDAS)
+    else:
+        df = pd.read_csv(caminho, sep=';', encoding='utf-8', header=0, dtype=str)
+    df.fillna('', inplace=True) # Garante que valores nulos sejam strings vazias
+    return preparar_tipos(df, compacto)
 
+
+def gerar_cache_colunar(ano, destino='data', df=None, compacto=MEMORIA_COMPACTA):
+    """
+    Grava o cache Feather tipado de um ano a partir do CSV (ou do DataFrame já
+    carregado), junto com a assinatura do CSV usada para invalidá-lo.
+    Retorna o DataFrame tipado.
+    """
+    caminho = caminho_csv(ano, destino)
+    if df is None:
+        df = _ler_csv(caminho, compacto)
+    if not CACHE_DISPONIVEL:
+        return df
+    try:
+        df.reset_index(drop=True).to_feather(caminho_cache(ano, destino))
+        with open(_caminho_meta_cache(ano, destino), 'w', encoding='utf-8') as f:
+            json.dump(assinatura_csv(caminho, compacto), f)
+    except (OSError, ValueError) as e:
+        print(f"Aviso: não foi possível gravar o cache de {ano}: {e}")
+    return df
+
+
+def _carregar_cache(ano, destino='data', compacto=MEMORIA_COMPACTA):
+    """Retorna o DataFrame do cache Feather se ele corresponder ao CSV atual e ao modo, senão None."""
+    if not CACHE_DISPONIVEL:
+        return None
+    try:
+        with open(_caminho_meta_cache(ano, destino), 'r', encoding='utf-8') as f:
+            assinatura = json.load(f)
+        if assinatura != assinatura_csv(caminho_csv(ano, destino), compacto):
+            return None
+        return pd.read_feather(caminho_cache(ano, destino))
+    except (OSError, ValueError):
+        return None
+
+
+def carregar_ano(ano, destino='data', compacto=MEMORIA_COMPACTA):
+    """
+    Carrega os dados de um ano, preferindo o cache Feather tipado. Se o cache
+    não existir ou estiver desatualizado em relação ao CSV (ou tiver sido
+    gravado no outro modo de memória), o CSV é lido e o cache é regravado.
+    Lança FileNotFoundError se o CSV não existir.
+    """
+    if not os.path.exists(caminho_csv(ano, destino)):
+        raise FileNotFoundError(caminho_csv(ano, destino))
+    with medir('carregar_ano', ano=ano, compacto=compacto) as detalhes:
+        df = _carregar_cache(ano, destino, compacto)
+        detalhes['origem'] = 'cache' if df is not None else 'csv'
+        contar('cache_colunar_acertos' if df is not None else 'cache_colunar_falhas')
+        if df is None:
+            df = gerar_cache_colunar(ano, destino, compacto=compacto)
+        detalhes['linhas'] = len(df)
+    return df
+
+
+@cronometrado('load_all_years')
 def load_all_years():
     """
     Carrega todos os arquivos CSV definidos nas preferências em DataFrames do Pandas.
@@ -10,20 +198,140 @@ def load_all_years():
     """
     preferencias = carregar_preferencias()
     anos = preferencias.get("data_sources", {}).keys()
-    
+    compacto = preferencias.get("memoria_compacta", MEMORIA_COMPACTA)
+
     dataframes = {}
     for ano in anos:
         try:
-            caminho_arquivo = f"data/pca_{ano}.csv"
-            # CORREÇÃO: Adicionado dtype=str para evitar DtypeWarning
-            df = pd.read_csv(caminho_arquivo, sep=';', encoding='utf-8', header=0, dtype=str)
-            df.fillna('', inplace=True) # Garante que valores nulos sejam strings vazias
-            dataframes[ano] = df
+            dataframes[ano] = carregar_ano(ano, compacto=compacto)
         except FileNotFoundError:
-            print(f"Aviso: Arquivo {caminho_arquivo} não encontrado. Ele será ignorado.")
-            dataframes[ano] = pd.DataFrame() 
+            print(f"Aviso: Arquivo {caminho_csv(ano)} não encontrado. Ele será ignorado.")
+            dataframes[ano] = pd.DataFrame()
         except Exception as e:
             print(f"Erro ao carregar o arquivo para o ano {ano}: {e}")
             dataframes[ano] = pd.DataFrame()
-            
-    return dataframes
\ No newline at end of file
+
+    return dataframes
+
+
+class AnoPreguicoso:
+    """Referência a um ano do registro; os dados só são lidos no primeiro acesso."""
+
+    def __init__(self, registro, ano):
+        self.registro = registro
+        self.ano = ano
+
+    @property
+    def carregado(self):
+        return self.registro.carregado(self.ano)
+
+    def dados(self):
+        return self.registro.obter(self.ano)
+
+
+class RegistroAnos:
+    """
+    Registro dos anos configurados nas preferências que carrega cada ano apenas
+    quando ele é acessado e mantém em memória no máximo `max_carregados` anos,
+    descartando os usados há mais tempo (LRU). Funções registradas em
+    `ao_descartar` são chamadas com o ano sempre que um DataFrame é descartado.
+    Junto com cada ano são construídos o índice de busca das colunas de texto
+    e o motor de ordenação, já com as permutações das colunas tipadas.
+
+    Com `indexar=False` (uso em lote, uma consulta só), índices e ordenações
+    não são construídos.
+
+    A entrada especial TODOS_OS_ANOS é o DataFrame consolidado de todos os
+    anos disponíveis; montá-lo não coloca os anos individuais no LRU.
+    """
+
+    def __init__(self, anos=None, destino='data', max_carregados=MAX_ANOS_EM_MEMORIA, compacto=MEMORIA_COMPACTA,
+                 indexar=True):
+        if anos is None:
+            anos = carregar_preferencias().get("data_sources", {}).keys()
+        self.anos = list(anos)
+        self.destino = destino
+        self.compacto = compacto
+        self.indexar = indexar
+        self.max_carregados = max(1, max_carregados)
+        self.ao_descartar = []
+        self._dados = OrderedDict()
+        self._indices_busca = {}
+        self._ordenacoes = {}
+        self._lock = threading.RLock()
+
+    def disponivel(self, ano):
+        if ano == TODOS_OS_ANOS:
+            return len(self.anos_disponiveis()) > 1
+        return os.path.exists(caminho_csv(ano, self.destino))
+
+    def anos_disponiveis(self):
+        return [ano for ano in self.anos if self.disponivel(ano)]
+
+    def handle(self, ano):
+        return AnoPreguicoso(self, ano)
+
+    def carregado(self, ano):
+        with self._lock:
+            return ano in self._dados
+
+    def obter(self, ano):
+        """Retorna o DataFrame do ano, carregando-o se necessário."""
+        with self._lock:
+            if ano in self._dados:
+                self._dados.move_to_end(ano)
+                return self._dados[ano]
+        df = self._carregar(ano)
+        indices_busca, ordenacao = {}, None
+        if self.indexar:
+            with medir('indexar_ano', ano=ano, linhas=len(df)):
+                indices_busca = construir_indices(df)
+                ordenacao = MotorOrdenacao(df)
+                ordenacao.preparar(COLUNAS_TIPADAS)
+        with self._lock:
+            self._dados[ano] = df
+            self._indices_busca[ano] = indices_busca
+            self._ordenacoes[ano] = ordenacao
+            self._dados.move_to_end(ano)
+            descartados = []
+            while len(self._dados) > self.max_carregados:
+                descartado = self._dados.popitem(last=False)[0]
+                self._indices_busca.pop(descartado, None)
+                self._ordenacoes.pop(descartado, None)
+                descartados.append(descartado)
+        for descartado in descartados:
+            self._notificar_descarte(descartado)
+        return df
+
+    def _carregar(self, ano):
+        if ano != TODOS_OS_ANOS:
+            return carregar_ano(ano, self.destino, self.compacto)
+        dfs_por_ano = {}
+        for ano_individual in self.anos_disponiveis():
+            with self._lock:
+                df = self._dados.get(ano_individual)
+            dfs_por_ano[ano_individual] = df if df is not None else carregar_ano(ano_individual, self.destino, self.compacto)
+        with medir('consolidar', anos=len(dfs_por_ano)):
+            return consolidar(dfs_por_ano)
+
+    def indices_busca(self, ano):
+        """Índices de busca ({coluna: IndiceBusca}) do ano, se ele estiver carregado."""
+        with self._lock:
+            return self._indices_busca.get(ano, {})
+
+    def ordenacao(self, ano):
+        """MotorOrdenacao do ano, se ele estiver carregado."""
+        with self._lock:
+            return self._ordenacoes.get(ano)
+
+    def descartar(self, ano):
+        with self._lock:
+            self._indices_busca.pop(ano, None)
+            self._ordenacoes.pop(ano, None)
+            removido = self._dados.pop(ano, None) is not None
+        if removido:
+            self._notificar_descarte(ano)
+
+    def _notificar_descarte(self, ano):
+        for funcao in self.ao_descartar:
+            funcao(ano)
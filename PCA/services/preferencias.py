@@ -2,18 +2,25 @@
 
 import json
 import os
+from datetime import date, timedelta
 
 PREFERENCIAS_PATH = 'preferencias.json'
 
+# Intervalo entre as verificações automáticas de novos dados
+INTERVALO_VERIFICACAO = timedelta(days=7)
+
 def get_default_preferences():
     """Retorna a estrutura padrão de preferências com os dados iniciais."""
     # URLs PADRÃO ATUALIZADAS
     return {
         "data_sources": {
-            "2024": "https://pncp.gov.br/api/pncp/v1/orgaos/250106/planos-de-contratacao/2024/itens?pagina=1&tamanhoPagina=10000",
-            "2025": "https://pncp.gov.br/api/pncp/v1/orgaos/250106/planos-de-contratacao/2025/itens?pagina=1&tamanhoPagina=10000",
-            "2026": "https://pncp.gov.br/api/pncp/v1/orgaos/250106/planos-de-contratacao/2026/itens?pagina=1&tamanhoPagina=10000"
+            "2024": "https://pncp.gov.br/api/pncp/v1/orgaos/250106/planos-de-contratacao/2024/itens?pagina=1&tamanhoPagina=1000",
+            "2025": "https://pncp.gov.br/api/pncp/v1/orgaos/250106/planos-de-contratacao/2025/itens?pagina=1&tamanhoPagina=1000",
+            "2026": "https://pncp.gov.br/api/pncp/v1/orgaos/250106/planos-de-contratacao/2026/itens?pagina=1&tamanhoPagina=1000"
         },
+        # Órgãos (código do PNCP) baixados para cada ano e UASGs mantidas
+        "orgaos": ["250106"],
+        "uasgs": ["250052"],
         "filters": {},
         "ultima_verificacao_semanal": "2000-01-01"
     }
@@ -36,4 +43,18 @@ def salvar_preferencias(preferencias):
         with open(PREFERENCIAS_PATH, 'w', encoding='utf-8') as f:
             json.dump(preferencias, f, indent=4, ensure_ascii=False)
     except Exception as e:
-        print(f"Erro ao salvar preferências: {e}")
\ No newline at end of file
+        print(f"Erro ao salvar preferências: {e}")
+
+def verificacao_semanal_pendente(preferencias, hoje=None):
+    """Indica se já se passou uma semana desde a última verificação de novos dados."""
+    hoje = hoje or date.today()
+    try:
+        ultima = date.fromisoformat(preferencias.get("ultima_verificacao_semanal", ""))
+    except ValueError:
+        return True
+    return hoje - ultima >= INTERVALO_VERIFICACAO
+
+def registrar_verificacao_semanal(preferencias, hoje=None):
+    """Grava a data da verificação de novos dados nas preferências."""
+    preferencias["ultima_verificacao_semanal"] = (hoje or date.today()).isoformat()
+    salvar_preferencias(preferencias)
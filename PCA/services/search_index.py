@@ -0,0 +1,159 @@
+# services/search_index.py
+
+"""
+Índice de busca textual por trigramas para as colunas de texto livre do PCA.
+
+Os textos são normalizados (sem acentos e em minúsculas, de modo que "agua"
+encontra "Água") e cada trigrama aponta para as linhas que o contêm. Uma
+busca intersecta as listas dos trigramas da consulta e só então confirma a
+substring nas poucas linhas candidatas.
+"""
+
+import re
+import unicodedata
+
+import numpy as np
+
+# Colunas de texto filtráveis que recebem um índice ao carregar cada ano
+COLUNAS_INDEXADAS = ['Descrição do Item', 'Identificador da Futura Contratação', 'Valor Total Estimado (R$)']
+
+# Consultas menores que um trigrama não usam o índice
+TAMANHO_NGRAMA = 3
+
+# Abaixo desta fração das linhas, conferir a base diretamente é mais barato
+# que intersectar as listas do índice
+FRACAO_VERIFICACAO_DIRETA = 0.02
+
+_SEPARADOR = 0
+
+# Marcas diacríticas combinantes, que sobram após a decomposição NFKD
+_ACENTOS = '[\u0300-\u036f]'
+
+
+def normalizar(texto):
+    """Remove acentos e converte para minúsculas."""
+    return re.sub(_ACENTOS, '', unicodedata.normalize('NFKD', str(texto))).lower()
+
+
+def normalizar_serie(serie):
+    """Versão vetorizada de `normalizar` para uma Series do pandas."""
+    return (serie.astype(str)
+            .str.normalize('NFKD')
+            .str.replace(_ACENTOS, '', regex=True)
+            .str.lower())
+
+
+def contem_normalizado(serie_normalizada, consulta_normalizada):
+    """Máscara booleana das linhas já normalizadas que contêm a consulta normalizada."""
+    return serie_normalizada.str.contains(consulta_normalizada, regex=False, na=False).to_numpy(dtype=bool)
+
+
+def _codigos(texto):
+    return np.frombuffer(texto.encode('utf-32-le'), dtype=np.uint32)
+
+
+class IndiceBusca:
+    """Índice de trigramas de uma coluna de texto. Construído uma vez por ano."""
+
+    def __init__(self, serie):
+        self.textos = normalizar_serie(serie).reset_index(drop=True)
+        self.total_linhas = len(self.textos)
+        self._construir()
+
+    def _chaves(self, codigos_densos):
+        """Codifica cada trio de caracteres consecutivos em um único inteiro."""
+        a = len(self.alfabeto)
+        c = codigos_densos.astype(np.int64)
+        return (c[:-2] * a + c[1:-1]) * a + c[2:]
+
+    def _construir(self):
+        separador = chr(_SEPARADOR)
+        codigos = _codigos(separador.join(self.textos.tolist()) + separador)
+
+        # Os caracteres são renumerados de 0 a len(alfabeto) - 1 para que os
+        # trigramas caibam em poucos bits
+        self.alfabeto = np.flatnonzero(np.bincount(codigos)).astype(np.uint32)
+        mapa = np.zeros(int(self.alfabeto[-1]) + 1, dtype=np.int64)
+        mapa[self.alfabeto] = np.arange(len(self.alfabeto))
+        codigos_densos = mapa[codigos]
+        comprimentos = self.textos.str.len().to_numpy(dtype=np.int64)
+        linha_por_posicao = np.repeat(np.arange(self.total_linhas, dtype=np.int64), comprimentos + 1)
+
+        validos = (codigos[:-2] != _SEPARADOR) & (codigos[1:-1] != _SEPARADOR) & (codigos[2:] != _SEPARADOR)
+        chaves = self._chaves(codigos_densos)[validos]
+        linhas = linha_por_posicao[:-2][validos]
+
+        if len(self.alfabeto) ** 3 < 2 ** 31:
+            # Trigrama e linha num só int64: uma ordenação simples já agrupa por
+            # trigrama, deixa as linhas crescentes e remove repetições
+            pares = np.sort((chaves << 32) | linhas)
+            if len(pares):
+                pares = pares[np.append(True, pares[1:] != pares[:-1])]
+            chaves = pares >> 32
+            linhas = pares & 0xFFFFFFFF
+        else:
+            ordem = np.lexsort((linhas, chaves))
+            chaves, linhas = chaves[ordem], linhas[ordem]
+            if len(chaves):
+                novos = np.ones(len(chaves), dtype=bool)
+                novos[1:] = (chaves[1:] != chaves[:-1]) | (linhas[1:] != linhas[:-1])
+                chaves, linhas = chaves[novos], linhas[novos]
+
+        inicios = np.flatnonzero(np.append(True, chaves[1:] != chaves[:-1])) if len(chaves) else np.empty(0, dtype=np.int64)
+        self.chaves = chaves[inicios]
+        self.inicios = np.append(inicios, len(chaves)).astype(np.int64)
+        self.linhas = linhas.astype(np.int32)
+
+    def _lista(self, chave):
+        i = np.searchsorted(self.chaves, chave)
+        if i >= len(self.chaves) or self.chaves[i] != chave:
+            return self.linhas[:0]
+        return self.linhas[self.inicios[i]:self.inicios[i + 1]]
+
+    def candidatos(self, consulta_normalizada):
+        """Linhas que contêm todos os trigramas da consulta (superconjunto do resultado)."""
+        codigos = _codigos(consulta_normalizada)
+        densos = np.searchsorted(self.alfabeto, codigos)
+        if np.any(densos >= len(self.alfabeto)) or np.any(self.alfabeto[np.minimum(densos, len(self.alfabeto) - 1)] != codigos):
+            # Algum caractere da consulta não aparece em nenhuma linha
+            return np.empty(0, dtype=np.int64)
+        listas = sorted((self._lista(chave) for chave in np.unique(self._chaves(densos))), key=len)
+        resultado = listas[0]
+        for lista in listas[1:]:
+            if not len(resultado):
+                break
+            resultado = np.intersect1d(resultado, lista, assume_unique=True)
+        return resultado.astype(np.int64)
+
+    def buscar(self, consulta, base=None):
+        """
+        Posições das linhas cujo texto normalizado contém a consulta
+        normalizada. `base` (posições em ordem crescente) restringe a busca,
+        por exemplo, ao resultado anterior.
+        """
+        consulta = normalizar(consulta)
+        if base is None:
+            base = np.arange(self.total_linhas)
+        if not consulta or not len(base):
+            return np.asarray(base)
+
+        if len(consulta) < TAMANHO_NGRAMA and len(base) == self.total_linhas:
+            return np.flatnonzero(contem_normalizado(self.textos, consulta))
+        if len(consulta) < TAMANHO_NGRAMA or len(base) < FRACAO_VERIFICACAO_DIRETA * self.total_linhas:
+            candidatos = np.asarray(base)
+        else:
+            candidatos = self.candidatos(consulta)
+            if len(base) < self.total_linhas:
+                candidatos = candidatos[np.isin(candidatos, base, assume_unique=True)]
+        if not len(candidatos):
+            return candidatos
+        return candidatos[contem_normalizado(self.textos.iloc[candidatos], consulta)]
+
+    def memoria_bytes(self):
+        return int(self.chaves.nbytes + self.inicios.nbytes + self.linhas.nbytes
+                   + self.textos.memory_usage(deep=True))
+
+
+def construir_indices(df, colunas=COLUNAS_INDEXADAS):
+    """Constrói um IndiceBusca para cada coluna existente em `df`."""
+    return {coluna: IndiceBusca(df[coluna]) for coluna in colunas if coluna in df.columns}
@@ -0,0 +1,34 @@
+# tests/conftest.py
+
+"""
+Testes automatizados (pytest). Uso, a partir da pasta PCA:
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+PASTA_PCA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PASTA_PCA not in sys.path:
+    sys.path.insert(0, PASTA_PCA)
+
+from benchmarks.dados_sinteticos import gerar_csv  # noqa: E402
+from services.parser import carregar_ano, caminho_csv  # noqa: E402
+
+
+@pytest.fixture(scope='session', params=[True, False], ids=['compacto', 'completo'])
+def ano_sintetico(request, tmp_path_factory):
+    """
+    DataFrame tipado (carregar_ano) de um ano sintético de 5000 linhas, nos
+    dois modos de memória, com algumas datas e descrições vazias.
+    """
+    destino = str(tmp_path_factory.mktemp('ano_sintetico'))
+    caminho = gerar_csv(caminho_csv('2025', destino), 5000)
+    df = pd.read_csv(caminho, sep=';', dtype=str)
+    df.loc[::97, 'Data Desejada'] = None
+    df.loc[::89, 'Descrição do Item'] = None
+    df.to_csv(caminho, sep=';', index=False)
+    return carregar_ano('2025', destino, request.param)
@@ -0,0 +1,80 @@
+# tests/test_alteracoes.py
+
+"""Comparação entre duas versões de um ano (services.alteracoes)."""
+
+import pandas as pd
+import pytest
+
+from benchmarks.dados_sinteticos import gerar_csv
+from benchmarks.servidor_local import ServidorLocal
+from services import alteracoes
+from services.alteracoes import ADICIONADO, MODIFICADO, REMOVIDO, COLUNA_ALTERACAO, COLUNA_CHAVE
+from services.downloader import download_csv_files
+from services.parser import carregar_ano, caminho_csv
+
+
+def _versoes(tmp_path, compacto=True):
+    """(anterior, novo, ids): o novo sem a linha 5, com as linhas 7 e 8 alteradas e o item 99999."""
+    (tmp_path / 'anterior').mkdir()
+    (tmp_path / 'novo').mkdir()
+    origem = gerar_csv(caminho_csv('2025', str(tmp_path / 'anterior')), 300)
+    df = pd.read_csv(origem, sep=';', dtype=str)
+    novo = df.drop(index=5)
+    novo.loc[7, 'Valor Total Estimado (R$)'] = '1234,50'
+    novo.loc[8, 'Descrição do Item'] = 'Descrição nova'
+    adicionado = df.iloc[[0]].copy()
+    adicionado[COLUNA_CHAVE] = '99999'
+    novo = pd.concat([novo, adicionado], ignore_index=True)
+    novo.to_csv(caminho_csv('2025', str(tmp_path / 'novo')), sep=';', index=False)
+    ids = {'removido': df.loc[5, COLUNA_CHAVE], 'valor': df.loc[7, COLUNA_CHAVE], 'descricao': df.loc[8, COLUNA_CHAVE]}
+    return (carregar_ano('2025', str(tmp_path / 'anterior'), compacto),
+            carregar_ano('2025', str(tmp_path / 'novo'), compacto), ids)
+
+
+def _por_tipo(registro, tipo):
+    return registro[registro[COLUNA_ALTERACAO] == tipo]
+
+
+@pytest.mark.parametrize('compacto', [True, False])
+def test_comparar(tmp_path, compacto):
+    anterior, novo, ids = _versoes(tmp_path, compacto)
+    registro, resumo, impressoes = alteracoes.comparar(anterior, novo)
+
+    assert (resumo['adicionados'], resumo['removidos'], resumo['modificados']) == (1, 1, 2)
+    assert _por_tipo(registro, ADICIONADO)[COLUNA_CHAVE].tolist() == ['99999']
+    assert _por_tipo(registro, REMOVIDO)[COLUNA_CHAVE].tolist() == [ids['removido']]
+    modificados = _por_tipo(registro, MODIFICADO).set_index(COLUNA_CHAVE)
+    assert modificados.loc[ids['valor'], 'Colunas alteradas'] == 'Valor Total Estimado (R$)'
+    assert modificados.loc[ids['valor'], 'Valor novo (R$)'] == pytest.approx(1234.5)
+    assert modificados.loc[ids['descricao'], 'Colunas alteradas'] == 'Descrição do Item'
+    assert modificados.loc[ids['descricao'], 'Diferença (R$)'] == 0
+    assert resumo['valor_novo'] - resumo['valor_anterior'] == pytest.approx(
+        resumo['valor_adicionado'] - resumo['valor_removido'] + resumo['variacao_modificados'])
+    assert len(impressoes['chaves']) == len(novo)
+
+
+def test_comparar_com_impressoes_guardadas(tmp_path):
+    anterior, novo, _ = _versoes(tmp_path)
+    impressoes = alteracoes.calcular_impressoes(anterior, alteracoes._colunas_comparadas(anterior, novo))
+    esperado, resumo_esperado, _ = alteracoes.comparar(anterior, novo)
+    registro, resumo, _ = alteracoes.comparar(anterior, novo, impressoes)
+    assert resumo == resumo_esperado
+    pd.testing.assert_frame_equal(registro, esperado)
+
+
+def test_versoes_iguais(tmp_path):
+    anterior, _, _ = _versoes(tmp_path)
+    _, resumo, _ = alteracoes.comparar(anterior, anterior.copy())
+    assert (resumo['adicionados'], resumo['removidos'], resumo['modificados']) == (0, 0, 0)
+
+
+@pytest.mark.parametrize('compacto', [True, False])
+def test_impressoes_guardadas_no_modo_da_interface(tmp_path, compacto):
+    """Depois de um download, as impressões servem de base ao próximo no mesmo modo de memória."""
+    pasta = tmp_path / 'servidor'
+    pasta.mkdir()
+    gerar_csv(str(pasta / 'pca_2025.csv'), 300)
+    destino = str(tmp_path / 'data')
+    with ServidorLocal(str(pasta)) as url_base:
+        download_csv_files({'2025': f"{url_base}/pca_2025.csv"}, destino=destino, uasgs=[], compacto=compacto)
+    assert alteracoes.impressoes_salvas('2025', destino, compacto) is not None
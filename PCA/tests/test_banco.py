@@ -0,0 +1,128 @@
+# tests/test_banco.py
+
+"""
+Banco SQLite local (services.banco): filtros e ordenação iguais aos da
+memória, sem acentos, e consultas que não esperam por uma cópia em andamento.
+"""
+
+import sqlite3
+import threading
+
+import numpy as np
+import pytest
+
+from benchmarks.dados_sinteticos import gerar_csv
+from services.banco import BancoPCA, MotorFiltroSQL, VERSAO_ESQUEMA
+from services.filtros import filtrar_indices
+from services.ordenacao import MotorOrdenacao
+from services.parser import carregar_ano, caminho_csv
+
+
+@pytest.fixture
+def banco(tmp_path):
+    destino = str(tmp_path / 'data')
+    (tmp_path / 'data').mkdir()
+    gerar_csv(caminho_csv('2025', destino), 2000)
+    banco = BancoPCA(str(tmp_path / 'data' / 'pca.sqlite'))
+    assert banco.sincronizar(['2025'], destino) == ['2025']
+    yield banco, carregar_ano('2025', destino)
+    banco.fechar()
+
+
+@pytest.mark.parametrize('campo, valor', [
+    ('Nome do PDM do Item', 'agua'),
+    ('Nome do PDM do Item', 'MANUTENCAO'),
+    ('Descrição do Item', 'acao'),
+    ('Categoria do Item', 'servico'),
+    ('Unidade Responsável', 'unidade 2500'),
+])
+def test_filtro_ignora_acentos(banco, campo, valor):
+    banco, df = banco
+    criterios = {'textos': {campo: valor}}
+    esperado = filtrar_indices(df, criterios)
+    assert len(esperado)
+    # Na primeira cópia, o rowid é a posição da linha no ano mais um
+    np.testing.assert_array_equal(banco.ids(criterios, '2025') - 1, esperado)
+
+
+@pytest.mark.parametrize('coluna', ['Nome do PDM do Item', 'Categoria do Item', 'Descrição do Item'])
+@pytest.mark.parametrize('ascendente', [True, False])
+def test_ordenacao_igual_a_da_memoria(banco, coluna, ascendente):
+    banco, df = banco
+    esperado = MotorOrdenacao(df).permutacao(coluna, ascendente)
+    np.testing.assert_array_equal(banco.ids({}, '2025', (coluna, ascendente)) - 1, esperado)
+
+
+def test_motor_ordena_com_os_criterios_de_cada_consulta(banco):
+    """A ordenação vale para as consultas seguintes, cada uma com os seus próprios critérios."""
+    banco, df = banco
+    motor = MotorFiltroSQL(banco, '2025')
+    agua = {'textos': {'Nome do PDM do Item': 'agua'}}
+    servico = {'textos': {'Categoria do Item': 'servico'}}
+    motor.aplicar(agua)
+    motor.definir_ordenacao('Descrição do Item', False)
+    # Uma consulta mais antiga, com outros critérios, não muda o resultado da seguinte
+    motor.aplicar(servico)
+    ordenacao = MotorOrdenacao(df)
+    for criterios in (agua, servico):
+        esperado = ordenacao.ordenar(filtrar_indices(df, criterios), 'Descrição do Item', False)
+        np.testing.assert_array_equal(motor.aplicar(criterios) - 1, esperado)
+
+
+def test_modelo_sql_nao_consulta_ao_ordenar(banco, monkeypatch):
+    """Ordenar a tabela do banco só registra a ordem; a consulta fica com a filtragem da aba."""
+    from PySide6.QtCore import Qt
+    from ui.table_model import ModeloTabelaSQL
+
+    banco, df = banco
+    motor = MotorFiltroSQL(banco, '2025')
+    modelo = ModeloTabelaSQL(motor, ['Nome do PDM do Item', 'Valor Total Estimado (R$)'])
+    pedidos = []
+    modelo.ordenacao_alterada.connect(lambda: pedidos.append(True))
+    monkeypatch.setattr(banco, 'ids', lambda *args: pytest.fail("consulta na thread da interface"))
+    modelo.sort(1, Qt.DescendingOrder)
+    assert pedidos == [True]
+    assert motor.ordenacao == ('Valor Total Estimado (R$)', False)
+
+
+def test_consultas_nao_esperam_pela_copia(banco):
+    """Com uma cópia em andamento, as consultas de outra thread veem a versão anterior."""
+    banco, df = banco
+    resultados = {}
+
+    def consultar():
+        resultados['ids'] = banco.ids({}, '2025')
+        resultados['linhas'] = banco.linhas(resultados['ids'][:10], ['UASG'])
+        resultados['totais'] = banco.totais({}, '2025')
+        resultados['tem_ano'] = banco.tem_ano('2025')
+
+    with banco._lock:
+        # Transação de escrita aberta e não confirmada, como no meio de ingerir_ano
+        banco._conexao.execute("DELETE FROM itens")
+        consulta = threading.Thread(target=consultar)
+        consulta.start()
+        consulta.join(timeout=10)
+        assert not consulta.is_alive()
+        banco._conexao.rollback()
+
+    assert len(resultados['ids']) == len(df)
+    assert len(resultados['linhas']) == 10
+    assert resultados['totais']['registros'] == len(df)
+    assert resultados['tem_ano']
+
+
+def test_esquema_antigo_recriado(tmp_path):
+    caminho = str(tmp_path / 'pca.sqlite')
+    with sqlite3.connect(caminho) as conexao:
+        conexao.execute("CREATE TABLE itens (ano TEXT NOT NULL, descricao_normalizada TEXT)")
+        conexao.execute("CREATE TABLE anos (ano TEXT PRIMARY KEY, assinatura TEXT)")
+        conexao.execute("INSERT INTO anos VALUES ('2025', 'null')")
+    conexao.close()
+
+    banco = BancoPCA(caminho)
+    try:
+        # Sem anos registrados, a próxima sincronização copia tudo de novo
+        assert banco.anos() == []
+        assert banco._conexao.execute("PRAGMA user_version").fetchone()[0] == VERSAO_ESQUEMA
+    finally:
+        banco.fechar()
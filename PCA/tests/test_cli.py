@@ -0,0 +1,43 @@
+# tests/test_cli.py
+
+"""Modo de linha de comando (cli.py) sobre uma pasta com dados sintéticos."""
+
+import json
+
+import pandas as pd
+import pytest
+
+import cli
+from benchmarks.dados_sinteticos import gerar_csv
+
+
+@pytest.fixture
+def pasta(tmp_path, monkeypatch):
+    """Pasta do programa com preferencias.json e um ano; o cwd fica em outra pasta."""
+    pasta = tmp_path / 'pasta'
+    (pasta / 'data').mkdir(parents=True)
+    gerar_csv(str(pasta / 'data' / 'pca_2025.csv'), 500)
+    (pasta / 'preferencias.json').write_text(json.dumps({'data_sources': {'2025': 'http://localhost/2025'}}),
+                                             encoding='utf-8')
+    chamada = tmp_path / 'chamada'
+    chamada.mkdir()
+    # main() troca o cwd para --pasta; monkeypatch o restaura ao fim do teste
+    monkeypatch.chdir(chamada)
+    return pasta
+
+
+def test_export_saida_relativa_ao_cwd(pasta):
+    chamada = pasta.parent / 'chamada'
+    assert cli.main(['--pasta', str(pasta), 'export', '2025', '--uasg', '250052', '--saida', 'itens.csv']) == 0
+    assert not (pasta / 'itens.csv').exists()
+    exportado = pd.read_csv(chamada / 'itens.csv', sep=';', dtype=str)
+    origem = pd.read_csv(pasta / 'data' / 'pca_2025.csv', sep=';', dtype=str)
+    assert len(exportado) == (origem['UASG'] == '250052').sum()
+    assert set(exportado['UASG']) == {'250052'}
+
+
+def test_de_ate_com_mes_rejeitado(pasta, capsys):
+    with pytest.raises(SystemExit) as saida:
+        cli.main(['--pasta', str(pasta), 'query', '2025', '--mes', '2025-03', '--de', '01/03/2025'])
+    assert saida.value.code == 2
+    assert '--de/--ate' in capsys.readouterr().err
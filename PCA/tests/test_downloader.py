@@ -0,0 +1,205 @@
+# tests/test_downloader.py
+
+"""
+Download concorrente e filtragem em lotes (services.downloader), contra o
+servidor local dos benchmarks no lugar do PNCP.
+"""
+
+import os
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler
+
+import pandas as pd
+import pytest
+
+from benchmarks.dados_sinteticos import gerar_csv
+from benchmarks.servidor_local import ServidorLocal
+from services import downloader
+from services.downloader import download_csv_files, filtrar_csv_em_lotes
+from services.parser import CACHE_DISPONIVEL, _carregar_cache
+
+ANOS = ['2023', '2024', '2025']
+
+
+def _ler(caminho):
+    return pd.read_csv(caminho, sep=';', dtype=str)
+
+
+@pytest.fixture
+def servidor(tmp_path):
+    """Servidor local com um CSV sintético por ano; retorna (url_base, pasta servida)."""
+    pasta = tmp_path / 'servidor'
+    pasta.mkdir()
+    for semente, ano in enumerate(ANOS):
+        gerar_csv(str(pasta / f'pca_{ano}.csv'), 3000, ano=int(ano), semente=semente)
+    with ServidorLocal(str(pasta)) as url_base:
+        yield url_base, pasta
+
+
+def test_filtrar_csv_em_lotes(tmp_path):
+    origem = gerar_csv(str(tmp_path / 'origem.csv'), 2500)
+    esperado = _ler(origem)
+
+    saida = str(tmp_path / 'filtrado.csv')
+    lidas, gravadas = filtrar_csv_em_lotes(origem, saida, ['250052', '250005'], linhas_por_lote=300)
+    filtrado = _ler(saida)
+    selecionadas = esperado[esperado['UASG'].isin(['250052', '250005'])].reset_index(drop=True)
+    assert (lidas, gravadas) == (2500, len(selecionadas))
+    pd.testing.assert_frame_equal(filtrado, selecionadas)
+
+    # Lista vazia mantém todas as UASGs
+    lidas, gravadas = filtrar_csv_em_lotes(origem, saida, [], linhas_por_lote=300)
+    assert lidas == gravadas == 2500
+    pd.testing.assert_frame_equal(_ler(saida), esperado)
+
+
+def test_filtrar_csv_em_lotes_vazio(tmp_path):
+    vazio = tmp_path / 'vazio.csv'
+    vazio.write_bytes(b'')
+    assert filtrar_csv_em_lotes(str(vazio), str(tmp_path / 'saida.csv')) == (0, 0)
+
+
+def test_download_de_varios_anos(servidor, tmp_path):
+    url_base, pasta = servidor
+    destino = str(tmp_path / 'data')
+    progresso = {}
+    trava = threading.Lock()
+
+    def ao_progredir(ano, baixados, totais):
+        with trava:
+            progresso[ano] = (baixados, totais)
+
+    urls = {ano: f"{url_base}/pca_{ano}.csv" for ano in ANOS}
+    resultados = download_csv_files(urls, destino=destino, max_workers=3, progress_callback=ao_progredir,
+                                    uasgs=['250052'])
+
+    assert set(resultados) == set(ANOS)
+    for ano in ANOS:
+        origem = _ler(pasta / f'pca_{ano}.csv')
+        esperado = origem[origem['UASG'] == '250052'].reset_index(drop=True)
+        baixado = _ler(os.path.join(destino, f'pca_{ano}.csv'))
+        assert resultados[ano]['status'] == 'atualizado'
+        assert resultados[ano]['linhas'] == len(esperado)
+        pd.testing.assert_frame_equal(baixado, esperado)
+        tamanho = os.path.getsize(pasta / f'pca_{ano}.csv')
+        assert resultados[ano]['bytes'] == tamanho
+        assert progresso[ano] == (tamanho, tamanho)
+
+
+def test_tempo_por_ano(servidor, tmp_path):
+    """Cada ano informa o próprio tempo, não o do lote inteiro."""
+    _, pasta = servidor
+
+    class HandlerLento(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            if '2023' in self.path:
+                time.sleep(1.0)
+            super().do_GET()
+
+        def log_message(self, format, *args):
+            pass
+
+    with ServidorLocal(str(pasta), handler=HandlerLento) as url_lento:
+        urls = {ano: f"{url_lento}/pca_{ano}.csv" for ano in ANOS}
+        resultados = download_csv_files(urls, destino=str(tmp_path / 'data'), max_workers=3, uasgs=[])
+    assert resultados['2023']['segundos'] >= 1.0
+    assert resultados['2024']['segundos'] < 0.8
+    assert resultados['2025']['segundos'] < 0.8
+
+
+def test_segundo_download_inalterado(servidor, tmp_path):
+    url_base, _ = servidor
+    destino = str(tmp_path / 'data')
+    urls = {'2025': f"{url_base}/pca_2025.csv"}
+    assert download_csv_files(urls, destino=destino, uasgs=[])['2025']['status'] == 'atualizado'
+    caminho = os.path.join(destino, 'pca_2025.csv')
+    modificado_em = os.stat(caminho).st_mtime_ns
+
+    # O servidor responde 304 ao If-Modified-Since: nada é baixado nem regravado
+    resumo = download_csv_files(urls, destino=destino, uasgs=[])['2025']
+    assert resumo['status'] == 'inalterado'
+    assert resumo['bytes'] == 0
+    assert os.stat(caminho).st_mtime_ns == modificado_em
+
+
+def test_cancelamento_preserva_arquivos(tmp_path):
+    pasta = tmp_path / 'servidor'
+    pasta.mkdir()
+    # Grande o bastante para chegar em vários blocos
+    gerar_csv(str(pasta / 'pca_2025.csv'), 20000)
+    assert os.path.getsize(pasta / 'pca_2025.csv') > 4 * downloader.TAMANHO_BLOCO
+    destino = tmp_path / 'data'
+    destino.mkdir()
+    anterior = destino / 'pca_2025.csv'
+    anterior.write_text('conteúdo anterior\n', encoding='utf-8')
+
+    cancelamento = threading.Event()
+    with ServidorLocal(str(pasta)) as url_base:
+        resultados = download_csv_files({'2025': f"{url_base}/pca_2025.csv"}, destino=str(destino),
+                                        progress_callback=lambda *_: cancelamento.set(),
+                                        cancelamento=cancelamento, uasgs=[])
+
+    assert resultados['2025']['status'] == 'cancelado'
+    assert anterior.read_text(encoding='utf-8') == 'conteúdo anterior\n'
+    assert not [nome for nome in os.listdir(destino) if nome.endswith('.part')]
+
+
+def test_ordem_da_origem_preservada(tmp_path):
+    """As linhas do ano saem na ordem do servidor, não agrupadas por UASG."""
+    pasta = tmp_path / 'servidor'
+    for semente, orgao in enumerate(['26000', '36000']):
+        (pasta / 'orgaos' / orgao).mkdir(parents=True)
+        gerar_csv(str(pasta / 'orgaos' / orgao / 'pca_2025.csv'), 1500, semente=semente)
+    destino = str(tmp_path / 'data')
+    caminho = os.path.join(destino, 'pca_2025.csv')
+
+    with ServidorLocal(str(pasta)) as url_base:
+        urls = {'2025': f"{url_base}/orgaos/26000/pca_2025.csv"}
+        resumo = download_csv_files(urls, destino=destino, orgaos=['26000', '36000'], uasgs=[])['2025']
+        assert resumo['status'] == 'atualizado'
+        esperado = pd.concat([_ler(pasta / 'orgaos' / o / 'pca_2025.csv') for o in ['26000', '36000']],
+                             ignore_index=True)
+        pd.testing.assert_frame_equal(_ler(caminho), esperado)
+
+        # Uma linha nova no meio muda a posição das seguintes sem mudar as partições
+        # das outras UASGs: o arquivo do ano é remontado, ainda na ordem do servidor
+        origem = pasta / 'orgaos' / '26000' / 'pca_2025.csv'
+        linhas = origem.read_text(encoding='utf-8').splitlines(keepends=True)
+        nova = linhas[1].split(';')
+        nova[2] = '99999'
+        linhas.insert(700, ';'.join(nova))
+        origem.write_text(''.join(linhas), encoding='utf-8')
+        os.utime(origem, (os.stat(origem).st_atime + 10, os.stat(origem).st_mtime + 10))
+
+        resumo = download_csv_files(urls, destino=destino, orgaos=['26000', '36000'], uasgs=[])['2025']
+        assert resumo['status'] == 'atualizado'
+        assert resumo['particoes_alteradas'] == 1
+        esperado = pd.concat([_ler(pasta / 'orgaos' / o / 'pca_2025.csv') for o in ['26000', '36000']],
+                             ignore_index=True)
+        pd.testing.assert_frame_equal(_ler(caminho), esperado)
+
+
+def test_ordem_com_quebra_de_linha(tmp_path):
+    """Descrições com quebra de linha não permitem copiar linha a linha; a ordem se mantém."""
+    pasta = tmp_path / 'servidor'
+    pasta.mkdir()
+    origem = _ler(gerar_csv(str(pasta / 'base.csv'), 500))
+    origem.loc[[10, 250], 'Descrição do Item'] = ['Caixa\nde papelão', 'Água\nmineral']
+    origem.to_csv(pasta / 'pca_2025.csv', sep=';', index=False)
+    destino = str(tmp_path / 'data')
+
+    with ServidorLocal(str(pasta)) as url_base:
+        download_csv_files({'2025': f"{url_base}/pca_2025.csv"}, destino=destino, uasgs=[])
+    pd.testing.assert_frame_equal(_ler(os.path.join(destino, 'pca_2025.csv')), origem)
+
+
+@pytest.mark.skipif(not CACHE_DISPONIVEL, reason="cache colunar requer pyarrow")
+@pytest.mark.parametrize('compacto', [True, False])
+def test_cache_no_modo_de_memoria_pedido(servidor, tmp_path, compacto):
+    """O cache regravado ao remontar o ano serve ao modo de memória da interface."""
+    url_base, _ = servidor
+    destino = str(tmp_path / 'data')
+    download_csv_files({'2025': f"{url_base}/pca_2025.csv"}, destino=destino, uasgs=[], compacto=compacto)
+    assert _carregar_cache('2025', destino, compacto) is not None
+    assert _carregar_cache('2025', destino, not compacto) is None
@@ -0,0 +1,169 @@
+# tests/test_filtros.py
+
+"""
+Filtragem incremental (services.filtros.MotorFiltro), comparada a um
+filtro simples do pandas sobre o DataFrame inteiro.
+"""
+
+import random
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import filtros
+from services.filtros import IndiceDatas, MotorFiltro, eh_refinamento, normalizar_criterios
+from services.search_index import construir_indices, normalizar
+
+
+def _filtrar_ingenuo(df, criterios):
+    """Posições das linhas que atendem aos critérios, linha a linha."""
+    mascara = pd.Series(True, index=df.index)
+    for campo, valor in criterios.get('textos', {}).items():
+        if valor:
+            consulta = normalizar(valor)
+            mascara &= df[campo].map(lambda v: not pd.isna(v) and consulta in normalizar(v)).astype(bool)
+    for campo, selecionados in criterios.get('valores', {}).items():
+        if selecionados:
+            mascara &= df[campo].astype(object).map(lambda v: str(v) in set(selecionados)).astype(bool)
+    periodo = criterios.get('periodo')
+    if periodo is not None:
+        inicio, fim = periodo
+        datas = df['data_datetime']
+        if inicio is not None:
+            mascara &= (datas >= pd.Timestamp(inicio)).fillna(False).astype(bool)
+        if fim is not None:
+            mascara &= (datas <= pd.Timestamp(fim)).fillna(False).astype(bool)
+        mascara &= datas.notna()
+    return np.flatnonzero(mascara.to_numpy())
+
+
+DESCRICAO = 'Descrição do Item'
+PDM = 'Nome do PDM do Item'
+
+# Digitação e correções de um usuário: cada passo estreita ou amplia o anterior
+SEQUENCIA = [
+    {},
+    {'textos': {DESCRICAO: 'a'}},
+    {'textos': {DESCRICAO: 'ag'}},
+    {'textos': {DESCRICAO: 'agu'}},
+    {'textos': {DESCRICAO: 'agua', PDM: 'AGUA'}},
+    {'textos': {DESCRICAO: 'ag', PDM: 'AGUA'}},
+    {'textos': {DESCRICAO: 'ag'}, 'valores': {'UASG': ['250052', '250005']}},
+    {'textos': {DESCRICAO: 'ag'}, 'valores': {'UASG': ['250052']}},
+    {'textos': {DESCRICAO: 'ag'}, 'valores': {'UASG': ['250052']},
+     'periodo': (date(2025, 3, 1), date(2025, 6, 30))},
+    {'textos': {DESCRICAO: 'ag'}, 'valores': {'UASG': ['250052']},
+     'periodo': (date(2025, 4, 1), date(2025, 5, 31))},
+    {'textos': {DESCRICAO: 'ag'}, 'valores': {'UASG': ['250052']}, 'periodo': (date(2025, 4, 1), None)},
+    {'textos': {DESCRICAO: 'ag'}, 'periodo': (date(2025, 4, 1), None)},
+    {'textos': {DESCRICAO: 'água'}, 'periodo': (None, date(2025, 8, 15))},
+    {'textos': {DESCRICAO: 'água estéril'}, 'periodo': (None, date(2025, 8, 15))},
+    {'textos': {DESCRICAO: 'Água', 'Categoria do Item': 'servico'}},
+    {},
+]
+
+
+@pytest.fixture
+def espiao(monkeypatch):
+    """Registra o tamanho da base avaliada a cada chamada de _aplicar_predicados."""
+    bases = []
+    original = filtros._aplicar_predicados
+
+    def espiar(df, indices, *args, **kwargs):
+        bases.append(len(indices))
+        return original(df, indices, *args, **kwargs)
+
+    monkeypatch.setattr(filtros, '_aplicar_predicados', espiar)
+    return bases
+
+
+@pytest.mark.parametrize('com_indices', [False, True], ids=['sem_indices', 'com_indices'])
+def test_sequencia_igual_ao_filtro_simples(ano_sintetico, espiao, com_indices):
+    df = ano_sintetico
+    motor = MotorFiltro(df, construir_indices(df) if com_indices else None)
+    anteriores, resultado_anterior = normalizar_criterios({}), np.arange(len(df))
+    for criterios in SEQUENCIA:
+        resultado = motor.aplicar(criterios)
+        np.testing.assert_array_equal(resultado, _filtrar_ingenuo(df, criterios), err_msg=str(criterios))
+        # Refinamentos partem do resultado anterior; ampliações, do ano inteiro
+        novos = normalizar_criterios(criterios)
+        esperado = len(resultado_anterior) if eh_refinamento(anteriores, novos) else len(df)
+        assert espiao[-1] == esperado, criterios
+        anteriores, resultado_anterior = novos, resultado
+
+
+def test_refinamentos_e_ampliacoes_aleatorios(ano_sintetico):
+    df = ano_sintetico
+    motor = MotorFiltro(df, construir_indices(df))
+    rng = random.Random(7)
+    descricoes = df[DESCRICAO].dropna().astype(str).tolist()
+    texto, uasgs, periodo = '', [], None
+    for _ in range(80):
+        acao = rng.random()
+        if acao < 0.4:
+            # Mais letras de uma descrição existente (ou o começo de outra)
+            alvo = rng.choice(descricoes)
+            texto = alvo[:len(texto) + rng.randint(1, 3)] if alvo.startswith(texto) else alvo[:rng.randint(1, 4)]
+        elif acao < 0.6:
+            texto = texto[:max(0, len(texto) - rng.randint(1, 3))]
+        elif acao < 0.75:
+            uasgs = rng.sample(['250052', '250005', '250057', '250110', '250088'], rng.randint(0, 3))
+        else:
+            mes = rng.randint(1, 12)
+            periodo = rng.choice([None, (date(2025, mes, 1), date(2025, mes, 28)), (date(2025, mes, 1), None)])
+        criterios = {'textos': {DESCRICAO: texto}, 'valores': {'UASG': uasgs}, 'periodo': periodo}
+        np.testing.assert_array_equal(motor.aplicar(criterios), _filtrar_ingenuo(df, criterios),
+                                      err_msg=str(criterios))
+
+
+def test_totais_guardados_por_criterio(ano_sintetico):
+    df = ano_sintetico
+    motor = MotorFiltro(df)
+    criterios = {'textos': {DESCRICAO: 'agua'}}
+    indices = motor.aplicar(criterios)
+    totais = motor.totais(criterios, indices)
+    assert totais['registros'] == len(indices)
+    assert totais['valor_total'] == pytest.approx(df['valor_numerico'].iloc[indices].sum())
+    assert motor.totais(criterios, indices) is totais
+
+
+# --- IndiceDatas ---
+
+DATAS = pd.Series(pd.to_datetime([
+    '2025-03-10', None, '2025-01-01', '2025-03-31', '2025-03-01', None, '2025-12-31', '2025-02-28', '2025-03-01',
+]))
+
+
+@pytest.mark.parametrize('periodo, esperado', [
+    ((date(2025, 3, 1), date(2025, 3, 31)), [0, 3, 4, 8]),      # os dois limites são inclusivos
+    ((date(2025, 3, 1), date(2025, 3, 1)), [4, 8]),
+    ((date(2025, 3, 2), date(2025, 3, 30)), [0]),
+    ((None, date(2025, 2, 28)), [2, 7]),                          # sem início
+    ((date(2025, 3, 31), None), [3, 6]),                          # sem fim
+    ((None, None), [0, 2, 3, 4, 6, 7, 8]),                        # linhas sem data nunca entram
+    ((date(2026, 1, 1), None), []),
+    ((date(2025, 4, 1), date(2025, 3, 1)), []),
+])
+def test_indice_datas(periodo, esperado):
+    np.testing.assert_array_equal(IndiceDatas(DATAS).buscar(periodo), esperado)
+
+
+@pytest.mark.parametrize('base', [[1, 3], [0, 1, 2, 3, 4, 5, 6], list(range(len(DATAS)))])
+def test_indice_datas_com_base(base):
+    """Bases menores e maiores que o período, e a base igual ao ano inteiro."""
+    periodo = (date(2025, 1, 1), date(2025, 3, 31))
+    esperado = [p for p in [0, 2, 3, 4, 7, 8] if p in base]
+    np.testing.assert_array_equal(IndiceDatas(DATAS).buscar(periodo, np.array(base)), esperado)
+
+
+def test_indice_datas_igual_ao_filtro_simples(ano_sintetico):
+    indice = IndiceDatas(ano_sintetico['data_datetime'])
+    rng = np.random.default_rng(11)
+    base = np.sort(rng.choice(len(ano_sintetico), 300, replace=False))
+    for periodo in [(date(2025, 2, 10), date(2025, 2, 10)), (date(2025, 5, 1), None), (None, date(2025, 1, 31)),
+                    (date(2025, 1, 1), date(2025, 12, 31))]:
+        esperado = _filtrar_ingenuo(ano_sintetico, {'periodo': periodo})
+        np.testing.assert_array_equal(indice.buscar(periodo), esperado)
+        np.testing.assert_array_equal(indice.buscar(periodo, base), esperado[np.isin(esperado, base)])
@@ -0,0 +1,86 @@
+# tests/test_ordenacao.py
+
+"""
+Ordenação por coluna (services.ordenacao.MotorOrdenacao), comparada a uma
+ordenação estável do Python com as linhas sem valor no fim.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import ordenacao
+from services.ordenacao import FRACAO_ORDENACAO_DIRETA, MotorOrdenacao
+from services.search_index import normalizar
+
+
+def _chave(coluna):
+    """Chave de comparação do Python para cada tipo de coluna, ou None para vazio."""
+    if coluna == 'Valor Total Estimado (R$)':
+        return 'valor_numerico', float
+    if coluna == 'Quantidade Estimada':
+        return 'quantidade_numerica', float
+    if coluna == 'Data Desejada':
+        return 'data_datetime', lambda v: v
+    if coluna in ('UASG', 'Id do item no PCA', 'Código do Item'):
+        return coluna, lambda v: float(v)
+    return coluna, lambda v: normalizar(str(v).strip())
+
+
+def _ordem_esperada(df, coluna, ascendente):
+    origem, converter = _chave(coluna)
+    valores = df[origem].tolist()
+    vazio = [pd.isna(v) or (isinstance(v, str) and not v.strip()) for v in valores]
+    preenchidas = [i for i in range(len(valores)) if not vazio[i]]
+    # reverse=True mantém a ordem original dos empates, como a permutação estável
+    ordenadas = sorted(preenchidas, key=lambda i: converter(valores[i]), reverse=not ascendente)
+    return np.array(ordenadas + [i for i in range(len(valores)) if vazio[i]])
+
+
+COLUNAS = ['Valor Total Estimado (R$)', 'Quantidade Estimada', 'Data Desejada', 'UASG', 'Id do item no PCA',
+           'Nome do PDM do Item', 'Descrição do Item', 'Categoria do Item']
+
+
+@pytest.mark.parametrize('coluna', COLUNAS)
+@pytest.mark.parametrize('ascendente', [True, False], ids=['crescente', 'decrescente'])
+def test_permutacao(ano_sintetico, coluna, ascendente):
+    motor = MotorOrdenacao(ano_sintetico)
+    np.testing.assert_array_equal(motor.permutacao(coluna, ascendente),
+                                  _ordem_esperada(ano_sintetico, coluna, ascendente))
+
+
+def test_sem_valor_no_fim_nas_duas_direcoes(ano_sintetico):
+    motor = MotorOrdenacao(ano_sintetico)
+    sem_data = ano_sintetico['data_datetime'].isna().to_numpy()
+    assert sem_data.any()
+    for ascendente in (True, False):
+        permutacao = motor.permutacao('Data Desejada', ascendente)
+        assert sem_data[permutacao[-sem_data.sum():]].all()
+
+
+@pytest.mark.parametrize('coluna', ['Valor Total Estimado (R$)', 'Data Desejada', 'Nome do PDM do Item'])
+@pytest.mark.parametrize('fracao', [0.5, FRACAO_ORDENACAO_DIRETA / 4], ids=['grande', 'pequeno'])
+def test_ordenar_resultado_filtrado(ano_sintetico, coluna, fracao):
+    """Os dois caminhos de `ordenar` equivalem a percorrer a permutação mantendo o resultado."""
+    motor = MotorOrdenacao(ano_sintetico)
+    rng = np.random.default_rng(5)
+    indices = np.sort(rng.choice(len(ano_sintetico), max(1, int(len(ano_sintetico) * fracao)), replace=False))
+    for ascendente in (True, False):
+        permutacao = motor.permutacao(coluna, ascendente)
+        esperado = permutacao[np.isin(permutacao, indices)]
+        np.testing.assert_array_equal(motor.ordenar(indices, coluna, ascendente), esperado)
+    assert len(motor.ordenar(np.empty(0, dtype=np.int64), coluna)) == 0
+
+
+def test_permutacao_reaproveitada(ano_sintetico, monkeypatch):
+    motor = MotorOrdenacao(ano_sintetico)
+    motor.preparar(['Nome do PDM do Item', 'Coluna inexistente'])
+    primeira = motor.permutacao('Nome do PDM do Item', True)
+
+    def sem_recalculo(df, coluna):
+        raise AssertionError("a permutação deveria vir do cache")
+
+    monkeypatch.setattr(ordenacao, 'chave_ordenacao', sem_recalculo)
+    assert motor.permutacao('Nome do PDM do Item', True) is primeira
+    motor.permutacao('Nome do PDM do Item', False)
+    motor.ordenar(np.arange(10), 'Nome do PDM do Item')
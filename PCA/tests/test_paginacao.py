@@ -0,0 +1,174 @@
+# tests/test_paginacao.py
+
+"""
+Download de consultas paginadas do PNCP (services.downloader), contra um
+servidor local que serve N páginas, com e sem o total de registros.
+"""
+
+import hashlib
+import os
+import random
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+import pandas as pd
+import pytest
+
+from benchmarks.dados_sinteticos import COLUNAS, gerar_linha
+from benchmarks.servidor_local import ServidorLocal
+from services.downloader import download_csv_files
+
+TAMANHO_PAGINA = 100
+
+
+def _linhas(quantidade):
+    """Linhas de uma única UASG, para que a ordem do arquivo seja a das páginas."""
+    rng = random.Random(0)
+    linhas = []
+    for i in range(quantidade):
+        valores = gerar_linha(rng, i, 2025)
+        valores[:2] = ['Unidade 250052', '250052']
+        linhas.append(';'.join(valores) + '\n')
+    return linhas
+
+
+def _criar_handler(linhas, informar_total=True, fim='vazio', latencia=0.0, pedidos=None):
+    """
+    Serve `linhas` em páginas, com um ETag por página (e 304 ao
+    If-None-Match). Além da última página, responde conforme `fim`: 'vazio'
+    (200 sem linhas), 204, 404 ou 400. `linhas` pode ser alterada entre
+    downloads.
+    """
+    class HandlerPaginado(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parametros = dict(parse_qsl(urlsplit(self.path).query))
+            pagina = int(parametros.get('pagina', 1))
+            tamanho = int(parametros.get('tamanhoPagina', len(linhas)))
+            if pedidos is not None:
+                pedidos.append(pagina)
+            time.sleep(latencia)
+            trecho = linhas[(pagina - 1) * tamanho:pagina * tamanho]
+            if not trecho and pagina > 1 and fim != 'vazio':
+                self.send_response(int(fim))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            corpo = (';'.join(COLUNAS) + '\n' + ''.join(trecho)).encode('utf-8')
+            etag = '"' + hashlib.sha1(corpo).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Type', 'text/csv; charset=utf-8')
+            self.send_header('Content-Length', str(len(corpo)))
+            if informar_total:
+                self.send_header('X-Total-Count', str(len(linhas)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, format, *args):
+            pass
+
+    return HandlerPaginado
+
+
+def _baixar(tmp_path, handler, vezes=1, entre=None):
+    """
+    Baixa o ano `vezes` vezes do mesmo servidor, chamando `entre()` antes de
+    cada download a partir do segundo. Retorna o resumo e o CSV do último.
+    """
+    destino = str(tmp_path / 'data')
+    with ServidorLocal(None, handler=handler) as url_base:
+        url = f"{url_base}/itens?pagina=1&tamanhoPagina={TAMANHO_PAGINA}"
+        for vez in range(vezes):
+            if vez and entre is not None:
+                entre()
+            resumo = download_csv_files({'2025': url}, destino=destino, uasgs=[])['2025']
+    caminho = os.path.join(destino, 'pca_2025.csv')
+    return resumo, pd.read_csv(caminho, sep=';', dtype=str) if os.path.exists(caminho) else None
+
+
+@pytest.mark.parametrize('informar_total', [True, False])
+@pytest.mark.parametrize('quantidade', [1, 250, 1000, 1037])
+def test_todas_as_paginas_em_ordem(tmp_path, informar_total, quantidade):
+    linhas = _linhas(quantidade)
+    resumo, df = _baixar(tmp_path, _criar_handler(linhas, informar_total, latencia=0.01))
+    assert resumo['status'] == 'atualizado'
+    assert resumo['linhas'] == quantidade
+    assert df['Id do item no PCA'].astype(int).tolist() == list(range(quantidade))
+
+
+def test_total_informado_evita_paginas_extras(tmp_path):
+    pedidos = []
+    resumo, _ = _baixar(tmp_path, _criar_handler(_linhas(1000), True, pedidos=pedidos))
+    assert resumo['paginas'] == 10
+    assert sorted(pedidos) == list(range(1, 11))
+
+
+@pytest.mark.parametrize('fim', ['204', '404', '400'])
+@pytest.mark.parametrize('quantidade', [1000, 1037, 350])
+def test_sem_total_fim_por_status(tmp_path, fim, quantidade):
+    """Páginas sondadas além do fim podem vir vazias, com 204 ou com 404/400."""
+    resumo, df = _baixar(tmp_path, _criar_handler(_linhas(quantidade), False, fim=fim))
+    assert resumo['status'] == 'atualizado'
+    assert df['Id do item no PCA'].astype(int).tolist() == list(range(quantidade))
+
+
+def test_pagina_conhecida_com_erro_falha(tmp_path):
+    """Com o total informado, uma página que deveria existir e falha invalida o ano."""
+    linhas = _linhas(1000)
+
+    class HandlerComFalha(_criar_handler(linhas, True)):
+        def do_GET(self):
+            if 'pagina=3' in self.path:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            super().do_GET()
+
+    resumo, df = _baixar(tmp_path, HandlerComFalha)
+    assert resumo['status'] == 'erro'
+    assert df is None
+
+
+@pytest.mark.parametrize('informar_total', [True, False])
+def test_segundo_download_sem_alteracoes(tmp_path, informar_total):
+    pedidos = []
+    resumo, df = _baixar(tmp_path, _criar_handler(_linhas(250), informar_total, pedidos=pedidos), vezes=2)
+    assert resumo['status'] == 'inalterado'
+    assert resumo['bytes'] == 0
+    assert len(df) == 250
+
+
+@pytest.mark.parametrize('informar_total', [True, False])
+@pytest.mark.parametrize('antes, depois', [(150, 180), (200, 230), (250, 240)])
+def test_alteracao_so_em_pagina_posterior(tmp_path, informar_total, antes, depois):
+    """A primeira página não muda (304), mas linhas entram ou saem de páginas seguintes."""
+    todas = _linhas(max(antes, depois))
+    linhas = todas[:antes]
+
+    def alterar():
+        linhas[:] = todas[:depois]
+
+    resumo, df = _baixar(tmp_path, _criar_handler(linhas, informar_total), vezes=2, entre=alterar)
+    assert resumo['status'] == 'atualizado'
+    assert resumo['linhas'] == depois
+    assert df['Id do item no PCA'].astype(int).tolist() == list(range(depois))
+
+
+def test_pagina_intermediaria_modificada(tmp_path):
+    linhas = _linhas(350)
+
+    def modificar():
+        valores = linhas[250].split(';')
+        valores[10] = '999'
+        linhas[250] = ';'.join(valores)
+
+    resumo, df = _baixar(tmp_path, _criar_handler(linhas, False), vezes=2, entre=modificar)
+    assert resumo['status'] == 'atualizado'
+    assert df.loc[250, 'Quantidade Estimada'] == '999'
@@ -0,0 +1,83 @@
+# tests/test_search_index.py
+
+"""
+Índice de trigramas (services.search_index.IndiceBusca), comparado à busca
+direta `contem_normalizado` sobre a coluna normalizada.
+"""
+
+import numpy as np
+import pytest
+
+from services import search_index
+from services.search_index import IndiceBusca, contem_normalizado, normalizar, normalizar_serie
+
+COLUNAS = ['Descrição do Item', 'Identificador da Futura Contratação', 'Valor Total Estimado (R$)']
+
+CONSULTAS = [
+    'a', 'ag', 'AG',                                   # menores que um trigrama
+    'agua', 'água', 'ÁGUA MINERAL', 'esteril', 'Estéril azul', 'ação',  # com e sem acentos
+    'sódio grande', 'garrafa pacote',
+    'qw€', 'água€',                                    # caracteres que não aparecem em nenhuma linha
+    '250052-', '/2025', '00012', ',5',
+    'texto que não existe', '',
+]
+
+
+@pytest.fixture(scope='module', params=COLUNAS)
+def coluna(request, ano_sintetico):
+    serie = ano_sintetico[request.param]
+    return serie, IndiceBusca(serie)
+
+
+def _esperado(serie, consulta, base=None):
+    encontrados = np.flatnonzero(contem_normalizado(normalizar_serie(serie).reset_index(drop=True),
+                                                   normalizar(consulta)))
+    if not normalizar(consulta):
+        encontrados = np.arange(len(serie))
+    return encontrados if base is None else encontrados[np.isin(encontrados, base)]
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS)
+def test_busca_no_ano_inteiro(coluna, consulta):
+    serie, indice = coluna
+    np.testing.assert_array_equal(indice.buscar(consulta), _esperado(serie, consulta))
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS)
+@pytest.mark.parametrize('fracao', [0.5, 0.05, 0.005])
+def test_busca_em_base_restrita(coluna, consulta, fracao):
+    """Bases acima e abaixo de FRACAO_VERIFICACAO_DIRETA do ano."""
+    serie, indice = coluna
+    rng = np.random.default_rng(3)
+    base = np.sort(rng.choice(len(serie), int(len(serie) * fracao), replace=False))
+    np.testing.assert_array_equal(indice.buscar(consulta, base), _esperado(serie, consulta, base))
+
+
+def test_base_vazia(coluna):
+    _, indice = coluna
+    assert len(indice.buscar('agua', np.empty(0, dtype=np.int64))) == 0
+
+
+@pytest.mark.parametrize('consulta', ['agua', 'água mineral', '250052-0001', 'qw€'])
+def test_candidatos_contem_o_resultado(coluna, consulta):
+    serie, indice = coluna
+    candidatos = indice.candidatos(normalizar(consulta))
+    assert np.all(np.diff(candidatos) > 0)
+    assert set(_esperado(serie, consulta)) <= set(candidatos.tolist())
+
+
+def test_caractere_fora_do_alfabeto_sem_candidatos(coluna):
+    _, indice = coluna
+    assert len(indice.candidatos(normalizar('água€'))) == 0
+
+
+def test_base_pequena_verificada_diretamente(coluna, monkeypatch):
+    """Abaixo de FRACAO_VERIFICACAO_DIRETA, a base é conferida sem consultar o índice."""
+    serie, indice = coluna
+    base = np.arange(0, int(search_index.FRACAO_VERIFICACAO_DIRETA * len(serie)) - 1)
+
+    def sem_indice(self, consulta):
+        raise AssertionError("o índice não deveria ser consultado")
+
+    monkeypatch.setattr(IndiceBusca, 'candidatos', sem_indice)
+    np.testing.assert_array_equal(indice.buscar('agua', base), _esperado(serie, 'agua', base))
@@ -0,0 +1,80 @@
+# ui/filters.py
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QTimer, Signal
+
+from services.filtros import MotorFiltro
+from services.instrumentacao import medir
+
+# Espera padrão, em milissegundos, entre a última tecla e a filtragem
+ATRASO_FILTRO_MS = 250
+
+# Pool exclusivo dos filtros, para que não disputem espaço com downloads
+_pool_filtros = QThreadPool()
+_pool_filtros.setMaxThreadCount(2)
+
+
+class _SinaisFiltro(QObject):
+    concluido = Signal(int, object, object)  # geração, resultado, totais
+
+
+class _TarefaFiltro(QRunnable):
+    def __init__(self, dono, geracao, motor, criterios):
+        super().__init__()
+        self.dono = dono
+        self.geracao = geracao
+        self.motor = motor
+        self.criterios = criterios
+        self.sinais = _SinaisFiltro()
+
+    def run(self):
+        # Se outra consulta já foi pedida enquanto esta esperava na fila, nem começa
+        if self.dono.geracao != self.geracao:
+            return
+        with medir('aplicar_filtros') as detalhes:
+            indices = self.motor.aplicar(self.criterios)
+            totais = self.motor.totais(self.criterios, indices)
+            detalhes['linhas'] = len(indices)
+        self.sinais.concluido.emit(self.geracao, indices, totais)
+
+
+class FiltroAdiado(QObject):
+    """
+    Filtragem de uma aba com espera (debounce) e execução fora da thread da
+    interface. Cada chamada a `agendar()` reinicia a espera, de modo que uma
+    sequência de teclas gera uma única filtragem. Só o resultado da consulta
+    mais recente é entregue em `resultado_pronto` (array com as posições das
+    linhas em `df` e o dicionário de totais do MotorFiltro); os demais são
+    descartados. Um `motor` já pronto (ex.: o MotorFiltroSQL do banco local)
+    pode ser passado no lugar de `df`.
+    """
+    resultado_pronto = Signal(object, object)
+
+    def __init__(self, df, ler_criterios, atraso_ms=ATRASO_FILTRO_MS, indices_busca=None, motor=None,
+                 parent=None):
+        super().__init__(parent)
+        self.motor = motor or MotorFiltro(df, indices_busca)
+        self.ler_criterios = ler_criterios
+        self.geracao = 0
+        self._tarefas = {}
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(atraso_ms)
+        self._timer.timeout.connect(self.executar_agora)
+
+    def agendar(self, *_args):
+        self._timer.start()
+
+    def executar_agora(self):
+        self._timer.stop()
+        self.geracao += 1
+        tarefa = _TarefaFiltro(self, self.geracao, self.motor, self.ler_criterios())
+        tarefa.setAutoDelete(False)
+        tarefa.sinais.concluido.connect(self._ao_concluir)
+        self._tarefas[self.geracao] = tarefa
+        _pool_filtros.start(tarefa)
+
+    def _ao_concluir(self, geracao, resultado, totais):
+        for antiga in [g for g in self._tarefas if g <= geracao]:
+            del self._tarefas[antiga]
+        if geracao == self.geracao:
+            self.resultado_pronto.emit(resultado, totais)
@@ -2,48 +2,77 @@
 
 import sys
 import os
-import math
+import shutil
 from datetime import datetime
 import pyperclip
+import numpy as np
 import pandas as pd
 
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QTabWidget, QGroupBox,
-    QGridLayout, QLabel, QLineEdit, QPushButton, QTableWidget, QTableWidgetItem,
+    QGridLayout, QLabel, QLineEdit, QPushButton, QTableView, QAbstractItemView,
     QHeaderView, QMenuBar, QMessageBox, QMenu, QDateEdit, QHBoxLayout,
-    QInputDialog
+    QInputDialog, QComboBox
 )
 from PySide6.QtGui import QAction, QCursor
-from PySide6.QtCore import Qt, QDate
+from PySide6.QtCore import Qt, QDate, QThreadPool, Signal
 
-from services.parser import load_all_years
-from services.preferencias import carregar_preferencias, salvar_preferencias
-from services.downloader import download_csv_files
+from services.alteracoes import remover_historico
+from services.banco import BancoPCA, MotorFiltroSQL, caminho_banco
+from services.filtros import MODOS_DATA, periodo_por_modo, unidades
+from services.consolidado import TODOS_OS_ANOS, COLUNA_ANO
+from services.parser import (
+    RegistroAnos, MAX_ANOS_EM_MEMORIA, MEMORIA_COMPACTA, COLUNAS_EXIBIDAS, caminho_csv, arquivos_do_ano,
+    pasta_particoes
+)
+from services.instrumentacao import medir
+from services.preferencias import (
+    carregar_preferencias, salvar_preferencias,
+    verificacao_semanal_pendente, registrar_verificacao_semanal
+)
+from ui.workers import TarefaDados
+from ui.filters import FiltroAdiado, ATRASO_FILTRO_MS
+from ui.table_model import ModeloTabelaPCA, ModeloTabelaSQL
+from ui.ui_components import MultiSelectDialog, DiagnosticoDialog, AlteracoesDialog
 
 class MainWindow(QMainWindow):
+    # Emitido pelo registro (de qualquer thread) quando um ano sai da memória
+    ano_descartado = Signal(str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Consulta PCA - v7.7 (Final)")
         self.setGeometry(100, 100, 1200, 800)
 
-        self.df_por_ano = {}
+        self.registro = None
+        self.banco = None # Banco SQLite local, com a preferência 'banco_sqlite'
         self.abas_info = {}
+        self.abas_container = {}
+        self.filtros_salvos = {} # Filtros das abas descarregadas, restaurados ao reabri-las
         self.clicked_info = {} # Armazena informações do clique do mouse
+        self.tarefas = set() # Tarefas em segundo plano em execução
+        self.anos_carregando = set()
+        self.tarefa_download = None
+        self.progresso_download = {}
+        self.ano_descartado.connect(self._descarregar_aba)
         
         self.notebook = QTabWidget()
+        self.notebook.currentChanged.connect(self._ao_trocar_aba)
         self.setCentralWidget(self.notebook)
         
         self._criar_menu()
+        self._criar_barra_status()
         
         self.carregar_dados_iniciais()
+        self.verificar_atualizacao_semanal()
 
     def _criar_menu(self):
         menu_bar = self.menuBar()
         dados_menu = menu_bar.addMenu("&Dados")
         
-        acao_atualizar = QAction("Atualizar Todos os Dados", self)
-        acao_atualizar.triggered.connect(self.atualizar_dados_manual)
-        dados_menu.addAction(acao_atualizar)
+        self.acao_atualizar = QAction("Atualizar Todos os Dados", self)
+        self.acao_atualizar.triggered.connect(self.atualizar_dados_manual)
+        dados_menu.addAction(self.acao_atualizar)
         
         dados_menu.addSeparator()
 
@@ -55,6 +84,24 @@ class MainWindow(QMainWindow):
         acao_excluir.triggered.connect(self.excluir_ano)
         dados_menu.addAction(acao_excluir)
 
+        dados_menu.addSeparator()
+
+        acao_alteracoes = QAction("Alterações desde a Última Atualização...", self)
+        acao_alteracoes.triggered.connect(self.mostrar_alteracoes)
+        dados_menu.addAction(acao_alteracoes)
+
+        acao_diagnostico = QAction("Diagnóstico...", self)
+        acao_diagnostico.triggered.connect(self.mostrar_diagnostico)
+        dados_menu.addAction(acao_diagnostico)
+
+    def _criar_barra_status(self):
+        self.lbl_status = QLabel()
+        self.btn_cancelar = QPushButton("Cancelar")
+        self.btn_cancelar.clicked.connect(self.cancelar_tarefas)
+        self.btn_cancelar.setVisible(False)
+        self.statusBar().addWidget(self.lbl_status, 1)
+        self.statusBar().addPermanentWidget(self.btn_cancelar)
+
     def with_loading_cursor(func):
         def wrapper(self, *args, **kwargs):
             QApplication.setOverrideCursor(Qt.WaitCursor)
@@ -67,19 +114,146 @@ class MainWindow(QMainWindow):
     @with_loading_cursor
     def carregar_dados_iniciais(self):
         try:
-            self.df_por_ano = load_all_years()
+            prefs = carregar_preferencias()
+            self.registro = RegistroAnos(max_carregados=prefs.get("max_anos_em_memoria", MAX_ANOS_EM_MEMORIA),
+                                         compacto=prefs.get("memoria_compacta", MEMORIA_COMPACTA))
+            self.registro.ao_descartar.append(self.ano_descartado.emit)
+            self.anos_carregando.clear()
+            if prefs.get("banco_sqlite", False) and self.banco is None:
+                self.banco = BancoPCA(caminho_banco())
             self.recriar_abas()
+            if self.banco is not None:
+                self._sincronizar_banco(prefs.get("memoria_compacta", MEMORIA_COMPACTA))
         except Exception as e:
             QMessageBox.critical(self, "Erro Inesperado", f"Ocorreu um erro ao carregar os dados: {e}")
 
-    @with_loading_cursor
+    # --- Tarefas em segundo plano ---
+
+    def _iniciar_tarefa(self, tarefa):
+        self.tarefas.add(tarefa)
+        tarefa.sinais.finalizado.connect(lambda cancelada, t=tarefa: self._ao_finalizar_tarefa(t, cancelada))
+        self.btn_cancelar.setVisible(True)
+        QThreadPool.globalInstance().start(tarefa)
+
+    def _ao_finalizar_tarefa(self, tarefa, cancelada):
+        self.tarefas.discard(tarefa)
+        if not self.tarefas:
+            self.btn_cancelar.setVisible(False)
+            self.lbl_status.setText("Operação cancelada." if cancelada else "")
+
+    def cancelar_tarefas(self):
+        for tarefa in list(self.tarefas):
+            tarefa.cancelar()
+
+    def closeEvent(self, event):
+        self.cancelar_tarefas()
+        QThreadPool.globalInstance().waitForDone(5000)
+        super().closeEvent(event)
+
+    def _carregar_anos_em_segundo_plano(self, anos):
+        anos = [ano for ano in anos if ano not in self.anos_carregando and ano not in self.abas_info]
+        if not anos:
+            return
+        self.anos_carregando.update(anos)
+        registro = self.registro
+        tarefa = TarefaDados(registro, anos)
+        tarefa.sinais.ano_carregado.connect(lambda ano, df: self._ao_carregar_ano(registro, ano, df))
+        tarefa.sinais.erro.connect(self._ao_falhar_carregamento)
+        tarefa.sinais.finalizado.connect(lambda _cancelada: self.anos_carregando.difference_update(anos))
+        self.lbl_status.setText(f"Carregando {', '.join(anos)}...")
+        self._iniciar_tarefa(tarefa)
+
+    def _sincronizar_banco(self, compacto):
+        """Copia para o banco local, em segundo plano, os anos cujo CSV mudou."""
+        tarefa = TarefaDados(banco=self.banco, compacto=compacto)
+        tarefa.sinais.banco_sincronizado.connect(self._ao_sincronizar_banco)
+        tarefa.sinais.erro.connect(lambda _ano, mensagem: QMessageBox.critical(
+            self, "Erro no Banco Local", f"Não foi possível atualizar o banco local: {mensagem}"))
+        self.lbl_status.setText("Atualizando o banco local...")
+        self._iniciar_tarefa(tarefa)
+
+    def _ao_sincronizar_banco(self, copiados):
+        if copiados:
+            self.recriar_abas()
+
+    def _ao_carregar_ano(self, registro, ano, df):
+        self.anos_carregando.discard(ano)
+        # Ignora resultados de um registro antigo (dados recarregados no meio do caminho)
+        if registro is not self.registro or ano not in self.abas_container or ano in self.abas_info:
+            return
+        if df.empty:
+            self._definir_conteudo_aba(ano, QLabel(f"Nenhum dado encontrado para {ano}."))
+            return
+        self.criar_aba(ano, df)
+
+    def _ao_falhar_carregamento(self, ano, mensagem):
+        self.anos_carregando.discard(ano)
+        QMessageBox.critical(self, "Erro Inesperado", f"Ocorreu um erro ao carregar os dados de {ano}: {mensagem}")
+
+    def _baixar_em_segundo_plano(self, manual):
+        if self.tarefa_download is not None:
+            return
+        tarefa = TarefaDados(baixar=True)
+        self.tarefa_download = tarefa
+        self.progresso_download = {}
+        self.acao_atualizar.setEnabled(False)
+        tarefa.sinais.progresso.connect(self._ao_progresso_download)
+        tarefa.sinais.download_concluido.connect(lambda resultados: self._ao_concluir_download(resultados, manual))
+        tarefa.sinais.erro.connect(lambda _ano, mensagem: self._ao_falhar_download(mensagem, manual))
+        tarefa.sinais.finalizado.connect(self._ao_finalizar_download)
+        self.lbl_status.setText("Verificando atualizações dos dados...")
+        self._iniciar_tarefa(tarefa)
+
+    def _ao_progresso_download(self, ano, bytes_baixados, bytes_totais):
+        self.progresso_download[ano] = (bytes_baixados, bytes_totais)
+        partes = []
+        for ano_p, (baixados, totais) in sorted(self.progresso_download.items()):
+            texto = f"{ano_p}: {baixados / 1048576:.1f} MB"
+            if totais:
+                texto += f" de {totais / 1048576:.1f} MB"
+            partes.append(texto)
+        self.lbl_status.setText("Baixando " + " | ".join(partes))
+
+    def _ao_concluir_download(self, resultados, manual):
+        atualizados = [ano for ano, r in resultados.items() if r['status'] == 'atualizado']
+        inalterados = [ano for ano, r in resultados.items() if r['status'] == 'inalterado']
+        erros = [ano for ano, r in resultados.items() if r['status'] == 'erro']
+        if manual or not erros:
+            registrar_verificacao_semanal(carregar_preferencias())
+        if atualizados:
+            self.carregar_dados_iniciais()
+        if manual:
+            resumo = (f"Atualizados: {', '.join(sorted(atualizados)) or 'nenhum'}\n"
+                      f"Sem alterações: {', '.join(sorted(inalterados)) or 'nenhum'}")
+            if erros:
+                resumo += f"\nCom erro: {', '.join(sorted(erros))}"
+            for ano in sorted(atualizados):
+                alteracoes = resultados[ano].get('alteracoes')
+                if alteracoes:
+                    resumo += (f"\n{ano}: {alteracoes['adicionados']} novo(s), {alteracoes['removidos']} "
+                               f"removido(s), {alteracoes['modificados']} modificado(s)")
+            if any(resultados[ano].get('alteracoes') for ano in atualizados):
+                resumo += "\n\nVeja os itens em Dados -> Alterações desde a Última Atualização."
+            QMessageBox.information(self, "Atualização Concluída", resumo)
+
+    def _ao_falhar_download(self, mensagem, manual):
+        if manual:
+            QMessageBox.critical(self, "Erro na Atualização", f"Não foi possível atualizar os dados: {mensagem}")
+        else:
+            print(f"Aviso: verificação semanal falhou: {mensagem}")
+
+    def _ao_finalizar_download(self, _cancelada):
+        self.tarefa_download = None
+        self.acao_atualizar.setEnabled(True)
+
+    def verificar_atualizacao_semanal(self):
+        """Faz a verificação automática de novos dados uma vez por semana, em segundo plano."""
+        if verificacao_semanal_pendente(carregar_preferencias()):
+            self._baixar_em_segundo_plano(manual=False)
+
     def atualizar_dados_manual(self):
         if QMessageBox.question(self, "Confirmar Atualização", r"Isso fará o download e otimização dos dados.\Deseja continuar?") == QMessageBox.Yes:
-            try:
-                download_csv_files()
-                self.carregar_dados_iniciais()
-            except Exception as e:
-                QMessageBox.critical(self, "Erro na Atualização", f"Não foi possível atualizar os dados: {e}")
+            self._baixar_em_segundo_plano(manual=True)
 
     def adicionar_ano(self):
         ano, ok1 = QInputDialog.getText(self, "Adicionar Ano", "Digite o ano (ex: 2027):")
@@ -109,35 +283,125 @@ class MainWindow(QMainWindow):
                 if ano_para_excluir in prefs.get('filters', {}):
                     del prefs['filters'][ano_para_excluir]
                 salvar_preferencias(prefs)
-                caminho_arquivo = os.path.join("data", f"pca_{ano_para_excluir}.csv")
+                caminho_arquivo = caminho_csv(ano_para_excluir)
                 try:
-                    if os.path.exists(caminho_arquivo): os.remove(caminho_arquivo)
+                    for caminho in arquivos_do_ano(ano_para_excluir):
+                        if os.path.exists(caminho): os.remove(caminho)
+                    shutil.rmtree(pasta_particoes(ano_para_excluir), ignore_errors=True)
+                    remover_historico(ano_para_excluir)
                 except OSError as e:
                     QMessageBox.critical(self, "Erro de Arquivo", f"Não foi possível excluir o arquivo {caminho_arquivo}: {e}")
+                # O ano sai do banco local na sincronização em segundo plano de carregar_dados_iniciais
                 QMessageBox.information(self, "Sucesso", f"Ano {ano_para_excluir} excluído com sucesso.")
                 self.carregar_dados_iniciais()
 
+    def mostrar_alteracoes(self):
+        anos = list(carregar_preferencias().get('data_sources', {}).keys())
+        if not anos:
+            QMessageBox.information(self, "Alterações", "Nenhum ano configurado.")
+            return
+        # Começa pelo ano da aba aberta
+        ano = self.notebook.tabText(self.notebook.currentIndex()) if self.notebook.count() else None
+        AlteracoesDialog(anos, ano, self).exec()
+
+    def mostrar_diagnostico(self):
+        DiagnosticoDialog(self).exec()
+
     def recriar_abas(self):
+        """Cria uma aba vazia por ano; os dados só são carregados quando a aba é aberta."""
+        for ano, info_aba in self.abas_info.items():
+            self._salvar_filtros(ano, info_aba)
+        self.notebook.blockSignals(True)
         self.notebook.clear()
         self.abas_info.clear()
-        for ano, df in self.df_por_ano.items():
-            if not df.empty:
-                self.criar_aba(ano, df)
+        self.abas_container.clear()
+        anos = self.registro.anos_disponiveis()
+        if self.registro.disponivel(TODOS_OS_ANOS):
+            anos.append(TODOS_OS_ANOS)
+        for ano in anos:
+            container = QWidget()
+            QVBoxLayout(container).setContentsMargins(0, 0, 0, 0)
+            self.notebook.addTab(container, str(ano))
+            self.abas_container[ano] = container
+            self._definir_conteudo_aba(ano, self._criar_placeholder(ano))
+        self.notebook.blockSignals(False)
+        self._ao_trocar_aba(self.notebook.currentIndex())
+
+    def _criar_placeholder(self, ano, texto=None):
+        if texto is None:
+            texto = ("Os dados de todos os anos serão consolidados ao abrir esta aba." if ano == TODOS_OS_ANOS
+                     else f"Os dados de {ano} serão carregados ao abrir esta aba.")
+        placeholder = QLabel(texto)
+        placeholder.setAlignment(Qt.AlignCenter)
+        return placeholder
+
+    def _definir_conteudo_aba(self, ano, widget):
+        layout = self.abas_container[ano].layout()
+        while layout.count():
+            antigo = layout.takeAt(0).widget()
+            if antigo is not None:
+                antigo.deleteLater()
+        layout.addWidget(widget)
+
+    def _ao_trocar_aba(self, index):
+        if index < 0 or self.registro is None:
+            return
+        ano = self.notebook.tabText(index)
+        if self.banco is not None:
+            # No banco local não há nada para carregar: a aba consulta o SQLite
+            if ano not in self.abas_info:
+                if self.banco.tem_ano(ano):
+                    self.criar_aba(ano, None)
+                else:
+                    self._definir_conteudo_aba(ano, self._criar_placeholder(
+                        ano, f"Copiando os dados de {ano} para o banco local..."))
+            return
+        if ano in self.abas_info:
+            # Mantém o ano como o mais recente no LRU do registro
+            if self.registro.carregado(ano):
+                self.registro.obter(ano)
+            return
+        if ano not in self.anos_carregando:
+            self._definir_conteudo_aba(ano, self._criar_placeholder(ano, f"Carregando os dados de {ano}..."))
+        self._carregar_anos_em_segundo_plano([ano])
+
+    def _salvar_filtros(self, ano, info_aba):
+        self.filtros_salvos[ano] = {
+            'entradas': {campo: w.text() for campo, w in info_aba['entradas'].items() if not w.isReadOnly()},
+            'data': info_aba['data_desejada_entry'].date(),
+            'data_final': info_aba['data_final_entry'].date(),
+            'modo_data': info_aba['modo_data_combo'].currentText(),
+            'uasgs': list(info_aba['uasgs']),
+        }
+
+    def _descarregar_aba(self, ano):
+        """Chamado quando o registro descarta os dados de um ano da memória."""
+        info_aba = self.abas_info.pop(ano, None)
+        if info_aba is None or ano not in self.abas_container:
+            return
+        self._salvar_filtros(ano, info_aba)
+        self._definir_conteudo_aba(ano, self._criar_placeholder(ano))
 
     def criar_aba(self, ano, df_original):
         aba = QWidget()
         layout_principal = QVBoxLayout(aba)
-        self.notebook.addTab(aba, str(ano))
+        self._definir_conteudo_aba(ano, aba)
         
-        if 'Data Desejada' in df_original.columns:
-            df_original['data_datetime'] = pd.to_datetime(
-                df_original['Data Desejada'], errors='coerce', dayfirst=True
-            )
+        motor_sql = MotorFiltroSQL(self.banco, ano) if df_original is None else None
+        if motor_sql is not None:
+            colunas_ano = self.banco.colunas(ano)
+        else:
+            colunas_ano = list(df_original.columns)
+            if 'Data Desejada' in df_original.columns and 'data_datetime' not in df_original.columns:
+                df_original['data_datetime'] = pd.to_datetime(
+                    df_original['Data Desejada'], errors='coerce', dayfirst=True
+                )
         
         info_aba = {
-            'df_original': df_original, 'df_resultado': df_original.copy(), 'entradas': {},
-            'data_desejada_entry': None, 'PAGE_SIZE': 50, 'current_page': 1,
-            'sort_column': None, 'sort_order': Qt.AscendingOrder
+            'df_original': df_original, 'indices': np.arange(0 if df_original is None else len(df_original)),
+            'entradas': {},
+            'uasgs': [], 'totais': {'registros': 0, 'valor_total': 0.0}, 'data_desejada_entry': None,
+            'data_final_entry': None, 'modo_data_combo': None
         }
         self.abas_info[ano] = info_aba
 
@@ -145,10 +409,16 @@ class MainWindow(QMainWindow):
         filtro_layout = QGridLayout(filtro_groupbox)
         layout_principal.addWidget(filtro_groupbox)
         
-        colunas_disponiveis = ["UASG", "Identificador da Futura Contratação", "Descrição do Item", "Valor Total Estimado (R$)"]
-        campos_filtro = [col for col in colunas_disponiveis if col in df_original.columns]
+        colunas_disponiveis = ["Identificador da Futura Contratação", "Descrição do Item", "Valor Total Estimado (R$)"]
+        campos_filtro = [col for col in colunas_disponiveis if col in colunas_ano]
         
         row, col = 0, 0
+        # As unidades são escolhidas em uma lista (MultiSelectDialog), e não digitadas
+        btn_unidades = QPushButton("Todas as unidades")
+        if 'UASG' in colunas_ano:
+            filtro_layout.addWidget(QLabel("UASG:"), row, 0)
+            filtro_layout.addWidget(btn_unidades, row, 1)
+            col = 1
         for campo in campos_filtro:
             filtro_layout.addWidget(QLabel(f"{campo.replace(' (R$)', '')}:"), row, col * 2)
             entry = QLineEdit()
@@ -159,156 +429,180 @@ class MainWindow(QMainWindow):
             if col > 1: col = 0; row += 1
         
         filtro_layout.addWidget(QLabel("Data Desejada:"), row, 0)
-        data_entry = QDateEdit()
-        data_entry.setCalendarPopup(True)
-        data_entry.setDisplayFormat("dd/MM/yyyy")
-        data_entry.setSpecialValueText(" ")
-        data_entry.setDate(data_entry.minimumDate())
-        filtro_layout.addWidget(data_entry, row, 1)
+        data_layout = QHBoxLayout()
+        data_layout.setContentsMargins(0, 0, 0, 0)
+        modo_data_combo = QComboBox()
+        modo_data_combo.addItems(MODOS_DATA)
+        data_layout.addWidget(modo_data_combo)
+        # No modo "Intervalo", data_entry é o início e data_final_entry o fim;
+        # uma data em branco deixa aquele lado do intervalo aberto
+        datas_entries = []
+        for _ in range(2):
+            entry_data = QDateEdit()
+            entry_data.setCalendarPopup(True)
+            entry_data.setDisplayFormat("dd/MM/yyyy")
+            entry_data.setSpecialValueText(" ")
+            entry_data.setDate(entry_data.minimumDate())
+            datas_entries.append(entry_data)
+        data_entry, data_final_entry = datas_entries
+        lbl_ate = QLabel("até")
+        data_layout.addWidget(data_entry)
+        data_layout.addWidget(lbl_ate)
+        data_layout.addWidget(data_final_entry)
+        data_layout.addStretch()
+        filtro_layout.addLayout(data_layout, row, 1, 1, 3)
         info_aba['data_desejada_entry'] = data_entry
+        info_aba['data_final_entry'] = data_final_entry
+        info_aba['modo_data_combo'] = modo_data_combo
+
+        def ajustar_modo_data(modo):
+            lbl_ate.setVisible(modo == 'Intervalo')
+            data_final_entry.setVisible(modo == 'Intervalo')
+        ajustar_modo_data(modo_data_combo.currentText())
+        modo_data_combo.currentTextChanged.connect(ajustar_modo_data)
 
         btn_limpar = QPushButton("Limpar Filtros 🗑️")
         filtro_layout.addWidget(btn_limpar, row + 1, 0, 1, 4)
         
-        colunas_desejadas = ['Unidade Responsável', 'UASG', 'Id do item no PCA', 'Categoria do Item','Identificador da Futura Contratação', 'Classificação do Catálogo','Código da Classificação Superior (Classe/Grupo)', 'Nome do PDM do Item','Código do Item', 'Descrição do Item', 'Quantidade Estimada','Valor Total Estimado (R$)', 'Data Desejada']
-        colunas_tabela = [c for c in colunas_desejadas if c in df_original.columns]
+        colunas_tabela = [c for c in [COLUNA_ANO] + COLUNAS_EXIBIDAS if c in colunas_ano]
         
-        tabela = QTableWidget()
-        tabela.setColumnCount(len(colunas_tabela))
-        tabela.setHorizontalHeaderLabels(colunas_tabela)
-        tabela.setEditTriggers(QTableWidget.NoEditTriggers)
-        tabela.setSelectionBehavior(QTableWidget.SelectRows)
+        # Todas as linhas filtradas ficam acessíveis pela rolagem; o modelo só
+        # fornece o texto das células visíveis
+        if motor_sql is not None:
+            modelo = ModeloTabelaSQL(motor_sql, colunas_tabela, parent=aba)
+        else:
+            modelo = ModeloTabelaPCA(df_original, colunas_tabela, self.registro.ordenacao(ano), parent=aba)
+        info_aba['modelo'] = modelo
+        tabela = QTableView()
+        tabela.setModel(modelo)
+        tabela.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        tabela.setSelectionBehavior(QAbstractItemView.SelectRows)
         tabela.verticalHeader().setVisible(False)
+        tabela.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         tabela.setAlternatingRowColors(True)
         tabela.horizontalHeader().setStretchLastSection(True)
-        tabela.horizontalHeader().sectionClicked.connect(lambda logical_index, a=ano: classificar_coluna(logical_index, a))
+        tabela.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        tabela.setSortingEnabled(True)
         layout_principal.addWidget(tabela)
 
         rodape_layout = QHBoxLayout()
         layout_principal.addLayout(rodape_layout)
         lbl_registros_e_valor = QLabel("Registros: 0 | Valor Total: R$ 0,00")
-        btn_anterior = QPushButton("<< Anterior")
-        btn_proxima = QPushButton("Próxima >>")
-        lbl_pagina = QLabel("Página 1 de 1")
-        
         rodape_layout.addWidget(lbl_registros_e_valor)
         rodape_layout.addStretch()
-        rodape_layout.addWidget(btn_anterior)
-        rodape_layout.addWidget(lbl_pagina)
-        rodape_layout.addWidget(btn_proxima)
-        
+
         def atualizar_tabela():
-            QApplication.setOverrideCursor(Qt.WaitCursor)
-            tabela.setSortingEnabled(False)
-            tabela.setRowCount(0)
-            df_paginado = info_aba['df_resultado']
-            total_items = len(df_paginado)
-            total_pages = math.ceil(total_items / info_aba['PAGE_SIZE']) if total_items > 0 else 1
-            if info_aba['current_page'] > total_pages: info_aba['current_page'] = total_pages
-            start_index = (info_aba['current_page'] - 1) * info_aba['PAGE_SIZE']
-            end_index = start_index + info_aba['PAGE_SIZE']
-            df_pagina = df_paginado.iloc[start_index:end_index]
-            tabela.setRowCount(len(df_pagina))
-            for i, (_, row) in enumerate(df_pagina[colunas_tabela].iterrows()):
-                for j, value in enumerate(row):
-                    tabela.setItem(i, j, QTableWidgetItem(str(value)))
-            soma_valores = pd.to_numeric(df_paginado['Valor Total Estimado (R$)'].str.replace(',', '.', regex=False), errors='coerce').sum()
-            lbl_registros_e_valor.setText(f"Registros: {total_items} | Valor Total: R$ {soma_valores:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
-            lbl_pagina.setText(f"Página {info_aba['current_page']} de {total_pages}")
-            btn_anterior.setEnabled(info_aba['current_page'] > 1)
-            btn_proxima.setEnabled(info_aba['current_page'] < total_pages)
-            tabela.setSortingEnabled(True)
-            QApplication.restoreOverrideCursor()
+            with medir('atualizar_tabela', ano=ano, linhas=len(info_aba['indices'])):
+                # Os totais vêm prontos do MotorFiltro, calculados uma vez por filtro
+                modelo.definir_indices(info_aba['indices'])
+                totais = info_aba['totais']
+                texto = f"Registros: {totais['registros']} | Valor Total: R$ {totais['valor_total']:,.2f}"
+                for ano_total, subtotal in totais.get('por_ano', {}).items():
+                    texto += f" | {ano_total}: {subtotal['registros']} (R$ {subtotal['valor_total']:,.2f})"
+                lbl_registros_e_valor.setText(texto.replace(",", "X").replace(".", ",").replace("X", "."))
         
-        def aplicar_filtros():
-            df_filtrado = info_aba['df_original'].copy()
-            for campo, widget in info_aba['entradas'].items():
-                valor = widget.text()
-                if valor:
-                    df_filtrado = df_filtrado[df_filtrado[campo].astype(str).str.contains(valor, case=False, na=False)]
-            data_selecionada = info_aba['data_desejada_entry'].date()
-            if data_selecionada != data_entry.minimumDate():
-                py_date = data_selecionada.toPython()
-                if 'data_datetime' in df_filtrado.columns:
-                    df_filtrado = df_filtrado.dropna(subset=['data_datetime'])
-                    df_filtrado = df_filtrado[df_filtrado['data_datetime'].dt.date == py_date]
-            info_aba['df_resultado'] = df_filtrado
-            info_aba['current_page'] = 1
+        def data_escolhida(entry_data):
+            data_selecionada = entry_data.date()
+            return data_selecionada.toPython() if data_selecionada != entry_data.minimumDate() else None
+
+        def ler_criterios():
+            return {
+                'textos': {campo: widget.text() for campo, widget in info_aba['entradas'].items() if widget.text()},
+                'valores': {'UASG': info_aba['uasgs']} if 'UASG' in colunas_ano else {},
+                'periodo': periodo_por_modo(modo_data_combo.currentText(),
+                                            data_escolhida(data_entry), data_escolhida(data_final_entry)),
+            }
+
+        def exibir_resultado(indices, totais):
+            info_aba['indices'] = indices
+            info_aba['totais'] = totais
             atualizar_tabela()
 
+        # A filtragem roda fora da thread da interface: edições em sequência são
+        # agrupadas (agendar_filtro) e só o resultado mais recente é exibido.
+        atraso_ms = carregar_preferencias().get('atraso_filtro_ms', ATRASO_FILTRO_MS)
+        if motor_sql is not None:
+            filtro = FiltroAdiado(None, ler_criterios, atraso_ms, motor=motor_sql, parent=aba)
+        else:
+            filtro = FiltroAdiado(info_aba['df_original'], ler_criterios, atraso_ms,
+                                  indices_busca=self.registro.indices_busca(ano), parent=aba)
+        filtro.resultado_pronto.connect(exibir_resultado)
+        aplicar_filtros = filtro.executar_agora
+        agendar_filtro = filtro.agendar
+        info_aba['filtro'] = filtro
+        info_aba['atualizar_tabela'] = atualizar_tabela
+        if motor_sql is not None:
+            # No banco, ordenar é refazer a consulta: vai para a mesma fila dos filtros
+            modelo.ordenacao_alterada.connect(aplicar_filtros)
+
+        # {UASG: Unidade Responsável} do ano, lido na primeira vez que a lista é aberta
+        nomes_unidades = {}
+
+        def definir_unidades(uasgs):
+            info_aba['uasgs'] = list(uasgs)
+            if not uasgs:
+                btn_unidades.setText("Todas as unidades")
+            else:
+                btn_unidades.setText(", ".join(uasgs) if len(uasgs) <= 3 else f"{len(uasgs)} unidades")
+
+        def escolher_unidades():
+            if not nomes_unidades:
+                nomes_unidades.update(self.banco.unidades(ano) if motor_sql is not None else unidades(df_original))
+            itens = {f"{uasg} - {nome}" if nome else uasg: uasg for uasg, nome in nomes_unidades.items()}
+            marcados = [texto for texto, uasg in itens.items() if uasg in info_aba['uasgs']]
+            selecao = MultiSelectDialog.get_selection(aba, list(itens), "Selecionar Unidades (UASG)", marcados)
+            if selecao is not None:
+                definir_unidades([itens[texto] for texto in selecao])
+                aplicar_filtros()
+
         def limpar_filtros():
+            definir_unidades([])
             for widget in info_aba['entradas'].values():
                 if widget.isReadOnly(): continue
-                widget.textChanged.disconnect(aplicar_filtros)
+                widget.textChanged.disconnect(agendar_filtro)
                 widget.clear()
-                widget.textChanged.connect(aplicar_filtros)
+                widget.textChanged.connect(agendar_filtro)
             
-            info_aba['data_desejada_entry'].dateChanged.disconnect(aplicar_filtros)
-            info_aba['data_desejada_entry'].setDate(info_aba['data_desejada_entry'].minimumDate())
-            info_aba['data_desejada_entry'].dateChanged.connect(aplicar_filtros)
+            limpar_datas()
             
             aplicar_filtros()
 
-        def pagina_anterior():
-            if info_aba['current_page'] > 1:
-                info_aba['current_page'] -= 1
-                atualizar_tabela()
-
-        def proxima_pagina():
-            total_items = len(info_aba['df_resultado'])
-            total_pages = math.ceil(total_items / info_aba['PAGE_SIZE'])
-            if info_aba['current_page'] < total_pages:
-                info_aba['current_page'] += 1
-                atualizar_tabela()
-
-        def classificar_coluna(logical_index, ano_aba):
-            info_aba_sort = self.abas_info[ano_aba]
-            col_name = colunas_tabela[logical_index]
-            if info_aba_sort['sort_column'] == col_name:
-                info_aba_sort['sort_order'] = Qt.DescendingOrder if info_aba_sort['sort_order'] == Qt.AscendingOrder else Qt.AscendingOrder
-            else:
-                info_aba_sort['sort_order'] = Qt.AscendingOrder
-            tabela.horizontalHeader().setSortIndicator(logical_index, info_aba_sort['sort_order'])
-            info_aba_sort['sort_column'] = col_name
-            ascending = (info_aba_sort['sort_order'] == Qt.AscendingOrder)
-            try:
-                col_numeric = pd.to_numeric(info_aba_sort['df_resultado'][col_name].str.replace(',', '.', regex=False), errors='coerce')
-                if not col_numeric.isna().all():
-                    info_aba_sort['df_resultado'] = info_aba_sort['df_resultado'].iloc[col_numeric.sort_values(ascending=ascending).index]
-                else: raise ValueError()
-            except (AttributeError, ValueError):
-                info_aba_sort['df_resultado'] = info_aba_sort['df_resultado'].sort_values(by=col_name, ascending=ascending, na_position='last')
-            info_aba_sort['current_page'] = 1
-            atualizar_tabela()
+        def limpar_datas():
+            for entry_data in datas_entries:
+                entry_data.dateChanged.disconnect(agendar_filtro)
+                entry_data.setDate(entry_data.minimumDate())
+                entry_data.dateChanged.connect(agendar_filtro)
 
-        def copiar_id_contratacao(item_clicado):
+        def copiar_id_contratacao(index_clicado):
             if 'Identificador da Futura Contratação' in colunas_tabela:
                 coluna_id_index = colunas_tabela.index('Identificador da Futura Contratação')
-                item_id = tabela.item(item_clicado.row(), coluna_id_index)
+                item_id = modelo.texto(index_clicado.row(), coluna_id_index)
                 if item_id:
-                    pyperclip.copy(item_id.text())
-                    QMessageBox.information(aba, "Copiado", f"O ID '{item_id.text()}' foi copiado.")
+                    pyperclip.copy(item_id)
+                    QMessageBox.information(aba, "Copiado", f"O ID '{item_id}' foi copiado.")
 
         def filtrar_por_valor_celula():
             for widget in info_aba['entradas'].values():
-                widget.textChanged.disconnect(aplicar_filtros)
-            info_aba['data_desejada_entry'].dateChanged.disconnect(aplicar_filtros)
+                widget.textChanged.disconnect(agendar_filtro)
             for campo, widget in info_aba['entradas'].items():
                  if not widget.isReadOnly(): widget.clear()
-            info_aba['data_desejada_entry'].setDate(info_aba['data_desejada_entry'].minimumDate())
+            limpar_datas()
             col_name = self.clicked_info['col_name']
             value = self.clicked_info['value']
-            info_aba['entradas'][col_name].setText(value)
+            if col_name == 'UASG':
+                definir_unidades([value])
+            else:
+                definir_unidades([])
+                info_aba['entradas'][col_name].setText(value)
             for widget in info_aba['entradas'].values():
-                widget.textChanged.connect(aplicar_filtros)
-            info_aba['data_desejada_entry'].dateChanged.connect(aplicar_filtros)
+                widget.textChanged.connect(agendar_filtro)
             aplicar_filtros()
 
         def mostrar_menu_contexto(position):
-            item = tabela.itemAt(position)
-            if not item: return
+            item = tabela.indexAt(position)
+            if not item.isValid(): return
             menu = QMenu()
-            valor_celula = item.text()
+            valor_celula = modelo.texto(item.row(), item.column())
             
             col_name = colunas_tabela[item.column()]
             self.clicked_info = {'col_name': col_name, 'value': valor_celula}
@@ -317,12 +611,13 @@ class MainWindow(QMainWindow):
             acao_copiar_celula.triggered.connect(lambda: pyperclip.copy(valor_celula))
             menu.addAction(acao_copiar_celula)
             
-            valores_linha = [tabela.item(item.row(), c).text() for c in range(tabela.columnCount())]
+            valores_linha = modelo.valores_linha(item.row())
             acao_copiar_linha = QAction("Copiar Linha Inteira", menu)
             acao_copiar_linha.triggered.connect(lambda: pyperclip.copy("\t".join(valores_linha)))
             menu.addAction(acao_copiar_linha)
             
-            if col_name in info_aba['entradas'] and not info_aba['entradas'][col_name].isReadOnly():
+            if (col_name == 'UASG' and valor_celula) or (
+                    col_name in info_aba['entradas'] and not info_aba['entradas'][col_name].isReadOnly()):
                 menu.addSeparator()
                 # --- CORREÇÃO AQUI: Mostrando o valor da célula no menu ---
                 acao_filtrar = QAction(f"Filtrar por \"{valor_celula[:30]}...\"", menu)
@@ -333,21 +628,27 @@ class MainWindow(QMainWindow):
 
         tabela.setContextMenuPolicy(Qt.CustomContextMenu)
         tabela.customContextMenuRequested.connect(mostrar_menu_contexto)
-        tabela.itemDoubleClicked.connect(copiar_id_contratacao)
+        tabela.doubleClicked.connect(copiar_id_contratacao)
         
         btn_limpar.clicked.connect(limpar_filtros)
-        btn_anterior.clicked.connect(pagina_anterior)
-        btn_proxima.clicked.connect(proxima_pagina)
+        btn_unidades.clicked.connect(escolher_unidades)
+
+        filtros_salvos = self.filtros_salvos.pop(ano, None)
+        if filtros_salvos:
+            for campo, texto in filtros_salvos['entradas'].items():
+                if campo in info_aba['entradas']:
+                    info_aba['entradas'][campo].setText(texto)
+            data_entry.setDate(filtros_salvos['data'])
+            data_final_entry.setDate(filtros_salvos['data_final'])
+            modo_data_combo.setCurrentText(filtros_salvos['modo_data'])
+            definir_unidades(filtros_salvos.get('uasgs', []))
         
         for entry_widget in info_aba['entradas'].values():
-            entry_widget.textChanged.connect(aplicar_filtros)
-        data_entry.dateChanged.connect(aplicar_filtros)
+            entry_widget.textChanged.connect(agendar_filtro)
+        for entry_data in datas_entries:
+            entry_data.dateChanged.connect(agendar_filtro)
+        modo_data_combo.currentTextChanged.connect(agendar_filtro)
 
-        if 'UASG' in info_aba['entradas']:
-            uasg_entry = info_aba['entradas']['UASG']
-            uasg_entry.setText('250052')
-            uasg_entry.setReadOnly(True)
-        
         aplicar_filtros()
 
 def iniciar_interface():
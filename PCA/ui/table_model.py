@@ -0,0 +1,156 @@
+# ui/table_model.py
+
+import numpy as np
+import pandas as pd
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, Signal
+
+from services.banco import LINHAS_POR_BLOCO
+from services.instrumentacao import medir
+from services.ordenacao import MotorOrdenacao
+
+# Linhas lidas do banco mantidas em memória pelo ModeloTabelaSQL
+MAX_LINHAS_EM_CACHE = 20000
+
+
+class ModeloTabelaPCA(QAbstractTableModel):
+    """
+    Modelo somente leitura que exibe as linhas de um DataFrame indicadas por
+    um array de posições (o resultado do filtro). Nenhum item é criado por
+    célula: o QTableView pede apenas o texto das células visíveis. A ordenação
+    permuta o array de posições com as permutações guardadas no
+    MotorOrdenacao do ano, sem tocar no DataFrame.
+    """
+
+    def __init__(self, df, colunas, ordenacao=None, parent=None):
+        super().__init__(parent)
+        self.df = df
+        self.ordenacao = ordenacao or MotorOrdenacao(df)
+        self.colunas = list(colunas)
+        self._series = [df[coluna] for coluna in self.colunas]
+        self.indices = np.arange(len(df))
+        self.coluna_ordenada = None
+        self.ordem = Qt.AscendingOrder
+
+    # --- Interface do QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.indices)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.colunas)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        return self.texto(index.row(), index.column())
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.colunas[section]
+        return str(section + 1)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if not 0 <= column < len(self.colunas):
+            return
+        self.coluna_ordenada = column
+        self.ordem = order
+        self.layoutAboutToBeChanged.emit()
+        with medir('classificar_coluna', coluna=self.colunas[column], linhas=len(self.indices)):
+            self.indices = self._ordenar(self.indices)
+        self.layoutChanged.emit()
+
+    # --- Acesso aos dados ---
+
+    def definir_indices(self, indices):
+        """Troca as linhas exibidas (ex.: novo resultado do filtro), mantendo a ordenação ativa."""
+        self.beginResetModel()
+        self.indices = self._ordenar(np.asarray(indices))
+        self.endResetModel()
+
+    def texto(self, linha, coluna):
+        valor = self._series[coluna].iat[self.indices[linha]]
+        return '' if pd.isna(valor) else str(valor)
+
+    def valores_linha(self, linha):
+        return [self.texto(linha, coluna) for coluna in range(len(self.colunas))]
+
+    def _ordenar(self, indices):
+        if self.coluna_ordenada is None:
+            return indices
+        return self.ordenacao.ordenar(indices, self.colunas[self.coluna_ordenada],
+                                      self.ordem == Qt.AscendingOrder)
+
+
+class ModeloTabelaSQL(ModeloTabelaPCA):
+    """
+    Variante do ModeloTabelaPCA para o banco SQLite local: `indices` são os
+    rowids devolvidos pelo MotorFiltroSQL, já na ordem pedida, e as células
+    são lidas do banco em blocos de LINHAS_POR_BLOCO linhas à medida que o
+    QTableView as pede. Ordenar só registra a nova ordem no motor e emite
+    `ordenacao_alterada`: a consulta com ORDER BY é refeita pela filtragem da
+    aba, fora da thread da interface, e chega por `definir_indices`.
+    """
+    ordenacao_alterada = Signal()
+
+    def __init__(self, motor, colunas, parent=None):
+        QAbstractTableModel.__init__(self, parent)
+        self.motor = motor
+        self.colunas = list(colunas)
+        self.indices = np.empty(0, dtype=np.int64)
+        self.coluna_ordenada = None
+        self.ordem = Qt.AscendingOrder
+        self._linhas = {}
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if not 0 <= column < len(self.colunas):
+            return
+        self.coluna_ordenada = column
+        self.ordem = order
+        self.motor.definir_ordenacao(self.colunas[column], order == Qt.AscendingOrder)
+        self.ordenacao_alterada.emit()
+
+    def definir_indices(self, indices):
+        """Troca as linhas exibidas; o motor já as entrega na ordenação ativa."""
+        self.beginResetModel()
+        self.indices = np.asarray(indices)
+        self.endResetModel()
+
+    def texto(self, linha, coluna):
+        rowid = int(self.indices[linha])
+        if rowid not in self._linhas:
+            self._carregar_bloco(linha)
+        # Uma linha pode sumir do banco se o ano for copiado de novo com a aba aberta
+        valores = self._linhas.get(rowid)
+        if valores is None or valores[coluna] is None:
+            return ''
+        return str(valores[coluna])
+
+    def _carregar_bloco(self, linha):
+        if len(self._linhas) > MAX_LINHAS_EM_CACHE:
+            self._linhas.clear()
+        inicio = linha - linha % LINHAS_POR_BLOCO
+        self._linhas.update(self.motor.banco.linhas(self.indices[inicio:inicio + LINHAS_POR_BLOCO],
+                                                    self.colunas))
+
+
+class ModeloTabelaAlteracoes(ModeloTabelaPCA):
+    """
+    ModeloTabelaPCA para o registro de alterações de uma atualização
+    (services.alteracoes): as colunas de valor são números e aparecem como
+    reais, o que mantém a ordenação numérica.
+    """
+
+    def __init__(self, registro, colunas, colunas_reais, parent=None):
+        super().__init__(registro, colunas, parent=parent)
+        self._reais = {self.colunas.index(coluna) for coluna in colunas_reais if coluna in self.colunas}
+
+    def texto(self, linha, coluna):
+        if coluna not in self._reais:
+            return super().texto(linha, coluna)
+        valor = self._series[coluna].iat[self.indices[linha]]
+        if pd.isna(valor):
+            return ''
+        # Formato brasileiro, como no rodapé das abas: R$ 1.234,56
+        return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
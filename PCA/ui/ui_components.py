@@ -1,17 +1,30 @@
 # ui/ui_components.py
 
+from datetime import datetime
+
+import numpy as np
 from PySide6.QtWidgets import (
-    QDialog, QVBoxLayout, QListWidget, QListWidgetItem,
-    QDialogButtonBox, QPushButton
+    QDialog, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem,
+    QDialogButtonBox, QPushButton, QTabWidget, QTableWidget, QTableWidgetItem,
+    QTableView, QLabel, QCheckBox, QComboBox, QHeaderView, QAbstractItemView
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
+
+from services import instrumentacao
+from services import alteracoes
+from services.preferencias import carregar_preferencias, salvar_preferencias
+from ui.table_model import ModeloTabelaAlteracoes
+
+# Intervalo de atualização automática da janela de diagnóstico, em milissegundos
+INTERVALO_DIAGNOSTICO_MS = 1000
 
 class MultiSelectDialog(QDialog):
     """
     Uma janela de diálogo que permite ao usuário selecionar múltiplos itens
-    de uma lista usando checkboxes.
+    de uma lista usando checkboxes. Os itens em `selecionados` já aparecem
+    marcados.
     """
-    def __init__(self, items, titulo="Selecione os Itens", parent=None):
+    def __init__(self, items, titulo="Selecione os Itens", parent=None, selecionados=None):
         super().__init__(parent)
         self.setWindowTitle(titulo)
         self.setMinimumSize(400, 300)
@@ -24,7 +37,7 @@ class MultiSelectDialog(QDialog):
         for item in items:
             list_item = QListWidgetItem(item)
             list_item.setFlags(list_item.flags() | Qt.ItemIsUserCheckable)
-            list_item.setCheckState(Qt.Unchecked)
+            list_item.setCheckState(Qt.Checked if selecionados and item in selecionados else Qt.Unchecked)
             self.list_widget.addItem(list_item)
         
         layout.addWidget(self.list_widget)
@@ -50,12 +63,207 @@ class MultiSelectDialog(QDialog):
         super().accept()
 
     @staticmethod
-    def get_selection(parent, items, titulo):
+    def get_selection(parent, items, titulo, selecionados=None):
         """
         Método estático para criar, exibir o diálogo e retornar a seleção.
         """
-        dialog = MultiSelectDialog(items, titulo, parent)
+        dialog = MultiSelectDialog(items, titulo, parent, selecionados)
         result = dialog.exec()
         if result == QDialog.Accepted:
             return dialog.selected_items
-        return None # Retorna None se o usuário cancelar
\ No newline at end of file
+        return None # Retorna None se o usuário cancelar
+
+
+class DiagnosticoDialog(QDialog):
+    """
+    Janela com os tempos das etapas medidas por services.instrumentacao:
+    um resumo por etapa, as medições mais recentes, os contadores e o pico
+    de memória. Permite ligar a gravação de perfis do cProfile.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnóstico")
+        self.setMinimumSize(760, 480)
+
+        layout = QVBoxLayout(self)
+        self.lbl_memoria = QLabel()
+        layout.addWidget(self.lbl_memoria)
+
+        abas = QTabWidget()
+        self.tabela_resumo = self._criar_tabela(["Etapa", "Vezes", "Última (s)", "Média (s)", "Máximo (s)"])
+        self.tabela_recentes = self._criar_tabela(["Início", "Etapa", "Segundos", "Detalhes"])
+        self.tabela_contadores = self._criar_tabela(["Contador", "Valor"])
+        abas.addTab(self.tabela_resumo, "Por etapa")
+        abas.addTab(self.tabela_recentes, "Recentes")
+        abas.addTab(self.tabela_contadores, "Contadores")
+        layout.addWidget(abas)
+
+        self.chk_perfil = QCheckBox(f"Gravar perfis do cProfile em {instrumentacao.PASTA_PERFIS}")
+        self.chk_perfil.setChecked(instrumentacao.perfil_ativo())
+        self.chk_perfil.toggled.connect(self._alternar_perfil)
+        layout.addWidget(self.chk_perfil)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        btn_limpar = QPushButton("Limpar")
+        btn_limpar.clicked.connect(self._limpar)
+        button_box.addButton(btn_limpar, QDialogButtonBox.ResetRole)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.atualizar)
+        self.timer.start(INTERVALO_DIAGNOSTICO_MS)
+        self.atualizar()
+
+    @staticmethod
+    def _criar_tabela(cabecalhos):
+        tabela = QTableWidget(0, len(cabecalhos))
+        tabela.setHorizontalHeaderLabels(cabecalhos)
+        tabela.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        tabela.verticalHeader().setVisible(False)
+        tabela.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        tabela.horizontalHeader().setStretchLastSection(True)
+        return tabela
+
+    @staticmethod
+    def _preencher(tabela, linhas):
+        tabela.setRowCount(len(linhas))
+        for i, linha in enumerate(linhas):
+            for j, valor in enumerate(linha):
+                tabela.setItem(i, j, QTableWidgetItem(str(valor)))
+
+    def atualizar(self):
+        pico = instrumentacao.pico_memoria_mb()
+        self.lbl_memoria.setText(f"Pico de memória do processo: {pico:,.0f} MB".replace(",", ".")
+                                 if pico is not None else "Pico de memória do processo: indisponível")
+        resumo = sorted(instrumentacao.resumo_por_etapa().items())
+        self._preencher(self.tabela_resumo, [
+            (etapa, r['vezes'], f"{r['ultima']:.3f}", f"{r['media']:.3f}", f"{r['maximo']:.3f}")
+            for etapa, r in resumo
+        ])
+        recentes = reversed(instrumentacao.medicoes())
+        self._preencher(self.tabela_recentes, [
+            (m['inicio'].replace('T', ' '), m['etapa'], f"{m['segundos']:.3f}",
+             ", ".join(f"{chave}={valor}" for chave, valor in m['detalhes'].items()))
+            for m in recentes
+        ])
+        self._preencher(self.tabela_contadores, sorted(instrumentacao.contadores().items()))
+
+    def _limpar(self):
+        instrumentacao.limpar()
+        self.atualizar()
+
+    def _alternar_perfil(self, ativo):
+        if ativo:
+            instrumentacao.ativar_perfil()
+        else:
+            instrumentacao.desativar_perfil()
+        preferencias = carregar_preferencias()
+        preferencias["perfil_cprofile"] = ativo
+        salvar_preferencias(preferencias)
+
+
+class AlteracoesDialog(QDialog):
+    """
+    Janela "Alterações desde a última atualização": para o ano escolhido,
+    o resumo e os itens adicionados, removidos e modificados em cada
+    atualização registrada por services.alteracoes, da mais recente para a
+    mais antiga.
+    """
+    TODOS_OS_TIPOS = "Todas as alterações"
+
+    def __init__(self, anos, ano=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Alterações desde a Última Atualização")
+        self.setMinimumSize(960, 560)
+        self.resumos = []
+        self.registro = None
+
+        layout = QVBoxLayout(self)
+        escolhas = QHBoxLayout()
+        self.combo_ano = QComboBox()
+        self.combo_ano.addItems(anos)
+        self.combo_atualizacao = QComboBox()
+        self.combo_tipo = QComboBox()
+        self.combo_tipo.addItems([self.TODOS_OS_TIPOS, alteracoes.ADICIONADO, alteracoes.REMOVIDO,
+                                  alteracoes.MODIFICADO])
+        escolhas.addWidget(QLabel("Ano:"))
+        escolhas.addWidget(self.combo_ano)
+        escolhas.addWidget(QLabel("Atualização:"))
+        escolhas.addWidget(self.combo_atualizacao, 1)
+        escolhas.addWidget(QLabel("Mostrar:"))
+        escolhas.addWidget(self.combo_tipo)
+        layout.addLayout(escolhas)
+
+        self.lbl_resumo = QLabel()
+        self.lbl_resumo.setWordWrap(True)
+        layout.addWidget(self.lbl_resumo)
+
+        self.tabela = QTableView()
+        self.tabela.setSortingEnabled(True)
+        self.tabela.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tabela.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tabela.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.tabela.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.tabela)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+        self.combo_ano.currentTextChanged.connect(self._trocar_ano)
+        self.combo_atualizacao.currentIndexChanged.connect(self._trocar_atualizacao)
+        self.combo_tipo.currentTextChanged.connect(self._filtrar_tipo)
+        if ano in anos:
+            self.combo_ano.setCurrentText(ano)
+        self._trocar_ano(self.combo_ano.currentText())
+
+    def _trocar_ano(self, ano):
+        # Da atualização mais recente para a mais antiga
+        self.resumos = list(reversed(alteracoes.historico(ano))) if ano else []
+        self.combo_atualizacao.blockSignals(True)
+        self.combo_atualizacao.clear()
+        for resumo in self.resumos:
+            instante = datetime.fromisoformat(resumo['instante']).strftime('%d/%m/%Y %H:%M')
+            self.combo_atualizacao.addItem(f"{instante} (+{resumo['adicionados']} / -{resumo['removidos']} / "
+                                           f"~{resumo['modificados']})")
+        self.combo_atualizacao.blockSignals(False)
+        self._trocar_atualizacao(0)
+
+    def _trocar_atualizacao(self, indice):
+        if not 0 <= indice < len(self.resumos):
+            self.registro = None
+            self.tabela.setModel(None)
+            self.lbl_resumo.setText("Nenhuma alteração registrada para este ano. As alterações são "
+                                    "registradas a cada atualização dos dados a partir da segunda.")
+            return
+        resumo = self.resumos[indice]
+        try:
+            self.registro = alteracoes.carregar_registro(self.combo_ano.currentText(), resumo)
+        except (OSError, ValueError) as e:
+            self.registro = None
+            self.tabela.setModel(None)
+            self.lbl_resumo.setText(f"Não foi possível ler o registro desta atualização: {e}")
+            return
+        texto = (
+            f"Itens: {resumo['linhas_anteriores']} → {resumo['linhas_novas']} | "
+            f"Novos: {resumo['adicionados']} (R$ {resumo['valor_adicionado']:,.2f}) | "
+            f"Removidos: {resumo['removidos']} (R$ {resumo['valor_removido']:,.2f}) | "
+            f"Modificados: {resumo['modificados']} (variação R$ {resumo['variacao_modificados']:,.2f}) | "
+            f"Valor Total: R$ {resumo['valor_anterior']:,.2f} → R$ {resumo['valor_novo']:,.2f}")
+        self.lbl_resumo.setText(texto.replace(",", "X").replace(".", ",").replace("X", "."))
+        modelo = ModeloTabelaAlteracoes(self.registro, alteracoes.COLUNAS_REGISTRO,
+                                        [alteracoes.COLUNA_VALOR_ANTERIOR, alteracoes.COLUNA_VALOR_NOVO,
+                                         alteracoes.COLUNA_DIFERENCA], parent=self.tabela)
+        self.tabela.setModel(modelo)
+        self.tabela.resizeColumnsToContents()
+        self._filtrar_tipo(self.combo_tipo.currentText())
+
+    def _filtrar_tipo(self, tipo):
+        modelo = self.tabela.model()
+        if modelo is None:
+            return
+        if tipo == self.TODOS_OS_TIPOS:
+            modelo.definir_indices(np.arange(len(self.registro)))
+        else:
+            modelo.definir_indices(np.flatnonzero((self.registro[alteracoes.COLUNA_ALTERACAO] == tipo).to_numpy()))
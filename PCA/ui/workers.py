@@ -0,0 +1,73 @@
+# ui/workers.py
+
+import threading
+
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+from services.downloader import download_csv_files
+from services.parser import MEMORIA_COMPACTA
+
+
+class SinaisTarefa(QObject):
+    """Sinais emitidos por uma TarefaDados; chegam à interface pela fila do Qt."""
+    progresso = Signal(str, object, object)    # ano, bytes baixados, bytes totais (ou None)
+    download_concluido = Signal(object)        # {ano: resumo} de download_csv_files
+    ano_carregado = Signal(str, object)        # ano, DataFrame
+    banco_sincronizado = Signal(object)        # anos copiados para o banco local
+    erro = Signal(str, str)                    # ano ('' se geral), mensagem
+    finalizado = Signal(bool)                  # True se a tarefa foi cancelada
+
+
+class TarefaDados(QRunnable):
+    """
+    Executa fora da thread da interface o download (opcional), a cópia dos
+    anos para o banco local (se `banco` for passado) e o carregamento dos
+    anos pedidos, um de cada vez, emitindo cada DataFrame assim que ele fica
+    pronto. Pode ser cancelada a qualquer momento com `cancelar()`.
+    """
+
+    def __init__(self, registro=None, anos=(), baixar=False, banco=None, compacto=MEMORIA_COMPACTA):
+        super().__init__()
+        # A janela guarda a referência da tarefa enquanto ela executa
+        self.setAutoDelete(False)
+        self.registro = registro
+        self.anos = list(anos)
+        self.baixar = baixar
+        self.banco = banco
+        self.compacto = compacto
+        self.sinais = SinaisTarefa()
+        self.cancelamento = threading.Event()
+
+    def cancelar(self):
+        self.cancelamento.set()
+
+    @property
+    def cancelada(self):
+        return self.cancelamento.is_set()
+
+    def run(self):
+        try:
+            if self.baixar:
+                resultados = download_csv_files(progress_callback=self.sinais.progresso.emit,
+                                                cancelamento=self.cancelamento)
+                if self.cancelada:
+                    return
+                self.sinais.download_concluido.emit(resultados)
+
+            if self.banco is not None:
+                copiados = self.banco.sincronizar(compacto=self.compacto, cancelamento=self.cancelamento)
+                self.sinais.banco_sincronizado.emit(copiados)
+
+            for ano in self.anos:
+                if self.cancelada:
+                    return
+                try:
+                    df = self.registro.obter(ano)
+                except Exception as e:
+                    self.sinais.erro.emit(ano, str(e))
+                    continue
+                self.sinais.ano_carregado.emit(ano, df)
+        except Exception as e:
+            self.sinais.erro.emit('', str(e))
+        finally:
+            self.sinais.finalizado.emit(self.cancelada)